@@ -0,0 +1,129 @@
+"""Voting analytics computed on in-memory columns of the performance table.
+
+The performance fact table (see export.py) is loaded once into a pandas
+DataFrame and kept until the change log moves on, so a request costs one
+`max(id)` query plus vectorized work over a few thousand rows instead of a
+Python loop over ORM objects. Requires the `pandas` package.
+"""
+
+import threading
+
+from export import fact_query
+from models import db, Change
+
+try:
+    import numpy
+    import pandas
+except ImportError:
+    pandas = None
+
+ANALYTICS_COLUMNS = ['year', 'date', 'event_id', 'event_type', 'country_id', 'country',
+                     'running_order', 'points', 'place', 'qualified']
+
+
+def require_pandas():
+    if pandas is None:
+        raise RuntimeError("Analytics require the pandas package.")
+
+
+class PerformanceFrame:
+    """The fact table as a DataFrame, reloaded when the change log moves."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursor = None
+        self._frame = None
+
+    def load(self):
+        columns = fact_query().subquery()
+        result = db.session.execute(db.select(*[columns.c[name] for name in ANALYTICS_COLUMNS]))
+        frame = pandas.DataFrame(result.fetchall(), columns=ANALYTICS_COLUMNS)
+        for name in ['running_order', 'points', 'place']:
+            frame[name] = pandas.to_numeric(frame[name])
+        return frame
+
+    def get(self):
+        require_pandas()
+        cursor = Change.get_latest_cursor()
+        with self._lock:
+            if self._frame is None or cursor != self._cursor:
+                self._frame = self.load()
+                self._cursor = cursor
+            return self._frame
+
+
+performance_frame = PerformanceFrame()
+
+
+def filter_frame(frame, event_type=None, from_year=None, to_year=None):
+    mask = numpy.ones(len(frame), dtype=bool)
+    if event_type != None:
+        mask &= (frame['event_type'] == event_type).to_numpy()
+    if from_year != None:
+        mask &= (frame['year'] >= from_year).to_numpy()
+    if to_year != None:
+        mask &= (frame['year'] <= to_year).to_numpy()
+    return frame[mask]
+
+
+def to_json_values(values):
+    """Nested lists of a 2-D array with NaN as None and whole numbers as ints."""
+
+    return [[None if numpy.isnan(value) else (int(value) if float(value).is_integer() else float(value))
+             for value in row] for row in values]
+
+
+#####################################################################
+# --------------------------- Analyses ---------------------------- #
+#####################################################################
+
+
+def points_matrix(frame):
+    """Points per country (rows) per year (columns)."""
+
+    matrix = frame.pivot_table(index='country_id', columns='year', values='points', aggfunc='sum')
+    return matrix.sort_index().sort_index(axis=1)
+
+
+def rolling_average(frame, window):
+    """Each country's points averaged over the last `window` years, skipping years it was absent."""
+
+    matrix = points_matrix(frame)
+    return matrix.T.rolling(window, min_periods=1).mean().T.where(matrix.notna())
+
+
+def running_order_correlation(frame):
+    """Spearman correlation of running order and place, overall and per year."""
+
+    ranked = frame.dropna(subset=['running_order', 'place'])
+    ranked = ranked.assign(
+        order_rank=ranked.groupby('event_id')['running_order'].rank(),
+        place_rank=ranked.groupby('event_id')['place'].rank())
+    overall = ranked['order_rank'].corr(ranked['place_rank'])
+    by_year = ranked.groupby('year').apply(
+        lambda year: year['order_rank'].corr(year['place_rank']))
+    return overall, by_year
+
+
+def qualification_streaks(frame):
+    """Per country: semi-final appearances, qualifications, longest and current streak."""
+
+    semis = frame[(frame['event_type'] == 'semi-final') & frame['qualified'].notna()]
+    semis = semis.sort_values(['country_id', 'year', 'date'])
+    qualified = semis['qualified'].astype(bool)
+
+    # a new run starts whenever the country or the outcome changes
+    new_run = (semis['country_id'] != semis['country_id'].shift()) | (qualified != qualified.shift())
+    run_id = new_run.cumsum()
+    run_length = qualified.groupby(run_id).transform('size')
+    streaks = semis.assign(qualified=qualified, run_id=run_id,
+                           streak=run_length.where(qualified, 0))
+
+    by_country = streaks.groupby('country_id')
+    last_runs = by_country['run_id'].transform('max') == streaks['run_id']
+    return pandas.DataFrame({
+        'appearances': by_country.size(),
+        'qualifications': by_country['qualified'].sum(),
+        'longest_streak': by_country['streak'].max(),
+        'current_streak': streaks[last_runs].groupby('country_id')['streak'].max()
+    }).fillna(0).astype(int)
@@ -0,0 +1,496 @@
+"""ASGI entry point.
+
+Serves the read-only GET routes with async handlers on an async SQLAlchemy
+engine and hands every other request (writes, the welcome page) to the
+existing Flask app. So do GETs asking for more than the async handlers
+implement: filters, paging or ?fields= in the query string, or a CSV or
+MessagePack Accept header. JSON bodies are written the way Flask writes
+them, so an ETag from either side answers If-None-Match on both.
+
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+
+The WSGI path (`gunicorn wsgi:app`) is unchanged.
+"""
+
+from collections import defaultdict
+import asyncio
+import json
+import os
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route, request_response
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import generate_etag, parse_accept_header, parse_etags
+
+from app import create_app
+from blueprints.events import STREAM_HEARTBEAT_SECONDS
+from blueprints.formats import CSV_MIMETYPE, JSON_MIMETYPE, MSGPACK_MIMETYPE
+from models import Participant, Country, Entry, Event, Event_Entry, convert_date, convert_time
+from pubsub import broker, event_channel, format_sse
+from expand import EXPANSIONS, ExpandError, attach, collect_ids, parse_expand
+from ratelimit import get_client_key, take_token
+from blobs import blob_url
+import math
+
+flask_app = create_app()
+flask_asgi_app = WSGIMiddleware(flask_app)
+
+participants = Participant.__table__
+countries = Country.__table__
+entries = Entry.__table__
+events = Event.__table__
+events_entries = Event_Entry.__table__
+
+
+def get_async_database_uri(uri):
+    """Swap the sync driver in a database URI for its async counterpart."""
+
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    if uri.startswith('postgresql://') or uri.startswith('postgresql+psycopg2://'):
+        return 'postgresql+asyncpg://' + uri.split('://', 1)[1]
+    if uri.startswith('sqlite://'):
+        return 'sqlite+aiosqlite://' + uri[len('sqlite://'):]
+    return uri
+
+
+# the URI the Flask app settled on, so both default to the same database
+ASYNC_DATABASE_URI = get_async_database_uri(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+
+if ASYNC_DATABASE_URI.startswith('sqlite'):
+    engine = create_async_engine(ASYNC_DATABASE_URI)
+else:
+    engine = create_async_engine(
+        ASYNC_DATABASE_URI,
+        pool_size=int(os.environ.get('ASYNC_POOL_SIZE', 10)),
+        max_overflow=int(os.environ.get('ASYNC_MAX_OVERFLOW', 20)))
+
+
+def group_by(rows, key, value):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[key]].append(row[value])
+    return grouped
+
+
+def not_found(resource, id):
+    response = {
+        "status": "not found",
+        "message": f"There is no {resource} with id {id}."
+    }
+    return JSONResponse(response, status_code=404)
+
+
+#####################################################################
+# ------------------------- Serializers --------------------------- #
+#####################################################################
+
+# Each loader runs a fixed number of set-based queries for any number of
+# rows and returns dicts shaped exactly like the matching model's
+# serialize().
+
+
+async def load_participants(conn, ids=None):
+
+    query = select(participants).order_by(participants.c.name)
+    if ids is not None:
+        query = query.where(participants.c.id.in_(ids))
+    rows = (await conn.execute(query)).mappings().all()
+    participant_ids = [row['id'] for row in rows]
+
+    entry_rows = (await conn.execute(
+        select(entries.c.id, entries.c.participant_id, entries.c.country_id)
+        .where(entries.c.participant_id.in_(participant_ids)))).mappings().all()
+    performance_rows = (await conn.execute(
+        select(events_entries.c.id, events_entries.c.event_id, entries.c.participant_id)
+        .select_from(events_entries.join(entries))
+        .where(entries.c.participant_id.in_(participant_ids))
+        .order_by(entries.c.year))).mappings().all()
+
+    participant_entries = group_by(entry_rows, 'participant_id', 'id')
+    participant_countries = group_by(entry_rows, 'participant_id', 'country_id')
+    participant_performances = group_by(performance_rows, 'participant_id', 'id')
+    participant_events = group_by(performance_rows, 'participant_id', 'event_id')
+
+    return [{
+        'id': row['id'],
+        'name': row['name'],
+        'image_url': row['image_url'],
+        'description': row['description'],
+        'description_url': blob_url(row['description_hash']),
+        'entries': participant_entries[row['id']],
+        'countries_represented': participant_countries[row['id']],
+        'performances': participant_performances[row['id']],
+        'events': participant_events[row['id']]
+    } for row in rows]
+
+
+async def load_countries(conn, ids=None):
+
+    query = select(countries).order_by(countries.c.country)
+    if ids is not None:
+        query = query.where(countries.c.id.in_(ids))
+    rows = (await conn.execute(query)).mappings().all()
+    country_ids = [row['id'] for row in rows]
+
+    entry_rows = (await conn.execute(
+        select(entries.c.id, entries.c.country_id, entries.c.participant_id)
+        .where(entries.c.country_id.in_(country_ids)))).mappings().all()
+    event_rows = (await conn.execute(
+        select(events.c.id, events.c.host_country_id)
+        .where(events.c.host_country_id.in_(country_ids)))).mappings().all()
+    performance_rows = (await conn.execute(
+        select(events_entries.c.id, entries.c.country_id)
+        .select_from(events_entries.join(entries).join(events))
+        .where(entries.c.country_id.in_(country_ids))
+        .order_by(events.c.year))).mappings().all()
+
+    country_entries = group_by(entry_rows, 'country_id', 'id')
+    country_participants = group_by(entry_rows, 'country_id', 'participant_id')
+    country_events = group_by(event_rows, 'host_country_id', 'id')
+    country_performances = group_by(performance_rows, 'country_id', 'id')
+
+    return [{
+        'id': row['id'],
+        'country': row['country'],
+        'flag_image_url': row['flag_image_url'],
+        'entries': country_entries[row['id']],
+        'events': country_events[row['id']],
+        'participants': country_participants[row['id']],
+        'performances': country_performances[row['id']]
+    } for row in rows]
+
+
+async def load_entries(conn, ids=None):
+
+    query = (select(entries, participants.c.name.label('participant'), countries.c.country)
+             .select_from(entries.outerjoin(participants).outerjoin(countries))
+             .order_by(entries.c.title))
+    if ids is not None:
+        query = query.where(entries.c.id.in_(ids))
+    rows = (await conn.execute(query)).mappings().all()
+    entry_ids = [row['id'] for row in rows]
+
+    performance_rows = (await conn.execute(
+        select(events_entries.c.id, events_entries.c.entry_id, events_entries.c.event_id)
+        .select_from(events_entries.join(events))
+        .where(events_entries.c.entry_id.in_(entry_ids))
+        .order_by(events.c.date))).mappings().all()
+
+    entry_performances = group_by(performance_rows, 'entry_id', 'id')
+    entry_events = group_by(performance_rows, 'entry_id', 'event_id')
+
+    return [{
+        'id': row['id'],
+        'participant_id': row['participant_id'],
+        'participant': row['participant'],
+        'country_id': row['country_id'],
+        'country': row['country'],
+        'title': row['title'],
+        'year': row['year'],
+        'eurovision_resource_url': row['eurovision_resource_url'],
+        'eurovision_video_url': row['eurovision_video_url'],
+        'music_video_url': row['music_video_url'],
+        'spotify_url': row['spotify_url'],
+        'written_by': row['written_by'],
+        'composed_by': row['composed_by'],
+        'broadcaster': row['broadcaster'],
+        'lyrics': row['lyrics'],
+        'lyrics_url': blob_url(row['lyrics_hash']),
+        'lyrics_language': row['lyrics_language'],
+        'lyrics_english': row['lyrics_english'],
+        'lyrics_english_url': blob_url(row['lyrics_english_hash']),
+        'performances': entry_performances[row['id']],
+        'events': entry_events[row['id']]
+    } for row in rows]
+
+
+async def load_events(conn, ids=None):
+
+    query = (select(events, countries.c.country.label('host_country'))
+             .select_from(events.outerjoin(countries))
+             .order_by(events.c.date.desc(), events.c.event))
+    if ids is not None:
+        query = query.where(events.c.id.in_(ids))
+    rows = (await conn.execute(query)).mappings().all()
+    event_ids = [row['id'] for row in rows]
+
+    performance_rows = (await conn.execute(
+        select(events_entries.c.id, events_entries.c.event_id,
+               events_entries.c.entry_id, entries.c.country_id)
+        .select_from(events_entries.join(entries))
+        .where(events_entries.c.event_id.in_(event_ids))
+        .order_by(entries.c.country_id))).mappings().all()
+
+    event_performances = group_by(performance_rows, 'event_id', 'id')
+    event_entries = group_by(performance_rows, 'event_id', 'entry_id')
+    event_countries = group_by(performance_rows, 'event_id', 'country_id')
+
+    return [{
+        'id': row['id'],
+        'event': row['event'],
+        'type': row['type'],
+        'year': row['year'],
+        'date': convert_date(row['date']),
+        'start_time': convert_time(row['start_time']),
+        'end_time': convert_time(row['end_time']),
+        'eurovision_resource_url': row['eurovision_resource_url'],
+        'recap_video_url': row['recap_video_url'],
+        'video_playlist_url': row['video_playlist_url'],
+        'spotify_playlist_url': row['spotify_playlist_url'],
+        'host_city': row['host_city'],
+        'host_country_id': row['host_country_id'],
+        'host_country': row['host_country'],
+        'performances': event_performances[row['id']],
+        'entries': event_entries[row['id']],
+        'participating_countries': event_countries[row['id']]
+    } for row in rows]
+
+
+async def load_performances(conn, ids=None, event_id=None):
+
+    query = (select(events_entries,
+                    entries.c.title.label('entry'),
+                    events.c.event,
+                    participants.c.id.label('participant_id'),
+                    participants.c.name.label('participant'),
+                    countries.c.id.label('country_id'),
+                    countries.c.country)
+             .select_from(events_entries.join(events).join(entries)
+                          .outerjoin(participants)
+                          .outerjoin(countries, entries.c.country_id == countries.c.id)))
+    if ids is not None:
+        query = query.where(events_entries.c.id.in_(ids))
+    if event_id is not None:
+        query = query.where(events_entries.c.event_id == event_id)
+    rows = (await conn.execute(query)).mappings().all()
+
+    return [{
+        'id': row['id'],
+        'entry_id': row['entry_id'],
+        'entry': row['entry'],
+        'event_id': row['event_id'],
+        'event': row['event'],
+        'points': row['points'],
+        'place': row['place'],
+        'qualified': row['qualified'],
+        'running_order': row['running_order'],
+        'year': row['year'],
+        'participant_id': row['participant_id'],
+        'participant': row['participant'],
+        'country_id': row['country_id'],
+        'country': row['country']
+    } for row in rows]
+
+
+#####################################################################
+# ------------------------ View Functions ------------------------- #
+#####################################################################
+
+
+LOADERS = {
+    'participant': load_participants,
+    'country': load_countries,
+    'entry': load_entries,
+    'event': load_events,
+    'performance': load_performances
+}
+
+
+async def expand_documents(conn, resource, documents, tree):
+    """Async counterpart of expand.expand() over the set-based loaders."""
+
+    for name, subtree in tree.items():
+        field, target = EXPANSIONS[resource][name]
+        loaded = {document['id']: document
+                  for document in await LOADERS[target](conn, collect_ids(documents, field))}
+        await expand_documents(conn, target, list(loaded.values()), subtree)
+        attach(documents, name, field, loaded)
+
+
+def get_remote_addr(request):
+    """The client's IP address, read from X-Forwarded-For the way ProxyFix does."""
+
+    proxy_count = flask_app.config['PROXY_COUNT']
+    if proxy_count > 0:
+        forwarded = request.headers.get('X-Forwarded-For', '').split(',')
+        if len(forwarded) >= proxy_count and forwarded[-proxy_count].strip():
+            return forwarded[-proxy_count].strip()
+    return request.client.host if request.client else None
+
+
+def rate_limited(is_collection=False):
+    """Apply the Flask app's rate limits to an async endpoint."""
+
+    def decorator(endpoint):
+        async def limited_endpoint(request):
+            if flask_app.config['RATE_LIMIT_ENABLED']:
+                client = get_client_key(flask_app, request.headers.get('API-Key', None),
+                                        get_remote_addr(request))
+                if flask_app.config.get('RATE_LIMIT_BACKEND_URL'):
+                    # the Redis client blocks; keep it off the event loop
+                    wait = await run_in_threadpool(take_token, flask_app, client, is_collection)
+                else:
+                    wait = take_token(flask_app, client, is_collection)
+                if wait > 0:
+                    response = {
+                        "status": "fail",
+                        "message": f"Rate limit exceeded. Retry in {math.ceil(wait)} seconds."
+                    }
+                    return JSONResponse(response, status_code=429,
+                                        headers={"Retry-After": str(math.ceil(wait))})
+            return await endpoint(request)
+        return limited_endpoint
+    return decorator
+
+
+def served_by_flask(request):
+    """Whether a GET asks for something only the Flask routes implement."""
+
+    if set(request.query_params) - {'expand'}:
+        return True
+    accept = parse_accept_header(request.headers.get('Accept'), MIMEAccept)
+    mimetype = accept.best_match([JSON_MIMETYPE, MSGPACK_MIMETYPE, CSV_MIMETYPE], default=JSON_MIMETYPE)
+    return mimetype != JSON_MIMETYPE
+
+
+class FlaskFallback:
+    """An async endpoint that passes the requests served_by_flask() picks to the Flask app."""
+
+    def __init__(self, endpoint):
+        self.endpoint = request_response(endpoint)
+
+    async def __call__(self, scope, receive, send):
+        if served_by_flask(Request(scope)):
+            await flask_asgi_app(scope, receive, send)
+        else:
+            await self.endpoint(scope, receive, send)
+
+
+def conditional_json(request, response):
+    """The response as Flask's jsonify() writes it, with its ETag, or a 304 if it matches."""
+
+    body = (json.dumps(response, separators=(',', ':'), sort_keys=True) + '\n').encode()
+    etag = generate_etag(body)
+    headers = {"ETag": f'"{etag}"', "Vary": "Accept"}
+    if parse_etags(request.headers.get('If-None-Match')).contains_weak(etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=JSON_MIMETYPE, headers=headers)
+
+
+def expand_error(error):
+    response = {
+        "status": "fail",
+        "message": str(error)
+    }
+    return JSONResponse(response, status_code=400)
+
+
+def collection_endpoint(resource, plural):
+    @rate_limited(is_collection=True)
+    async def get_all(request):
+        try:
+            tree = parse_expand(resource, request.query_params.get('expand'))
+        except ExpandError as e:
+            return expand_error(e)
+        async with engine.connect() as conn:
+            documents = await LOADERS[resource](conn)
+            await expand_documents(conn, resource, documents, tree)
+        response = {
+            plural: documents
+        }
+        return conditional_json(request, response)
+    return FlaskFallback(get_all)
+
+
+def resource_endpoint(resource, param):
+    @rate_limited()
+    async def get_one(request):
+        id = request.path_params[param]
+        try:
+            tree = parse_expand(resource, request.query_params.get('expand'))
+        except ExpandError as e:
+            return expand_error(e)
+        async with engine.connect() as conn:
+            documents = await LOADERS[resource](conn, [id])
+            if not documents:
+                return not_found(resource, id)
+            await expand_documents(conn, resource, documents, tree)
+        response = {
+            resource: documents[0]
+        }
+        return conditional_json(request, response)
+    return FlaskFallback(get_one)
+
+
+@rate_limited()
+async def stream_event(request):
+    event_id = request.path_params['event_id']
+    async with engine.connect() as conn:
+        found = await load_events(conn, [event_id])
+        if not found:
+            return not_found('event', event_id)
+
+        # subscribe before reading the snapshot so no delta is missed
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue(100)
+
+        def put(message):
+            if messages.full():
+                while not messages.empty():
+                    messages.get_nowait()
+                message = {"type": "resync"}
+            messages.put_nowait(message)
+
+        token = broker.subscribe(event_channel(event_id),
+                                 lambda message: loop.call_soon_threadsafe(put, message))
+        snapshot = {
+            "type": "snapshot",
+            "event_id": event_id,
+            "performances": await load_performances(conn, event_id=event_id)
+        }
+
+    async def generate():
+        try:
+            yield format_sse(snapshot, event="snapshot")
+            while True:
+                try:
+                    message = await asyncio.wait_for(messages.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(message, event=message["type"])
+        finally:
+            broker.unsubscribe(token)
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    }
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=headers)
+
+
+routes = [
+    Route('/participants', collection_endpoint('participant', 'participants'), methods=['GET']),
+    Route('/participants/{participant_id}', resource_endpoint('participant', 'participant_id'), methods=['GET']),
+    Route('/countries', collection_endpoint('country', 'countries'), methods=['GET']),
+    Route('/countries/{country_id}', resource_endpoint('country', 'country_id'), methods=['GET']),
+    Route('/entries', collection_endpoint('entry', 'entries'), methods=['GET']),
+    Route('/entries/{entry_id}', resource_endpoint('entry', 'entry_id'), methods=['GET']),
+    Route('/events', collection_endpoint('event', 'events'), methods=['GET']),
+    Route('/events/{event_id}', resource_endpoint('event', 'event_id'), methods=['GET']),
+    Route('/events/{event_id}/stream', stream_event, methods=['GET']),
+    Route('/performances', collection_endpoint('performance', 'performances'), methods=['GET']),
+    Route('/performances/{performance_id}', resource_endpoint('performance', 'performance_id'), methods=['GET']),
+
+    # writes and everything else go through the sync Flask app
+    Mount('/', flask_asgi_app)
+]
+
+application = Starlette(routes=routes, on_shutdown=[engine.dispose])
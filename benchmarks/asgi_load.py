@@ -0,0 +1,86 @@
+"""Compare the WSGI and ASGI entry points under concurrent load.
+
+Start both servers against the same database, e.g.
+
+    gunicorn wsgi:app -w 4 -b :8000
+    gunicorn asgi:application -w 4 -k uvicorn.workers.UvicornWorker -b :8001
+
+then run
+
+    python benchmarks/asgi_load.py http://localhost:8000 http://localhost:8001
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+DEFAULT_PATHS = ['/events', '/performances', '/entries', '/countries']
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_client(client, paths, deadline, latencies, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def load(base_url, paths, clients, duration):
+    latencies = []
+    errors = []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[
+            run_client(client, paths, deadline, latencies, errors)
+            for _ in range(clients)])
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / duration,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base_urls', nargs='+')
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--path', action='append', dest='paths')
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    print(f"{args.clients} concurrent clients, {args.duration:.0f}s, paths: {', '.join(paths)}")
+    print(f"{'target':40} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for base_url in args.base_urls:
+        result = asyncio.run(load(base_url, paths, args.clients, args.duration))
+        print(f"{base_url:40} {result['rps']:9.1f} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} "
+              f"{result['p99_ms']:9.1f} {result['max_ms']:9.1f} {result['errors']:7d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""Check each route against its SQL statement and latency budget.
+
+    python benchmarks/budgets.py
+    python benchmarks/budgets.py --latency-scale 3    # slow machine
+    python benchmarks/budgets.py --route /events
+
+The app runs on a fresh SQLite database seeded with the synthetic
+contests of `load.py seed` (fixed arguments, so every run sees the same
+rows) with the response cache and rate limiter off. Each route in BUDGETS
+is requested once to warm up, then --runs times: the most statements any
+run executed must stay within the route's statement budget and the median
+time within its latency budget (times --latency-scale). A route over
+budget is printed with the statements it ran, repeated ones first, and
+the script exits with status 1, so it can gate CI. So does any route of
+the app's url_map that no budget requests (UNBUDGETED lists the
+exceptions), so a new route cannot ship without one.
+
+Writes that create or delete get a fresh row or document per request
+(FACTORIES, DOCUMENTS), made outside the measured statements.
+
+Raise a budget in the same commit as the change that needs it.
+"""
+
+import argparse
+from collections import Counter
+import io
+import itertools
+import os
+import statistics
+import string
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, Participant, Country, Entry, Event, Event_Entry  # noqa: E402
+from jobs import enqueue  # noqa: E402
+import media  # noqa: E402
+from load import seed_contests  # noqa: E402
+
+API_KEY = 'budget'
+
+GRAPHQL_QUERY = '{ events { id event performances { points entry { title country { id } } } } }'
+
+# method, path, most SQL statements, median milliseconds; {name} is filled
+# in from the seeded rows (see get_ids), {new_<resource>} with a row made
+# for each request (see FACTORIES). Serializing and each ?expand= level
+# take a fixed number of queries, so these hold however many rows there are
+BUDGETS = [
+    ('GET', '/', 0, 10),
+    ('GET', '/participants', 3, 40),
+    ('GET', '/participants/{participant}', 3, 15),
+    ('POST', '/participants', 6, 30),
+    ('PATCH', '/participants/{participant}', 4, 30),
+    ('DELETE', '/participants/{new_participant}', 6, 30),
+    ('GET', '/countries', 4, 30),
+    ('GET', '/countries/{country}', 4, 15),
+    ('POST', '/countries', 6, 30),
+    ('PATCH', '/countries/{country}', 5, 30),
+    ('DELETE', '/countries/{new_country}', 7, 30),
+    ('GET', '/entries', 2, 40),
+    ('GET', '/entries?year={year}', 2, 20),
+    ('GET', '/entries/{entry}', 3, 15),
+    ('POST', '/entries', 9, 30),
+    ('PATCH', '/entries/{entry}', 6, 30),
+    ('DELETE', '/entries/{new_entry}', 5, 30),
+    ('GET', '/events', 2, 20),
+    ('GET', '/events/{final}', 2, 15),
+    ('GET', '/events/{final}?expand=performances', 3, 25),
+    ('GET', '/events/{final}?expand=entries', 4, 25),
+    ('GET', '/events/{final}?expand=performances.entry', 5, 30),
+    ('GET', '/events/{final}?expand=performances.entry.participant', 8, 40),
+    ('GET', '/entries?year={year}&expand=participant,country', 9, 40),
+    ('POST', '/events', 7, 30),
+    ('PATCH', '/events/{final}', 3, 30),
+    ('DELETE', '/events/{new_event}', 5, 30),
+    ('GET', '/events/{semi_final}/qualification', 2, 20),
+    ('GET', '/performances', 1, 40),
+    ('GET', '/performances?year={year}', 1, 20),
+    ('GET', '/performances/{performance}', 3, 10),
+    ('POST', '/performances', 10, 30),
+    ('PATCH', '/performances/{performance}', 6, 30),
+    ('DELETE', '/performances/{new_performance}', 4, 30),
+    ('GET', '/graphql?query={graphql_query}', 5, 80),
+    ('POST', '/graphql', 5, 80),
+    ('GET', '/changes', 1, 30),
+    ('GET', '/analytics/points-matrix', 1, 60),
+    ('GET', '/analytics/rolling-average', 1, 60),
+    ('GET', '/analytics/running-order-correlation', 1, 60),
+    ('GET', '/analytics/qualification-streaks', 1, 60),
+    ('GET', '/export/performances.parquet?year={year}', 1, 60),
+    ('GET', '/jobs', 3, 20),
+    ('POST', '/jobs', 2, 20),
+    ('GET', '/jobs/{job}', 1, 10),
+    ('GET', '/media/country/{country}?w=64', 1, 15),
+    ('GET', '/blobs/{blob}', 0, 10),
+    ('GET', '/profiles', 0, 15),
+    ('GET', '/profiles/{profile}', 0, 10)
+]
+
+# endpoints no budget can describe; any other route without one fails the run
+UNBUDGETED = {
+    'static': "files from disk",
+    'events.stream_event': "a stream that stays open"
+}
+
+
+def get_ids(client):
+    final = Event.query.filter_by(type='final').order_by(Event.year.desc()).first()
+    semi_final = Event.query.filter_by(type='semi-final', year=final.year).first()
+    performance = Event_Entry.query.filter_by(event_id=final.id).first()
+    participant = Participant.query.order_by(Participant.name).first()
+    country = Country.query.order_by(Country.id).first()
+    entry = performance.entry
+
+    country.flag_image_url = 'http://origin.invalid/flag.png'
+    storyteller = Participant.register('Budget storyteller', None, 'A long description. ' * 50)
+    profile = client.get('/countries', headers={'API-Key': API_KEY, 'X-Profile': '1'})
+    return {
+        'participant': participant.id,
+        'country': country.id,
+        'entry': entry.id,
+        'year': final.year,
+        'final': final.id,
+        'semi_final': semi_final.id,
+        'performance': performance.id,
+        'job': enqueue('render_snapshot', {'full': True}).id,
+        'blob': storyteller.description_hash,
+        'profile': profile.headers['X-Profile-Id'],
+        'graphql_query': quote(GRAPHQL_QUERY),
+        'documents': {
+            'participant': {'name': participant.name},
+            'country': {'country': country.country, 'flag_image_url': country.flag_image_url},
+            'entry': {'participant_id': entry.participant_id, 'country_id': entry.country_id,
+                      'title': entry.title, 'year': entry.year, 'lyrics_language': entry.lyrics_language},
+            'event': {'event': final.event, 'type': final.type, 'year': final.year,
+                      'host_city': final.host_city, 'host_country_id': final.host_country_id},
+            'performance': {'event_id': performance.event_id, 'entry_id': performance.entry_id,
+                            'points': performance.points, 'running_order': performance.running_order}
+        }
+    }
+
+
+def get_country_code(n):
+    return 'Q' + string.ascii_uppercase[n // 26 % 26] + string.ascii_uppercase[n % 26]
+
+
+# a new row for each request that deletes or links to one
+FACTORIES = {
+    'new_participant': lambda ids, n: Participant.register(f"Budget act {n}", None, None).id,
+    'new_country': lambda ids, n: Country.register(get_country_code(n), f"Budgetland {n}", None).id,
+    'new_event': lambda ids, n: Event.register(
+        f"Budget {n}", 'final', 3000, None, None, None, None, None, None, None, "Budget City",
+        ids['country']).id,
+    'new_entry': lambda ids, n: Entry.register(
+        ids['participant'], FACTORIES['new_country'](ids, n), f"Budget song {n}", ids['year'],
+        None, None, None, None, None, None, None, None, None, None).id,
+    'new_performance': lambda ids, n: Event_Entry.register(
+        ids['final'], FACTORIES['new_entry'](ids, n), 0, None, None, 99).id
+}
+
+# request bodies: (method, path) -> document
+DOCUMENTS = {
+    ('POST', '/participants'): lambda ids, n: {'name': f"Budget act {n}"},
+    ('POST', '/countries'): lambda ids, n: {'id': get_country_code(n), 'country': f"Budgetland {n}"},
+    ('POST', '/entries'): lambda ids, n: {
+        'participant_id': ids['participant'], 'country_id': FACTORIES['new_country'](ids, n),
+        'title': f"Budget song {n}", 'year': ids['year']},
+    ('POST', '/events'): lambda ids, n: {
+        'event': f"Budget {n}", 'type': 'final', 'year': 3000, 'host_city': "Budget City",
+        'host_country_id': ids['country']},
+    ('POST', '/performances'): lambda ids, n: {
+        'event_id': ids['final'], 'entry_id': FACTORIES['new_entry'](ids, n), 'points': 0,
+        'running_order': 99},
+    ('PATCH', '/participants/{participant}'): lambda ids, n: ids['documents']['participant'],
+    ('PATCH', '/countries/{country}'): lambda ids, n: ids['documents']['country'],
+    ('PATCH', '/entries/{entry}'): lambda ids, n: ids['documents']['entry'],
+    ('PATCH', '/events/{final}'): lambda ids, n: ids['documents']['event'],
+    ('PATCH', '/performances/{performance}'): lambda ids, n: ids['documents']['performance'],
+    ('POST', '/graphql'): lambda ids, n: {'query': GRAPHQL_QUERY},
+    ('POST', '/jobs'): lambda ids, n: {'name': 'render_snapshot', 'payload': {'full': bool(n % 2)}}
+}
+
+counter = itertools.count()
+
+
+def prepare(method, template, ids):
+    """(path, document) for one request, making the rows it needs first."""
+
+    n = next(counter)
+    fresh = {name: factory(ids, n) for name, factory in FACTORIES.items() if f"{{{name}}}" in template}
+    make_document = DOCUMENTS.get((method, template))
+    return (template.format(**ids, **fresh), make_document(ids, n) if make_document else None)
+
+
+def get_unbudgeted(app, ids):
+    """Rules of the app that no budget requests, as 'METHODS /rule' strings."""
+
+    adapter = app.url_map.bind('localhost')
+    placeholders = dict(ids, **{name: 'x' for name in FACTORIES})
+    covered = set()
+    for method, template, max_statements, max_ms in BUDGETS:
+        path = template.format(**placeholders).split('?')[0]
+        covered.add(adapter.match(path, method)[0])
+    return [f"{','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))} {rule.rule}"
+            for rule in app.url_map.iter_rules()
+            if rule.endpoint not in covered and rule.endpoint not in UNBUDGETED]
+
+
+class StatementRecorder:
+    """The SQL statements the engine executes while recording."""
+
+    def __init__(self, engine):
+        self.statements = None
+        event.listen(engine, 'before_cursor_execute', self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.statements != None:
+            self.statements.append(' '.join(statement.split()))
+
+    def __enter__(self):
+        self.statements = []
+        return self.statements
+
+    def __exit__(self, *exc):
+        self.statements = None
+
+
+def measure(client, recorder, method, template, ids, runs):
+    """(statements of the run that ran the most, median ms, last status) for a request."""
+
+    def send():
+        path, document = prepare(method, template, ids)
+        with recorder as statements:
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=document, headers={'API-Key': API_KEY})
+            # a streamed body only runs its queries as it is read
+            response.get_data()
+            response.close()
+            elapsed = time.perf_counter() - start
+        return (statements, elapsed, response)
+
+    send()
+    most = []
+    times = []
+    for _ in range(runs):
+        statements, elapsed, response = send()
+        times.append(elapsed)
+        if len(statements) > len(most):
+            most = statements
+    return (most, statistics.median(times) * 1000, response.status_code)
+
+
+def stub_media_fetch(app):
+    """Serve /media sources from memory instead of fetching them."""
+
+    if media.Image == None:
+        return
+    source = io.BytesIO()
+    media.Image.new('RGB', (400, 300)).save(source, 'PNG')
+    media.get_media_cache(app).fetch = lambda url: source.getvalue()
+
+
+def print_statements(statements):
+    for statement, count in Counter(statements).most_common():
+        shown = statement if len(statement) <= 200 else statement[:197] + '...'
+        print(f"    {count:3d} x {shown}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency-scale', type=float, default=1,
+                        help="multiply every latency budget")
+    parser.add_argument('--route', action='append', dest='routes',
+                        help="only check budgets whose path starts with this")
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory.name, 'budgets.db')}",
+        'API_KEY': API_KEY,
+        'RATE_LIMIT_ENABLED': False,
+        'RESPONSE_CACHE_ENABLED': False,
+        'JOB_WORKER_THREADS': 0,
+        'BLOB_STORE_URL': os.path.join(directory.name, 'blobs'),
+        'MEDIA_CACHE_DIR': os.path.join(directory.name, 'media'),
+        'PROFILE_DIR': os.path.join(directory.name, 'profiles')
+    })
+    stub_media_fetch(app)
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        seed_contests(3, 40, 2021)
+        client = app.test_client()
+        ids = get_ids(client)
+        recorder = StatementRecorder(db.engine)
+
+        for route in get_unbudgeted(app, ids):
+            print(f"{route:48} NO BUDGET")
+            failures += 1
+
+        print(f"{'route':48} {'statements':>12} {'median ms':>14}")
+        for method, template, max_statements, max_ms in BUDGETS:
+            if args.routes and not any(template.startswith(route) for route in args.routes):
+                continue
+            statements, median_ms, status = measure(client, recorder, method, template, ids, args.runs)
+            budget_ms = max_ms * args.latency_scale
+            over = len(statements) > max_statements or median_ms > budget_ms or status >= 400
+            failures += over
+            print(f"{method + ' ' + template:48} {len(statements):5d} / {max_statements:<5d} "
+                  f"{median_ms:6.1f} / {budget_ms:<6.0f}{'  OVER BUDGET' if over else ''}")
+            if status >= 400:
+                print(f"    returned {status}")
+            if len(statements) > max_statements:
+                print_statements(statements)
+        db.session.remove()
+
+    directory.cleanup()
+    if failures:
+        print(f"{failures} route(s) over budget or without one.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Compare JSON, MessagePack and CSV responses of the collection endpoints.
+
+    python benchmarks/formats.py
+    python benchmarks/formats.py --path /entries --runs 20
+
+Each format is requested through the app (Accept header) against the
+database in SQLALCHEMY_DATABASE_URI. The table shows the body size, its
+gzipped size, the median time of the whole request, and for JSON and
+MessagePack the median time to encode the already serialized documents,
+which isolates the encoder from the queries.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+
+import msgpack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+
+FORMATS = ['application/json', 'application/msgpack', 'text/csv']
+DEFAULT_PATHS = ['/performances', '/entries']
+
+ENCODERS = {
+    'application/json': lambda data: json.dumps(data).encode(),
+    'application/msgpack': lambda data: msgpack.packb(data, use_bin_type=True)
+}
+
+
+def median_ms(func, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', action='append', dest='paths')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    app = create_app({'RATE_LIMIT_ENABLED': False, 'RESPONSE_CACHE_ENABLED': False})
+    client = app.test_client()
+
+    print(f"{'route':16} {'format':22} {'bytes':>10} {'gzipped':>10} {'request ms':>11} {'encode ms':>10}")
+    for path in args.paths or DEFAULT_PATHS:
+        documents = client.get(path).get_json()
+        for mimetype in FORMATS:
+            headers = {'Accept': mimetype}
+            body = client.get(path, headers=headers).get_data()
+            request_ms = median_ms(lambda: client.get(path, headers=headers).get_data(), args.runs)
+            encode = ENCODERS.get(mimetype)
+            encode_ms = f"{median_ms(lambda: encode(documents), args.runs):10.2f}" if encode else f"{'-':>10}"
+            print(f"{path:16} {mimetype:22} {len(body):10d} {len(gzip.compress(body)):10d} "
+                  f"{request_ms:11.2f} {encode_ms}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Load test the API with contest-night traffic (benchmarks/locustfile.py).
+
+    python benchmarks/load.py seed --years 5
+    python benchmarks/load.py run --start-app
+    python benchmarks/load.py run --host http://localhost:5000 --users-scale 0.2
+    python benchmarks/load.py compare reports/1a2b3c4 reports/5d6e7f8
+
+Run against a local Postgres loaded the way production is:
+
+    createdb eurovision_load
+    psql eurovision_load < eurovision.psql
+    for f in migrations/*.sql; do psql eurovision_load < $f; done
+    export SQLALCHEMY_DATABASE_URI=postgresql:///eurovision_load
+    pip install -r benchmarks/requirements.txt
+
+`seed` adds synthetic countries, entries, semi-finals and finals (a later
+year than the real data, so the final being scored is a synthetic one).
+`run` drives Locust headless and keeps its CSV and HTML reports under
+reports/<commit>/, so runs before and after a change can be put side by
+side with `compare`. --start-app starts gunicorn (wsgi:app) with the rate
+limiter off and a throwaway API key, and stops it afterwards.
+"""
+
+import argparse
+import csv
+import datetime
+import os
+import random
+import string
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOCUSTFILE = os.path.join(ROOT, 'benchmarks', 'locustfile.py')
+REPORTS = os.path.join(ROOT, 'reports')
+
+# first synthetic contest; the real data ends well before it
+SEED_YEAR = 2100
+SEED_API_KEY = 'load-test'
+
+
+def seed_contests(years, country_count, random_seed, verbose=False):
+    """Add `years` synthetic contests of `country_count` countries, in an app context.
+
+    The same arguments always give the same contests (ids aside); seeding twice
+    adds nothing.
+    """
+
+    sys.path.insert(0, ROOT)
+    from models import Participant, Country, Entry, Event, Event_Entry
+
+    rng = random.Random(random_seed)
+    countries = []
+    for first in string.ascii_uppercase:
+        for second in string.ascii_uppercase:
+            if len(countries) == country_count:
+                break
+            country = Country.get_by_id(f"X{first}{second}") or Country.register(
+                f"X{first}{second}", f"Loadland {first}{second}", None)
+            countries.append(country)
+
+    for year in range(SEED_YEAR, SEED_YEAR + years):
+        host = rng.choice(countries)
+        events = {}
+        for number, type in enumerate(['semi-final', 'semi-final', 'final']):
+            name = f"Load {year} - {number + 1}"
+            events[name] = Event.get_by_props(name, type, year) or Event.register(
+                name, type, year, datetime.date(year, 5, 10 + 2 * number),
+                datetime.time(20, 0), datetime.time(23, 0), None, None, None, None,
+                f"Load City {year}", host.id)
+        semi_one, semi_two, final = events.values()
+
+        shuffled = rng.sample(countries, len(countries))
+        semis = {semi_one: shuffled[0::2], semi_two: shuffled[1::2]}
+        finalists = []
+        entries = {}
+        for country in countries:
+            entry = Entry.get_by_props(country.id, year)
+            if entry == None:
+                participant = Participant.register(
+                    f"Act {country.id} {year}", None, "Synthetic participant for load tests.")
+                entry = Entry.register(participant.id, country.id, f"Song {country.id} {year}", year,
+                                       None, None, None, None, None, None, None, None, 'English', None)
+            entries[country.id] = entry
+
+        for semi, semi_countries in semis.items():
+            qualifiers = set(rng.sample(range(len(semi_countries)), min(10, len(semi_countries))))
+            for order, country in enumerate(semi_countries):
+                Event_Entry.register(semi.id, entries[country.id].id, rng.randint(0, 300), None,
+                                     order in qualifiers, order + 1)
+                if order in qualifiers:
+                    finalists.append(country)
+
+        for order, country in enumerate(rng.sample(finalists, len(finalists))):
+            Event_Entry.register(final.id, entries[country.id].id, 0, None, None, order + 1)
+        if verbose:
+            print(f"{year}: {len(countries)} entries, {len(finalists)} in the final")
+
+
+def seed(args):
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    app = create_app({'RATE_LIMIT_ENABLED': False})
+    with app.app_context():
+        seed_contests(args.years, args.countries, args.random_seed, verbose=True)
+
+
+def get_report_name():
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+    dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD'], cwd=ROOT).returncode != 0
+    return (commit or 'unknown') + ('-dirty' if dirty else '')
+
+
+def wait_until_ready(host, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"{host}/countries", timeout=1):
+                return
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise SystemExit(f"{host} did not answer within {timeout} seconds.")
+            time.sleep(0.5)
+
+
+def run(args):
+    report = os.path.join(REPORTS, args.name or get_report_name())
+    os.makedirs(report, exist_ok=True)
+
+    environment = dict(os.environ, LOAD_SCALE=str(args.users_scale),
+                       LOAD_TIME_SCALE=str(args.time_scale))
+    server = None
+    if args.start_app:
+        server_environment = dict(os.environ, RATE_LIMIT_ENABLED='false', API_KEY=SEED_API_KEY)
+        environment['LOAD_API_KEY'] = SEED_API_KEY
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', args.host.split('//')[-1],
+                                   'wsgi:app'], cwd=ROOT, env=server_environment)
+    try:
+        if server != None:
+            wait_until_ready(args.host, 30)
+        returncode = subprocess.run(
+            [sys.executable, '-m', 'locust', '-f', LOCUSTFILE, '--headless', '--host', args.host, '--only-summary',
+             '--csv', os.path.join(report, 'stats'), '--html', os.path.join(report, 'report.html')],
+            cwd=ROOT, env=environment).returncode
+    finally:
+        if server != None:
+            server.terminate()
+            server.wait()
+    print(f"Reports in {os.path.relpath(report, ROOT)}/")
+    sys.exit(returncode)
+
+
+def read_stats(report):
+    """Per route: (requests/s, p50, p95, p99, failures) from Locust's stats CSV."""
+
+    stats = {}
+    with open(os.path.join(report, 'stats_stats.csv'), newline='') as f:
+        for row in csv.DictReader(f):
+            stats[f"{row['Type']} {row['Name']}".strip()] = [
+                float(row[column]) if row[column] not in ('', 'N/A') else 0.0
+                for column in ['Requests/s', '50%', '95%', '99%', 'Failure Count']]
+    return stats
+
+
+def compare(args):
+    before = read_stats(args.before)
+    after = read_stats(args.after)
+    columns = ['req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'failures']
+    print(f"{'route':36} " + " ".join(f"{column:>16}" for column in columns))
+    for route in sorted(set(before) | set(after), key=lambda route: (route.endswith('Aggregated'), route)):
+        if route not in before or route not in after:
+            print(f"{route:36} only in {'after' if route not in before else 'before'}")
+            continue
+        values = [f"{new:9.1f} {new - old:+6.1f}" for old, new in zip(before[route], after[route])]
+        print(f"{route:36} " + " ".join(f"{value:>16}" for value in values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help="add synthetic contests to the database")
+    seed_parser.add_argument('--years', type=int, default=3)
+    seed_parser.add_argument('--countries', type=int, default=40)
+    seed_parser.add_argument('--random-seed', type=int, default=2021)
+    seed_parser.set_defaults(func=seed)
+
+    run_parser = commands.add_parser('run', help="run the contest-night scenario")
+    run_parser.add_argument('--host', default='http://127.0.0.1:5000')
+    run_parser.add_argument('--start-app', action='store_true',
+                            help="start gunicorn on --host for the run")
+    run_parser.add_argument('--users-scale', type=float, default=1)
+    run_parser.add_argument('--time-scale', type=float, default=1,
+                            help="below 1 shortens the evening")
+    run_parser.add_argument('--name', help="report directory (default: the current commit)")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help="compare two report directories")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
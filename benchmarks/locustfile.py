@@ -0,0 +1,123 @@
+"""Contest-night traffic for Locust; run it through benchmarks/load.py.
+
+Three kinds of client, in proportion:
+
+* Viewer - polls the final (/events/<id>) and the scoreboard
+  (/performances?year=) every few seconds, sending If-None-Match like a
+  browser does;
+* Scorer - PATCHes a performance of the final with new points every few
+  seconds, with the API-Key from LOAD_API_KEY;
+* Crawler - walks /entries page by page and fetches each entry.
+
+ContestNightShape steps the number of users through the evening: the
+show, a burst while the votes are read out, then the results. Multiply
+the user counts with LOAD_SCALE (default 1) and shorten the evening with
+LOAD_TIME_SCALE (default 1).
+"""
+
+import os
+import random
+
+import requests
+from locust import HttpUser, LoadTestShape, between, constant_pacing, events, task
+
+API_KEY = os.environ.get('LOAD_API_KEY', '')
+SCALE = float(os.environ.get('LOAD_SCALE', 1))
+TIME_SCALE = float(os.environ.get('LOAD_TIME_SCALE', 1))
+
+# (seconds into the evening, users, users started per second)
+STAGES = [
+    (60, 50, 10),      # pre-show
+    (180, 200, 20),    # songs
+    (240, 1000, 100),  # voting burst
+    (300, 300, 50)     # results
+]
+
+# the final being watched, found when the test starts
+final = {}
+
+
+@events.test_start.add_listener
+def find_final(environment, **kwargs):
+    """Pick the latest final and its performances to poll and score."""
+
+    host = environment.host
+    events_list = requests.get(f"{host}/events?fields=id,type,year").json()['events']
+    finals = sorted((event for event in events_list if event['type'] == 'final'),
+                    key=lambda event: event['year'])
+    if not finals:
+        raise RuntimeError("No final in the database; run `python benchmarks/load.py seed` first.")
+    final['id'] = finals[-1]['id']
+    final['year'] = finals[-1]['year']
+    final['performances'] = requests.get(
+        f"{host}/events/{final['id']}?expand=performances").json()['event']['performances']
+
+
+class Viewer(HttpUser):
+    weight = 20
+    wait_time = between(2, 5)
+
+    def on_start(self):
+        self.etags = {}
+
+    def poll(self, path, name):
+        headers = {'If-None-Match': self.etags[path]} if path in self.etags else {}
+        with self.client.get(path, headers=headers, name=name, catch_response=True) as response:
+            if response.status_code in (200, 304):
+                if 'ETag' in response.headers:
+                    self.etags[path] = response.headers['ETag']
+                response.success()
+
+    @task(3)
+    def watch_final(self):
+        self.poll(f"/events/{final['id']}", "/events/[id]")
+
+    @task(2)
+    def watch_scoreboard(self):
+        self.poll(f"/performances?year={final['year']}", "/performances?year=[year]")
+
+
+class Scorer(HttpUser):
+    weight = 1
+    fixed_count = 2
+    wait_time = constant_pacing(3)
+
+    @task
+    def award_points(self):
+        performance = random.choice(final['performances'])
+        # leave out nulls: the form reads a missing field as empty, not null
+        document = {key: performance[key] for key in
+                    ('event_id', 'entry_id', 'place', 'qualified', 'running_order')
+                    if performance[key] != None}
+        document['points'] = (performance['points'] or 0) + random.choice([1, 2, 3, 4, 5, 6, 7, 8, 10, 12])
+        response = self.client.patch(f"/performances/{performance['id']}", json=document,
+                                     headers={'API-Key': API_KEY}, name="/performances/[id]")
+        if response.status_code == 200:
+            performance['points'] = document['points']
+
+
+class Crawler(HttpUser):
+    weight = 2
+    wait_time = between(0.5, 1.5)
+
+    def on_start(self):
+        self.offset = 0
+
+    @task
+    def crawl_entries(self):
+        page = self.client.get(f"/entries?limit=50&offset={self.offset}&fields=id",
+                               name="/entries?limit=50").json()
+        for entry in page['entries'][:5]:
+            self.client.get(f"/entries/{entry['id']}", name="/entries/[id]")
+        self.offset = self.offset + 50 if page['has_more'] else 0
+
+
+class ContestNightShape(LoadTestShape):
+    """Users over the evening, per STAGES."""
+
+    def tick(self):
+        run_time = self.get_run_time()
+        for end, users, spawn_rate in STAGES:
+            if run_time < end * TIME_SCALE:
+                return (max(1, round(users * SCALE)), spawn_rate * SCALE)
+        return None
@@ -0,0 +1,71 @@
+"""Measure how long a fresh worker takes to become ready.
+
+Each run starts a new interpreter, so nothing is cached between runs:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20 --eager
+
+Phases are timed cumulatively: importing `app`, create_app(), then the
+first request. --eager also imports the modules the app otherwise loads on
+first use (what a --preload master does), to show what laziness saves.
+SQLALCHEMY_DATABASE_URI must point at a database with the schema.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, sys, time
+start = time.perf_counter()
+times = {}
+import app
+times['import'] = time.perf_counter() - start
+if %(eager)r:
+    app.preload_lazy_modules()
+    times['preload'] = time.perf_counter() - start
+flask_app = app.create_app({'RATE_LIMIT_ENABLED': False})
+times['create_app'] = time.perf_counter() - start
+response = flask_app.test_client().get(%(path)r)
+times['first_request'] = time.perf_counter() - start
+times['status'] = response.status_code
+times['modules'] = len(sys.modules)
+print(json.dumps(times))
+"""
+
+
+def run_once(path, eager):
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER % {'path': path, 'eager': eager}],
+        cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/countries')
+    parser.add_argument('--eager', action='store_true',
+                        help="also import the lazily loaded modules up front")
+    args = parser.parse_args()
+
+    results = [run_once(args.path, args.eager) for _ in range(args.runs)]
+    if any(result['status'] != 200 for result in results):
+        print(f"warning: GET {args.path} returned {results[0]['status']}")
+
+    print(f"{args.runs} runs, first request GET {args.path}, {results[0]['modules']} modules loaded")
+    print(f"{'phase':16} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for phase in ['import', 'preload', 'create_app', 'first_request']:
+        if phase not in results[0]:
+            continue
+        values = [result[phase] * 1000 for result in results]
+        print(f"{phase:16} {statistics.median(values):10.1f} {min(values):10.1f} {max(values):10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Content-addressed storage for large text fields.
+
+    python blobs.py            # move existing large values to the store
+
+Entry lyrics and participant descriptions at least BLOB_MIN_BYTES long
+are written to the store under the SHA-256 of their content, and the row
+keeps only that hash (lyrics_hash, lyrics_english_hash, description_hash)
+with the text column left NULL. Documents then carry a `<field>_url`
+pointing at /blobs/<hash>, which never changes for a given hash and is
+served with a year-long immutable Cache-Control.
+
+BLOB_STORE_URL picks the backend:
+
+* a path or file:///path - files under that directory;
+* s3://bucket/prefix - any S3-compatible service, at
+  BLOB_S3_ENDPOINT_URL if set (requires the `boto3` package).
+
+Without BLOB_STORE_URL every value stays inline, as before.
+"""
+
+import argparse
+import hashlib
+import os
+from urllib.parse import urlparse
+
+from flask import current_app
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+
+def get_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class FileSystemBlobStore:
+    """Blobs as files named by hash, in two levels of subdirectories."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def get_path(self, blob_hash):
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def put(self, data):
+        blob_hash = get_hash(data)
+        path = self.get_path(blob_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # unique temporary name: two workers may store the same blob
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        return blob_hash
+
+    def get(self, blob_hash):
+        try:
+            with open(self.get_path(blob_hash), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3BlobStore:
+    """Blobs as objects named by hash in an S3-compatible bucket."""
+
+    def __init__(self, bucket, prefix, endpoint_url=None):
+        if boto3 is None:
+            raise RuntimeError(
+                "BLOB_STORE_URL is an s3:// URL but the boto3 package is not installed.")
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+
+    def put(self, data):
+        # an object's content never changes, so rewriting one is harmless
+        blob_hash = get_hash(data)
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + blob_hash, Body=data,
+                               ContentType='text/plain; charset=utf-8')
+        return blob_hash
+
+    def get(self, blob_hash):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + blob_hash)['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+
+def create_blob_store(url, s3_endpoint_url=None):
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == 's3':
+        return S3BlobStore(parsed.netloc, parsed.path, s3_endpoint_url)
+    if parsed.scheme in ('', 'file'):
+        return FileSystemBlobStore(parsed.path)
+    raise ValueError(f"BLOB_STORE_URL must be a path, file:// or s3:// URL, not {url}.")
+
+
+def init_blob_store(app):
+    app.extensions['blob_store'] = create_blob_store(app.config.get('BLOB_STORE_URL'),
+                                                     app.config.get('BLOB_S3_ENDPOINT_URL'))
+
+
+def get_blob_store():
+    return current_app.extensions.get('blob_store')
+
+
+def offload_text(value):
+    """Return (text, hash): the text inline, or None and its hash once stored."""
+
+    store = get_blob_store()
+    if store == None or value == None:
+        return (value, None)
+    data = value.encode()
+    if len(data) < current_app.config['BLOB_MIN_BYTES']:
+        return (value, None)
+    return (None, store.put(data))
+
+
+def blob_url(blob_hash):
+    return f"/blobs/{blob_hash}" if blob_hash != None else None
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+
+    from app import create_app
+    from models import db, Participant, Entry
+
+    # model -> text column -> hash column
+    offloaded = {
+        Participant: {'description': 'description_hash'},
+        Entry: {'lyrics': 'lyrics_hash', 'lyrics_english': 'lyrics_english_hash'}
+    }
+    app = create_app()
+    with app.app_context():
+        if get_blob_store() == None:
+            raise SystemExit("Set BLOB_STORE_URL to move text to a blob store.")
+        moved = 0
+        for model, columns in offloaded.items():
+            for instance in model.query.all():
+                for text_column, hash_column in columns.items():
+                    text, blob_hash = offload_text(getattr(instance, text_column))
+                    if blob_hash != None:
+                        setattr(instance, text_column, text)
+                        setattr(instance, hash_column, blob_hash)
+                        moved += 1
+            db.session.commit()
+        print(f"Moved {moved} values to the blob store.")
+
+
+if __name__ == '__main__':
+    main()
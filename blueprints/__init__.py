@@ -0,0 +1,18 @@
+"""Route blueprints, one module per resource.
+
+A module is only imported when an app registers it, so importing `app`
+to get at create_app() does not pull in every view, form and validator.
+"""
+
+import importlib
+
+BLUEPRINTS = ['api', 'participants', 'countries', 'entries', 'events', 'performances', 'export',
+              'analytics', 'jobs', 'blobs', 'media', 'profiles']
+
+
+def register_blueprints(app, names=None):
+    """Import and register the named blueprint modules (all by default)."""
+
+    for name in (names or BLUEPRINTS):
+        module = importlib.import_module(f'blueprints.{name}')
+        app.register_blueprint(module.blueprint)
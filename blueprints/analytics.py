@@ -0,0 +1,127 @@
+"""Analytics routes; the computations live in analytics.py."""
+
+from flask import Blueprint, request, jsonify
+from blueprints.helpers import EVENT_TYPE_LIST
+from blueprints.resource import fail
+
+blueprint = Blueprint('analytics', __name__)
+
+
+class AnalyticsError(ValueError):
+    """Raised for invalid analytics query parameters."""
+
+
+def get_int_arg(name, default=None, minimum=None):
+    value = request.args.get(name, None)
+    if value == None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise AnalyticsError(f"{name} must be an integer.")
+    if minimum != None and value < minimum:
+        raise AnalyticsError(f"{name} must be at least {minimum}.")
+    return value
+
+
+def load_frame(default_type='final'):
+    """The filtered performance frame for this request, or None without pandas."""
+
+    # pandas is only imported once analytics are requested
+    import analytics
+    if analytics.pandas is None:
+        return (analytics, None)
+
+    event_type = request.args.get('type', default_type)
+    if event_type not in EVENT_TYPE_LIST:
+        raise AnalyticsError(f"type must be one of {', '.join(EVENT_TYPE_LIST)}.")
+    frame = analytics.filter_frame(analytics.performance_frame.get(), event_type,
+                                   get_int_arg('from'), get_int_arg('to'))
+    return (analytics, frame)
+
+
+def not_available():
+    response = {
+        "status": "error",
+        "message": "Analytics are not available: the pandas package is not installed."
+    }
+    return (jsonify(response), 501)
+
+
+@blueprint.errorhandler(AnalyticsError)
+def handle_analytics_error(error):
+    return fail(str(error))
+
+# -------------------------------------------------------------------
+
+
+@blueprint.route('/analytics/points-matrix', methods=['GET'])
+def get_points_matrix():
+
+    analytics, frame = load_frame()
+    if frame is None:
+        return not_available()
+
+    matrix = analytics.points_matrix(frame)
+    response = {
+        "countries": list(matrix.index),
+        "years": [int(year) for year in matrix.columns],
+        "points": analytics.to_json_values(matrix.to_numpy(dtype=float))
+    }
+    return jsonify(response)
+
+# -------------------------------------------------------------------
+
+
+@blueprint.route('/analytics/rolling-average', methods=['GET'])
+def get_rolling_average():
+
+    window = get_int_arg('window', 5, minimum=1)
+    analytics, frame = load_frame()
+    if frame is None:
+        return not_available()
+
+    matrix = analytics.rolling_average(frame, window)
+    response = {
+        "window": window,
+        "countries": list(matrix.index),
+        "years": [int(year) for year in matrix.columns],
+        "average_points": analytics.to_json_values(matrix.to_numpy(dtype=float))
+    }
+    return jsonify(response)
+
+# -------------------------------------------------------------------
+
+
+@blueprint.route('/analytics/running-order-correlation', methods=['GET'])
+def get_running_order_correlation():
+
+    analytics, frame = load_frame()
+    if frame is None:
+        return not_available()
+
+    overall, by_year = analytics.running_order_correlation(frame)
+    response = {
+        "method": "spearman",
+        "overall": analytics.to_json_values([[overall]])[0][0],
+        "by_year": dict(zip([str(int(year)) for year in by_year.index],
+                            analytics.to_json_values([by_year.to_numpy(dtype=float)])[0]))
+    }
+    return jsonify(response)
+
+# -------------------------------------------------------------------
+
+
+@blueprint.route('/analytics/qualification-streaks', methods=['GET'])
+def get_qualification_streaks():
+
+    analytics, frame = load_frame(default_type='semi-final')
+    if frame is None:
+        return not_available()
+
+    streaks = analytics.qualification_streaks(frame)
+    response = {
+        "countries": {country_id: {key: int(value) for key, value in row.items()}
+                      for country_id, row in streaks.to_dict(orient='index').items()}
+    }
+    return jsonify(response)
@@ -0,0 +1,72 @@
+"""Routes outside the five resources: the welcome page, the change feed and GraphQL."""
+
+from flask import Blueprint, request, jsonify, render_template
+from models import Change
+from blueprints.resource import fail
+import json
+
+CHANGES_PAGE_SIZE = 500
+
+blueprint = Blueprint('api', __name__)
+
+
+@blueprint.route('/')
+def show_api_welcome_page():
+
+    return render_template('api_information.html')
+
+
+#####################################################################
+# --------------------------- Changes ----------------------------- #
+#####################################################################
+
+
+@blueprint.route('/changes', methods=['GET'])
+def get_changes():
+
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', CHANGES_PAGE_SIZE)),
+                    CHANGES_PAGE_SIZE)
+        if since < 0 or limit < 1:
+            raise ValueError()
+    except ValueError:
+        return fail("since must be a non-negative integer and limit a positive integer.")
+
+    changes = Change.get_since(since, limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    response = {
+        "changes": [change.serialize() for change in changes],
+        "cursor": changes[-1].id if changes else since,
+        "has_more": has_more
+    }
+    return jsonify(response)
+
+#####################################################################
+# --------------------------- GraphQL ----------------------------- #
+#####################################################################
+
+
+@blueprint.route('/graphql', methods=['GET', 'POST'])
+def graphql():
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return (jsonify({"errors": [{"message": "Body must be a JSON object."}]}), 400)
+        variables = data.get('variables', None)
+    else:
+        data = request.args
+        try:
+            variables = json.loads(data.get('variables', 'null'))
+        except ValueError:
+            return (jsonify({"errors": [{"message": "variables must be valid JSON."}]}), 400)
+
+    # graphql-core is only imported once the endpoint is used
+    from graphql_api import execute_query
+
+    response, status = execute_query(
+        data.get('query', None), variables, data.get('operationName', None))
+    return (jsonify(response), status)
@@ -0,0 +1,30 @@
+"""Blob routes: the large text fields kept in the blob store (see blobs.py)."""
+
+import re
+
+from flask import Blueprint, Response, request
+from blobs import get_blob_store
+from blueprints.resource import not_found
+
+blueprint = Blueprint('blobs', __name__)
+
+BLOB_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+# a hash always names the same content
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+@blueprint.route('/blobs/<blob_hash>', methods=['GET'])
+def get_blob(blob_hash):
+
+    store = get_blob_store()
+    data = store.get(blob_hash) if store != None and BLOB_HASH.match(blob_hash) else None
+    if data == None:
+        return not_found('blob', blob_hash)
+
+    response = Response(data, mimetype='text/plain')
+    response.set_etag(blob_hash)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
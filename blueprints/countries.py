@@ -0,0 +1,27 @@
+"""Country routes."""
+
+from models import Country
+from blueprints.resource import ResourceHandler
+
+
+class CountryHandler(ResourceHandler):
+    name = 'country'
+    plural = 'countries'
+    model = Country
+    form = 'CountryForm'
+    update_form = 'CountryUpdateForm'
+    fields = ('id', 'country', 'flag_image_url')
+    update_fields = ('country', 'flag_image_url')
+    natural_key = ('id',)
+    title_field = 'country'
+
+    def find_duplicate(self, data):
+        # ids are stored upper case
+        return Country.get_by_id((data.get('id', None) or '').upper())
+
+    def duplicate_message(self, existing):
+        return f"{existing.id} already exists in the database as {existing.country}."
+
+
+handler = CountryHandler()
+blueprint = handler.blueprint
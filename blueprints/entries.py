@@ -0,0 +1,42 @@
+"""Entry routes."""
+
+from sqlalchemy.orm import joinedload
+
+from models import Participant, Country, Entry, get_column_values, reference_data
+from blueprints.resource import ResourceHandler
+
+
+class EntryHandler(ResourceHandler):
+    name = 'entry'
+    plural = 'entries'
+    model = Entry
+    form = 'EntryForm'
+    fields = ('participant_id', 'country_id', 'title', 'year', 'eurovision_resource_url',
+              'eurovision_video_url', 'music_video_url', 'spotify_url', 'written_by',
+              'composed_by', 'broadcaster', 'lyrics', 'lyrics_language', 'lyrics_english')
+    natural_key = ('country_id', 'year')
+    filters = ('year',)
+    reference_fields = ('country_id',)
+    title_field = 'title'
+
+    def get_choices(self):
+        return {
+            'participant_id': Participant.get_choices(),
+            'country_id': Country.get_choices()
+        }
+
+    def duplicate_message(self, existing):
+        return "An entry for this year and country already exists in the database."
+
+    def csv_options(self):
+        return [joinedload(Entry.participant)]
+
+    def csv_row(self, entry):
+        row = get_column_values(entry)
+        row['participant'] = entry.participant.name
+        row['country'] = reference_data.country_name(entry.country_id)
+        return row
+
+
+handler = EntryHandler()
+blueprint = handler.blueprint
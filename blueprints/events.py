@@ -0,0 +1,98 @@
+"""Event routes, including the live scoreboard stream."""
+
+from flask import Response, jsonify
+from models import Country, Event, Event_Entry
+from pubsub import broker, event_channel, format_sse, Subscription
+from blueprints.helpers import EVENT_TYPE_LIST
+from blueprints.resource import ResourceHandler, fail, not_found
+
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+class EventHandler(ResourceHandler):
+    name = 'event'
+    plural = 'events'
+    model = Event
+    form = 'EventForm'
+    fields = ('event', 'type', 'year', 'date', 'start_time', 'end_time',
+              'eurovision_resource_url', 'recap_video_url', 'video_playlist_url',
+              'spotify_playlist_url', 'host_city', 'host_country_id')
+    natural_key = ('event', 'type', 'year')
+    filters = ('year',)
+    reference_fields = ('host_country_id',)
+    title_field = 'event'
+
+    def get_choices(self):
+        return {
+            'type': EVENT_TYPE_LIST,
+            'host_country_id': Country.get_choices()
+        }
+
+    def duplicate_message(self, existing):
+        return "An event with this name, type, and year already exists in the database."
+
+
+handler = EventHandler()
+blueprint = handler.blueprint
+
+# -------------------------------------------------------------------
+
+
+@blueprint.route('/events/<event_id>/qualification', methods=['GET'])
+def get_qualification(event_id):
+
+    event = Event.get_by_id(event_id)
+    if event == None:
+        return not_found('event', event_id)
+    if event.type != 'semi-final':
+        return fail(f"Event with id {event_id} is a {event.type}, not a semi-final.")
+
+    performances = Event_Entry.get_qualification(event)
+    response = {
+        "event_id": event.id,
+        "event": event.event,
+        "year": event.year,
+        "qualifiers": sum(1 for performance in performances if performance['qualified']),
+        "performances": performances
+    }
+    return handler.respond(response, 'performances')
+
+# -------------------------------------------------------------------
+
+
+@blueprint.route('/events/<event_id>/stream', methods=['GET'])
+def stream_event(event_id):
+
+    event = Event.get_by_id(event_id)
+    if event == None:
+        response = {
+            "status": "not found",
+            "message": f"There is no event with id {event_id}."
+        }
+        return (jsonify(response), 404)
+
+    # subscribe before reading the snapshot so no delta is missed
+    subscription = Subscription(broker, event_channel(event_id))
+    snapshot = {
+        "type": "snapshot",
+        "event_id": event_id,
+        "performances": [performance.serialize() for performance in event.performances]
+    }
+
+    def generate():
+        try:
+            yield format_sse(snapshot, event="snapshot")
+            while True:
+                message = subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if message == None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_sse(message, event=message["type"])
+        finally:
+            subscription.close()
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    }
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
@@ -0,0 +1,45 @@
+"""Columnar export routes; the work is done by export.py."""
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from blueprints.resource import fail
+
+blueprint = Blueprint('export', __name__)
+
+MIMETYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+
+@blueprint.route('/export/performances.<file_format>', methods=['GET'])
+def export_performances(file_format):
+
+    if file_format not in MIMETYPES:
+        response = {
+            "status": "not found",
+            "message": f"Performances can be exported as {' or '.join(MIMETYPES)}."
+        }
+        return (jsonify(response), 404)
+
+    year = request.args.get('year', None)
+    if year != None:
+        try:
+            year = int(year)
+        except ValueError:
+            return fail("year must be an integer.")
+
+    # pyarrow is only imported once an export is requested
+    import export
+    if export.pyarrow is None:
+        response = {
+            "status": "error",
+            "message": "Columnar export is not available: the pyarrow package is not installed."
+        }
+        return (jsonify(response), 501)
+
+    filename = f"performances.{file_format}" if year == None else f"performances-{year}.{file_format}"
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}"
+    }
+    chunks = export.generate_file(export.iter_batches(year), file_format)
+    return Response(stream_with_context(chunks), mimetype=MIMETYPES[file_format], headers=headers)
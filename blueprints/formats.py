@@ -0,0 +1,52 @@
+"""Response formats for collection endpoints besides JSON.
+
+Clients choose with the Accept header:
+
+* application/msgpack - the same document as the JSON response, packed
+  with MessagePack; smaller and faster to decode for service-to-service
+  calls.
+* text/csv - one row per resource, written while the rows are read from
+  a server-side cursor, so memory does not grow with the table.
+"""
+
+import csv
+import io
+
+import msgpack
+from flask import Response, request
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+CSV_MIMETYPE = 'text/csv'
+
+# rows fetched per round trip while streaming CSV
+CSV_BATCH_SIZE = 500
+
+
+def negotiate():
+    """The mimetype to answer with; JSON unless the client prefers another."""
+
+    return request.accept_mimetypes.best_match(
+        [JSON_MIMETYPE, MSGPACK_MIMETYPE, CSV_MIMETYPE], default=JSON_MIMETYPE)
+
+
+def msgpack_response(data):
+    return Response(msgpack.packb(data, use_bin_type=True), mimetype=MSGPACK_MIMETYPE)
+
+
+def generate_csv(rows):
+    """Yield CSV text for an iterable of flat dicts, header first."""
+
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer == None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row), extrasaction='ignore')
+            writer.writeheader()
+        writer.writerow(row)
+        if buffer.tell() > 16 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
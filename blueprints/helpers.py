@@ -0,0 +1,80 @@
+"""Helpers shared by the route blueprints."""
+
+from flask import current_app, request, jsonify
+from functools import wraps
+from models import Participant, Country, Entry, Event, Event_Entry
+from pubsub import broker, event_channel
+from expand import expand, parse_expand
+
+EVENT_TYPE_LIST = ['contest', 'semi-final', 'final']
+EXPANDABLE_MODELS = {
+    'participant': Participant,
+    'country': Country,
+    'entry': Entry,
+    'event': Event,
+    'performance': Event_Entry
+}
+
+
+def api_key_required(func):
+    @wraps(func)
+    def decorated_function(*args, **kwargs):
+        api_key = request.headers.get('API-Key', None)
+        if api_key == None:
+            # participant routes historically took the key in the JSON body
+            api_key = (request.get_json(silent=True) or {}).get('api_key', None)
+        response = check_API_credentials(api_key)
+        if response != True:
+            return response
+        return func(*args, **kwargs)
+    return decorated_function
+
+# -------------------------------------------------------------------
+
+
+def check_API_credentials(api_key):
+    if api_key != current_app.config['API_KEY'] or api_key == None:
+        response = {
+            "status": "fail",
+            "message": "Must provide valid API key."
+        }
+        return (jsonify(response), 401)
+
+    else:
+        return True
+
+# -------------------------------------------------------------------
+
+
+def load_expansion(resource, ids):
+    model = EXPANDABLE_MODELS[resource]
+    return model.serialize_all(model.get_many(ids))
+
+
+def serialize_with_expansion(resource, items):
+    """Serialize items, resolving any ?expand= paths in batched queries."""
+
+    tree = parse_expand(resource, request.args.get('expand'))
+    documents = EXPANDABLE_MODELS[resource].serialize_all(items)
+    expand(resource, documents, tree, load_expansion)
+    return documents
+
+
+def handle_expand_error(error):
+    response = {
+        "status": "fail",
+        "message": str(error)
+    }
+    return (jsonify(response), 400)
+
+# -------------------------------------------------------------------
+
+
+def publish_performance_change(event_id, change_type, performance):
+    """Push a scoreboard delta to everyone streaming the event."""
+
+    if event_id != None:
+        broker.publish(event_channel(event_id), {
+            "type": change_type,
+            "performance": performance
+        })
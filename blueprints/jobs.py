@@ -0,0 +1,54 @@
+"""Background job routes: queue a job, check on it, and queue metrics."""
+
+from flask import Blueprint, request, jsonify, url_for
+from models import Job
+from jobs import JOB_HANDLERS, enqueue, get_metrics
+from blueprints.helpers import api_key_required
+from blueprints.resource import fail, not_found
+
+blueprint = Blueprint('jobs', __name__)
+
+
+@blueprint.route('/jobs', methods=['GET'])
+@api_key_required
+def get_job_metrics():
+
+    response = {
+        "jobs": get_metrics(),
+        "recent_failures": [failed.serialize() for failed in
+                            Job.query.filter_by(status='failed').order_by(Job.id.desc()).limit(10)]
+    }
+    return jsonify(response)
+
+
+@blueprint.route('/jobs', methods=['POST'])
+@api_key_required
+def add_job():
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return fail("Body must be a JSON object.")
+    name = data.get('name', None)
+    if name not in JOB_HANDLERS:
+        return fail(f"name must be one of {', '.join(sorted(JOB_HANDLERS))}.")
+    payload = data.get('payload', None)
+    if payload != None and not isinstance(payload, dict):
+        return fail("payload must be an object.")
+
+    queued = enqueue(name, payload)
+    response = {
+        "status": "queued",
+        "job": queued.serialize(),
+        "message": f"Job {queued.id} queued."
+    }
+    return (jsonify(response), 202, {"Location": url_for('jobs.get_job', id=queued.id)})
+
+
+@blueprint.route('/jobs/<int:id>', methods=['GET'])
+@api_key_required
+def get_job(id):
+
+    found = Job.get_by_id(id)
+    if found == None:
+        return not_found('job', id)
+    return jsonify({"job": found.serialize()})
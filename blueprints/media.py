@@ -0,0 +1,63 @@
+"""Media routes: resized participant photos and country flags (see media.py)."""
+
+from flask import Blueprint, Response, current_app, request, jsonify
+from models import db, Participant, Country
+from blueprints.resource import fail, not_found
+
+blueprint = Blueprint('media', __name__)
+
+# kind -> (model, column holding the source URL)
+MEDIA_KINDS = {
+    'participant': (Participant, Participant.image_url),
+    'country': (Country, Country.flag_image_url)
+}
+
+
+@blueprint.route('/media/<kind>/<id>', methods=['GET'])
+def get_media(kind, id):
+
+    if kind not in MEDIA_KINDS:
+        response = {
+            "status": "not found",
+            "message": f"Media kind must be one of {', '.join(MEDIA_KINDS)}."
+        }
+        return (jsonify(response), 404)
+
+    try:
+        requested = int(request.args.get('w', 0))
+        if requested < 0:
+            raise ValueError()
+    except ValueError:
+        return fail("w must be a non-negative integer.")
+
+    # Pillow is only imported once an image is requested
+    import media
+    if media.Image is None:
+        response = {
+            "status": "error",
+            "message": "Images are not available: the Pillow package is not installed."
+        }
+        return (jsonify(response), 501)
+
+    model, column = MEDIA_KINDS[kind]
+    url = db.session.query(column).filter(model.id == id).scalar()
+    if url == None:
+        return not_found(f"{kind} image", id)
+
+    width = media.get_width(requested) if requested else media.MEDIA_WIDTHS[-1]
+    mimetype = request.accept_mimetypes.best_match(list(media.MEDIA_FORMATS), default='image/png')
+    try:
+        data = media.get_media_cache(current_app).get_variant(url, width, mimetype)
+    except media.MediaError as error:
+        response = {
+            "status": "error",
+            "message": str(error)
+        }
+        return (jsonify(response), 502)
+
+    response = Response(data, mimetype=mimetype)
+    response.vary.add('Accept')
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['MEDIA_MAX_AGE_SECONDS']
+    return response.make_conditional(request)
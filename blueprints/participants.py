@@ -0,0 +1,21 @@
+"""Participant routes."""
+
+from models import Participant
+from blueprints.resource import ResourceHandler
+
+
+class ParticipantHandler(ResourceHandler):
+    name = 'participant'
+    plural = 'participants'
+    model = Participant
+    form = 'ParticipantForm'
+    fields = ('name', 'image_url', 'description')
+    natural_key = ('name',)
+    title_field = 'name'
+
+    def duplicate_message(self, existing):
+        return f"{existing.name} already exists in the database with ID {existing.id}."
+
+
+handler = ParticipantHandler()
+blueprint = handler.blueprint
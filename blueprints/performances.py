@@ -0,0 +1,59 @@
+"""Performance (event-entry) routes."""
+
+from models import Entry, Event, Event_Entry
+from blueprints.helpers import publish_performance_change
+from blueprints.resource import ResourceHandler
+
+
+class PerformanceHandler(ResourceHandler):
+    name = 'performance'
+    plural = 'performances'
+    model = Event_Entry
+    form = 'EventEntryForm'
+    fields = ('event_id', 'entry_id', 'points', 'place', 'qualified', 'running_order')
+    natural_key = ('event_id', 'entry_id')
+    filters = ('year',)
+    reference_fields = ('event_id',)
+    title_field = 'id'
+
+    def get_choices(self):
+        return {
+            'event_id': Event.get_choices(),
+            'entry_id': Entry.get_choices(),
+            'qualified': [('true', 'Yes'), ('false', 'No')]
+        }
+
+    def duplicate_message(self, existing):
+        return "A performance with this entry and event already exists in the database."
+
+    def created_message(self, instance):
+        return "Performance added to database."
+
+    def load_options(self):
+        # ?year= also goes on the entries join, so a year-partitioned entries
+        # table (migration 006) is read from one partition
+        return Event_Entry.load_options(self.get_filters().get('year'))
+
+    def csv_options(self):
+        return self.load_options()
+
+    def csv_row(self, performance):
+        return performance.serialize()
+
+    # keep live scoreboards (/events/<id>/stream) in step with writes
+
+    def created(self, instance, document):
+        publish_performance_change(instance.event_id, "upsert", document)
+
+    def updated(self, instance, document, previous):
+        if previous['event_id'] != instance.event_id:
+            publish_performance_change(
+                previous['event_id'], "delete", {"id": instance.id})
+        publish_performance_change(instance.event_id, "upsert", document)
+
+    def deleted(self, id, previous):
+        publish_performance_change(previous['event_id'], "delete", {"id": id})
+
+
+handler = PerformanceHandler()
+blueprint = handler.blueprint
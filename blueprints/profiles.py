@@ -0,0 +1,48 @@
+"""Profile routes: list and download request profiles (see profiling.py)."""
+
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, send_file, url_for
+from profiling import is_admin
+from blueprints.resource import not_found
+
+blueprint = Blueprint('profiles', __name__)
+
+
+def admin_key_required(func):
+    @wraps(func)
+    def decorated_function(*args, **kwargs):
+        if not is_admin(current_app):
+            response = {
+                "status": "fail",
+                "message": "Must provide valid admin key."
+            }
+            return (jsonify(response), 401)
+        return func(*args, **kwargs)
+    return decorated_function
+
+
+@blueprint.route('/profiles', methods=['GET'])
+@admin_key_required
+def get_all_profiles():
+
+    profiles = current_app.extensions['profiles'].get_all()
+    for details in profiles:
+        details['url'] = url_for('profiles.get_profile', profile_id=details['id'])
+    return jsonify({"profiles": profiles})
+
+
+@blueprint.route('/profiles/<profile_id>', methods=['GET'])
+@admin_key_required
+def get_profile(profile_id):
+
+    store = current_app.extensions['profiles']
+    details = store.get(profile_id)
+    if details == None:
+        return not_found('profile', profile_id)
+    try:
+        return send_file(store.get_path(details), mimetype=details['mimetype'],
+                         as_attachment=True, attachment_filename=details['file'])
+    except FileNotFoundError:
+        # pruned by another worker since the details were read
+        return not_found('profile', profile_id)
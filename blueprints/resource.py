@@ -0,0 +1,365 @@
+"""Generic handlers for the five resources.
+
+A resource subclasses ResourceHandler and declares its model, forms, the
+fields its model's register/update methods take and its natural key; the
+handler turns that into a blueprint with the usual routes. What applies to
+every resource is implemented here once:
+
+* GET responses carry an ETag and answer a matching If-None-Match with 304;
+* ?fields=a,b keeps only those fields of each returned document;
+* ?expand= loads related resources in batched queries;
+* successful writes queue their follow-up work (see jobs.py);
+* collections are loaded with the model's eager load options, can be
+  filtered on the declared columns (e.g. ?year=), paged with ?limit= and
+  ?offset=, and are also served as MessagePack or
+  streamed CSV when the Accept header asks for it (see formats.py).
+"""
+
+import importlib
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from models import get_column_values, reference_data
+from jobs import enqueue_refreshes
+from blueprints.helpers import api_key_required, serialize_with_expansion
+from blueprints.formats import (CSV_BATCH_SIZE, CSV_MIMETYPE, MSGPACK_MIMETYPE,
+                                generate_csv, msgpack_response, negotiate)
+
+MAX_PAGE_SIZE = 500
+
+
+def not_found(name, id):
+    response = {
+        "status": "not found",
+        "message": f"There is no {name} with id {id}."
+    }
+    return (jsonify(response), 404)
+
+
+def fail(message):
+    response = {
+        "status": "fail",
+        "message": message
+    }
+    return (jsonify(response), 400)
+
+
+class ResourceHandler:
+    """CRUD routes for one model; subclasses fill in the declarations."""
+
+    name = None            # singular, as in response keys and messages
+    plural = None          # collection route and blueprint name
+    model = None
+    form = None            # name of the form class in forms.py
+    update_form = None     # defaults to form
+    fields = ()            # model.register arguments, in order
+    update_fields = None   # model.update arguments after the instance; defaults to fields
+    natural_key = ()       # fields the unique constraint covers
+    filters = ()           # integer columns collections can be filtered on, e.g. ?year=
+    reference_fields = ()  # select fields whose choices come from reference_data
+    title_field = None     # attribute naming an instance in messages
+
+    def __init__(self):
+        self.blueprint = Blueprint(self.plural, __name__)
+        collection = f"/{self.plural}"
+        resource = f"/{self.plural}/<id>"
+        self.blueprint.add_url_rule(collection, f"add_{self.name}",
+                                    api_key_required(self.add), methods=['POST'])
+        self.blueprint.add_url_rule(collection, f"get_all_{self.plural}",
+                                    self.get_all, methods=['GET'])
+        self.blueprint.add_url_rule(resource, f"get_{self.name}",
+                                    self.get_one, methods=['GET'])
+        self.blueprint.add_url_rule(resource, f"update_{self.name}",
+                                    api_key_required(self.update), methods=['PATCH', 'PUT'])
+        self.blueprint.add_url_rule(resource, f"delete_{self.name}",
+                                    api_key_required(self.delete), methods=['DELETE'])
+
+    # -------------------------------------------------------------------
+    # declarations subclasses may override
+
+    def get_choices(self):
+        """Form field -> choices, for select fields filled from the database."""
+
+        return {}
+
+    def serialize(self, items):
+        return serialize_with_expansion(self.name, items)
+
+    def load_options(self):
+        """Eager loads for a collection; the model's unless overridden."""
+
+        return self.model.load_options()
+
+    def csv_options(self):
+        """Eager loads csv_row() needs; only many-to-one joins work with a streaming cursor."""
+
+        return []
+
+    def csv_row(self, instance):
+        """One flat CSV row; the table's own columns unless overridden."""
+
+        return get_column_values(instance)
+
+    def find_duplicate(self, data):
+        values = {key: data.get(key, None) for key in self.natural_key}
+        if None in values.values():
+            return None
+        return self.model.query.filter_by(**values).one_or_none()
+
+    def duplicate_message(self, existing):
+        return f"A {self.name} with this {', '.join(self.natural_key)} already exists in the database."
+
+    def created_message(self, instance):
+        return f"{getattr(instance, self.title_field)} added to {self.plural}."
+
+    def created(self, instance, document):
+        """Called after a resource is created."""
+
+    def updated(self, instance, document, previous):
+        """Called after a resource is updated; `previous` holds its old column values."""
+
+    def deleted(self, id, previous):
+        """Called after a resource is deleted; `previous` holds its column values."""
+
+    # -------------------------------------------------------------------
+
+    def make_form(self, form_name):
+        form = getattr(importlib.import_module('forms'), form_name)()
+        choices = self.get_choices()
+        if any(self.is_missing_choice(form, field, choices[field]) for field in self.reference_fields):
+            # the id may have been added on another worker since this one
+            # loaded its reference data; look again before rejecting it
+            reference_data.reload()
+            choices = self.get_choices()
+        for field, field_choices in choices.items():
+            getattr(form, field).choices = field_choices
+        return form
+
+    def is_missing_choice(self, form, field, choices):
+        value = getattr(form, field).data
+        if value in (None, ''):
+            return False
+        return value not in [choice[0] if isinstance(choice, tuple) else choice for choice in choices]
+
+    def get_fields(self):
+        fields = request.args.get('fields')
+        if not fields:
+            return None
+        return set(field.strip() for field in fields.split(','))
+
+    def respond(self, response, key, mimetype=None):
+        """Response for a GET, response[key] trimmed to ?fields= and made conditional."""
+
+        keep = self.get_fields()
+        if keep != None:
+            value = response[key]
+            for document in (value if isinstance(value, list) else [value]):
+                for field in list(document):
+                    if field not in keep:
+                        del document[field]
+
+        if mimetype == MSGPACK_MIMETYPE:
+            response = msgpack_response(response)
+        else:
+            response = jsonify(response)
+        response.vary.add('Accept')
+        response.add_etag()
+        return response.make_conditional(request)
+
+    def stream_csv(self, query):
+        """Stream rows as CSV while they are read from a server-side cursor."""
+
+        keep = self.get_fields()
+        rows = (self.csv_row(instance) for instance in
+                query.options(*self.csv_options()).yield_per(CSV_BATCH_SIZE))
+        if keep != None:
+            rows = ({key: value for key, value in row.items() if key in keep} for row in rows)
+        return Response(stream_with_context(generate_csv(rows)), mimetype=CSV_MIMETYPE,
+                        headers={"Vary": "Accept"})
+
+    def get_filters(self):
+        """Declared filter -> integer value, for those in the query string; raises ValueError."""
+
+        filters = {}
+        for column in self.filters:
+            value = request.args.get(column)
+            if value != None:
+                try:
+                    filters[column] = int(value)
+                except ValueError:
+                    raise ValueError(f"{column} must be an integer.")
+        return filters
+
+    def filter_query(self, query):
+        """Apply ?column=value for each declared filter; raises ValueError."""
+
+        for column, value in self.get_filters().items():
+            query = query.filter(getattr(self.model, column) == value)
+        return query
+
+    def get_page(self):
+        """Return (offset, limit) from the query string; limit is None if not paging."""
+
+        limit = request.args.get('limit')
+        offset = int(request.args.get('offset', 0))
+        if limit == None:
+            if offset != 0:
+                raise ValueError()
+            return (0, None)
+        limit = int(limit)
+        if limit < 1 or offset < 0:
+            raise ValueError()
+        return (offset, min(limit, MAX_PAGE_SIZE))
+
+    # -------------------------------------------------------------------
+
+    def add(self):
+
+        # validate form
+        form = self.make_form(self.form)
+        if form.validate():
+
+            # create new resource; unique natural keys reject duplicates
+            data = {k: v for k, v in request.json.items()}
+            new_instance = self.model.register(
+                *[data.get(field, None) for field in self.fields])
+
+            if new_instance == None:
+                existing = self.find_duplicate(data)
+                response = {
+                    "status": "duplicate",
+                    "message": self.duplicate_message(existing),
+                    self.name: existing.serialize()
+                }
+                return jsonify(response)
+
+            response = {
+                "status": "success",
+                self.name: new_instance.serialize(),
+                "message": self.created_message(new_instance)
+            }
+            self.created(new_instance, response[self.name])
+            enqueue_refreshes()
+            return (jsonify(response), 201)
+
+        # return errors if form does not validate
+        else:
+            return (jsonify({"errors": form.errors}), 400)
+
+    def get_all(self):
+
+        try:
+            offset, limit = self.get_page()
+        except ValueError:
+            return fail("limit must be a positive integer and offset a non-negative integer.")
+
+        try:
+            query = self.filter_query(self.model.query_all())
+        except ValueError as error:
+            return fail(str(error))
+
+        mimetype = negotiate()
+        if mimetype == CSV_MIMETYPE:
+            if limit != None:
+                query = query.order_by(self.model.id).offset(offset).limit(limit)
+            return self.stream_csv(query)
+
+        query = query.options(*self.load_options())
+        if limit == None:
+            return self.respond({self.plural: self.serialize(query.all())}, self.plural, mimetype)
+
+        # page on a stable order; one extra row tells whether there is more
+        items = query.order_by(self.model.id).offset(offset).limit(limit + 1).all()
+        response = {
+            self.plural: self.serialize(items[:limit]),
+            "offset": offset,
+            "limit": limit,
+            "has_more": len(items) > limit
+        }
+        return self.respond(response, self.plural, mimetype)
+
+    def get_one(self, id):
+
+        instance = self.model.get_by_id(id)
+        if instance == None:
+            return not_found(self.name, id)
+
+        return self.respond({self.name: self.serialize([instance])[0]}, self.name)
+
+    def update(self, id):
+
+        instance = self.model.get_by_id(id)
+        if instance == None:
+            return not_found(self.name, id)
+
+        # validate form
+        form = self.make_form(self.update_form or self.form)
+        if form.validate():
+
+            # update resource; unique natural keys reject duplicates
+            data = {k: v for k, v in request.json.items()}
+            previous = get_column_values(instance)
+            updated_instance = self.model.update(
+                instance, *[data.get(field, None) for field in (self.update_fields or self.fields)])
+
+            if updated_instance == None:
+                existing = self.find_duplicate(data)
+                if existing == None:
+                    response = {
+                        "status": "error",
+                        "message": f"There was an error updating {self.name} with id {id}."
+                    }
+                    return (jsonify(response), 500)
+
+                response = {
+                    "status": "duplicate",
+                    "message": self.duplicate_message(existing),
+                    self.name: existing.serialize()
+                }
+                return jsonify(response)
+
+            response = {
+                "status": "success",
+                self.name: updated_instance.serialize(),
+                "message": f"{getattr(updated_instance, self.title_field)} updated."
+            }
+            self.updated(updated_instance, response[self.name], previous)
+            enqueue_refreshes()
+            return jsonify(response)
+
+        # return errors if form does not validate
+        else:
+            return (jsonify({"errors": form.errors}), 400)
+
+    def delete(self, id):
+
+        instance = self.model.get_by_id(id)
+        if instance == None:
+            return not_found(self.name, id)
+
+        # report what would be removed without deleting anything
+        if request.args.get('dry_run', 'false').lower() == 'true':
+            response = {
+                "status": "dry run",
+                "would_delete": self.model.count_deletes(id),
+                "message": f"{self.name.capitalize()} with id {id} was not deleted."
+            }
+            return jsonify(response)
+
+        previous = get_column_values(instance)
+        status = self.model.delete(id)
+        if status == "deleted":
+            response = {
+                "deleted": id,
+                "status": "success",
+                "message": f"{self.name.capitalize()} with id {id} has been deleted."
+            }
+            self.deleted(id, previous)
+            enqueue_refreshes()
+
+        else:
+            response = {
+                "status": "error",
+                "message": f"There was an error deleting {self.name} with id {id}."
+            }
+
+        return jsonify(response)
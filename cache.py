@@ -0,0 +1,259 @@
+"""Response cache with single-flight rebuilds for the hot GET routes.
+
+A cached response is served as is for RESPONSE_CACHE_TTL_SECONDS. After
+that one request per key revalidates it: if the change log cursor has
+not moved the entry is kept, otherwise that request rebuilds it. While a
+key is being rebuilt, other requests for it are answered with the stale
+entry for up to RESPONSE_CACHE_STALE_SECONDS, or wait for the rebuild
+when there is no entry yet, so a burst of misses on /events during a
+live show runs the serialize() queries once instead of once per request.
+
+With the default TTL of 0 every hit costs one `max(id)` query on the
+change log and a write is visible to the next request. Entries are kept
+per worker; with RESPONSE_CACHE_BACKEND_URL set to a redis:// URL they
+are shared and the rebuild lock is taken in Redis, so one worker
+rebuilds for all of them (requires the `redis` package).
+"""
+
+from collections import OrderedDict
+import base64
+import hashlib
+import json
+import threading
+import time
+
+from flask import Response, g, request
+
+from models import Change
+from ratelimit import INTERNAL_REQUEST
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHED_ENDPOINTS = {
+    'participants.get_all_participants',
+    'participants.get_participant',
+    'countries.get_all_countries',
+    'countries.get_country',
+    'entries.get_all_entries',
+    'entries.get_entry',
+    'events.get_all_events',
+    'events.get_event',
+    'performances.get_all_performances',
+    'performances.get_performance'
+}
+
+# response headers kept with the body
+CACHED_HEADERS = ['Content-Type', 'ETag', 'Vary']
+
+# how often a request waiting on another worker's rebuild looks again
+POLL_SECONDS = 0.05
+
+
+class SingleFlight:
+    """One leader per key among this process's threads; the rest wait for it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def begin(self, key):
+        """Return None if the caller leads the key, else an Event set when the leader ends."""
+
+        with self._lock:
+            if key in self._flights:
+                return self._flights[key]
+            self._flights[key] = threading.Event()
+            return None
+
+    def end(self, key):
+        with self._lock:
+            done = self._flights.pop(key, None)
+        if done != None:
+            done.set()
+
+
+class InMemoryCache:
+    """Bounded least-recently-used cache for one worker."""
+
+    def __init__(self, max_keys):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_keys = max_keys
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry != None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_keys:
+                self._entries.popitem(last=False)
+
+    def acquire(self, key, timeout):
+        # SingleFlight already admits one thread per key
+        return True
+
+    def release(self, key):
+        pass
+
+
+class RedisCache:
+    """Cache and rebuild locks shared between workers through Redis."""
+
+    def __init__(self, url, max_age):
+        if redis is None:
+            raise RuntimeError(
+                "RESPONSE_CACHE_BACKEND_URL is set but the redis package is not installed.")
+        self._redis = redis.Redis.from_url(url)
+        self._max_age = int(max_age) + 1
+
+    def get(self, key):
+        value = self._redis.get('response-cache:' + key)
+        if value == None:
+            return None
+        entry = json.loads(value)
+        entry['body'] = base64.b64decode(entry['body'])
+        return entry
+
+    def set(self, key, entry):
+        value = dict(entry, body=base64.b64encode(entry['body']).decode())
+        self._redis.set('response-cache:' + key, json.dumps(value), ex=self._max_age)
+
+    def acquire(self, key, timeout):
+        # expires on its own if the leader dies mid-rebuild
+        return bool(self._redis.set('response-cache-lock:' + key, 1, nx=True,
+                                    px=int(timeout * 1000)))
+
+    def release(self, key):
+        self._redis.delete('response-cache-lock:' + key)
+
+
+def create_cache(url, max_keys, max_age):
+    if url:
+        return RedisCache(url, max_age)
+    return InMemoryCache(max_keys)
+
+
+def get_key():
+    accept = request.headers.get('Accept', '')
+    return hashlib.sha256(f"{request.full_path} {accept}".encode()).hexdigest()
+
+
+def cached_response(entry, state):
+    response = Response(entry['body'], status=200, headers=entry['headers'])
+    response.headers['X-Cache'] = state
+    return response.make_conditional(request)
+
+
+def init_response_cache(app):
+    """Serve CACHED_ENDPOINTS from the cache, rebuilding each key once."""
+
+    if not app.config['RESPONSE_CACHE_ENABLED']:
+        return
+
+    ttl = app.config['RESPONSE_CACHE_TTL_SECONDS']
+    stale = app.config['RESPONSE_CACHE_STALE_SECONDS']
+    wait = app.config['RESPONSE_CACHE_WAIT_SECONDS']
+    cache = create_cache(app.config.get('RESPONSE_CACHE_BACKEND_URL'),
+                         app.config['RESPONSE_CACHE_MAX_KEYS'], ttl + stale)
+    flights = SingleFlight()
+    app.extensions['response_cache'] = cache
+
+    def is_servable(entry, max_age):
+        return entry != None and time.time() - entry['built_at'] <= max_age
+
+    def wait_for_rebuild(key, done, entry):
+        """The entry another thread or worker is rebuilding, once it is there."""
+
+        built_at = entry['built_at'] if entry != None else None
+        deadline = time.monotonic() + wait
+        while True:
+            if done != None:
+                done.wait(wait)
+            else:
+                time.sleep(POLL_SECONDS)
+            entry = cache.get(key)
+            if entry != None and entry['built_at'] != built_at:
+                return entry
+            if done != None or time.monotonic() >= deadline:
+                # the rebuild failed or is taking too long; build it here
+                return None
+
+    @app.before_request
+    def serve_from_cache():
+        if request.method != 'GET' or request.endpoint not in CACHED_ENDPOINTS:
+            return None
+        if request.environ.get(INTERNAL_REQUEST):
+            # snapshots must see the rows as they are now
+            return None
+
+        key = get_key()
+        entry = cache.get(key)
+        if is_servable(entry, ttl):
+            return cached_response(entry, 'hit')
+
+        done = flights.begin(key)
+        if done == None and not cache.acquire(key, wait):
+            # another worker leads; wake this worker's followers when it is done
+            try:
+                if is_servable(entry, ttl + stale):
+                    return cached_response(entry, 'stale')
+                entry = wait_for_rebuild(key, None, entry)
+            finally:
+                flights.end(key)
+            return cached_response(entry, 'coalesced') if entry != None else None
+
+        if done != None:
+            if is_servable(entry, ttl + stale):
+                return cached_response(entry, 'stale')
+            entry = wait_for_rebuild(key, done, entry)
+            return cached_response(entry, 'coalesced') if entry != None else None
+
+        # this request leads: keep the entry if nothing changed, else rebuild it
+        cursor = Change.get_latest_cursor()
+        if entry != None and entry['cursor'] == cursor:
+            entry = dict(entry, built_at=time.time())
+            cache.set(key, entry)
+            cache.release(key)
+            flights.end(key)
+            return cached_response(entry, 'revalidated')
+        g.response_cache = (key, cursor)
+        return None
+
+    @app.after_request
+    def store_in_cache(response):
+        leader = g.pop('response_cache', None)
+        if leader == None:
+            return response
+
+        key, cursor = leader
+        try:
+            if response.status_code == 200 and not response.is_streamed:
+                cache.set(key, {
+                    'body': response.get_data(),
+                    'headers': [(name, response.headers[name]) for name in CACHED_HEADERS
+                                if name in response.headers],
+                    'cursor': cursor,
+                    'built_at': time.time()
+                })
+            response.headers['X-Cache'] = 'miss'
+        finally:
+            cache.release(key)
+            flights.end(key)
+        return response
+
+    @app.teardown_request
+    def release_rebuild(error=None):
+        # after_request is skipped when the view raises
+        leader = g.pop('response_cache', None)
+        if leader != None:
+            cache.release(leader[0])
+            flights.end(leader[0])
@@ -0,0 +1,111 @@
+"""Nested resource expansion for the ?expand= query parameter.
+
+`/events/<id>?expand=performances.entry.participant` replaces the ids a
+serialized resource holds with the serialized resources themselves. Each
+level of the path is loaded and serialized (see the models' serialize_all)
+with a fixed number of set-based queries for every document at that level,
+however many documents reference it.
+"""
+
+MAX_EXPAND_DEPTH = 3
+MAX_EXPAND_PATHS = 10
+
+# resource -> expansion name -> (field holding the id(s), resource type)
+EXPANSIONS = {
+    'participant': {
+        'entries': ('entries', 'entry'),
+        'countries_represented': ('countries_represented', 'country'),
+        'performances': ('performances', 'performance'),
+        'events': ('events', 'event')
+    },
+    'country': {
+        'entries': ('entries', 'entry'),
+        'events': ('events', 'event'),
+        'participants': ('participants', 'participant'),
+        'performances': ('performances', 'performance')
+    },
+    'entry': {
+        'participant': ('participant_id', 'participant'),
+        'country': ('country_id', 'country'),
+        'performances': ('performances', 'performance'),
+        'events': ('events', 'event')
+    },
+    'event': {
+        'host_country': ('host_country_id', 'country'),
+        'performances': ('performances', 'performance'),
+        'entries': ('entries', 'entry'),
+        'participating_countries': ('participating_countries', 'country')
+    },
+    'performance': {
+        'entry': ('entry_id', 'entry'),
+        'event': ('event_id', 'event'),
+        'participant': ('participant_id', 'participant'),
+        'country': ('country_id', 'country')
+    }
+}
+
+
+class ExpandError(ValueError):
+    """Raised for an invalid ?expand= value."""
+
+
+def parse_expand(resource, value):
+    """Turn "a.b,c" into the tree {'a': {'b': {}}, 'c': {}}, validating each step."""
+
+    tree = {}
+    if not value:
+        return tree
+
+    paths = [path.strip() for path in value.split(',') if path.strip()]
+    if len(paths) > MAX_EXPAND_PATHS:
+        raise ExpandError(f"At most {MAX_EXPAND_PATHS} expand paths are allowed.")
+
+    for path in paths:
+        names = path.split('.')
+        if len(names) > MAX_EXPAND_DEPTH:
+            raise ExpandError(
+                f"Cannot expand {path}: at most {MAX_EXPAND_DEPTH} levels are allowed.")
+        current_resource = resource
+        node = tree
+        for name in names:
+            if name not in EXPANSIONS[current_resource]:
+                raise ExpandError(
+                    f"Cannot expand {path}: {current_resource} has no expandable field {name}. "
+                    f"Options are {', '.join(sorted(EXPANSIONS[current_resource]))}.")
+            current_resource = EXPANSIONS[current_resource][name][1]
+            node = node.setdefault(name, {})
+    return tree
+
+
+def collect_ids(documents, field):
+    """Distinct ids held in `field` across documents, in first-seen order."""
+
+    ids = {}
+    for document in documents:
+        value = document.get(field)
+        for id in (value if isinstance(value, list) else [value]):
+            if id != None:
+                ids[id] = True
+    return list(ids)
+
+
+def attach(documents, name, field, loaded):
+    """Replace ids in `field` with the loaded documents, under `name`."""
+
+    for document in documents:
+        value = document.get(field)
+        if isinstance(value, list):
+            document[name] = [loaded[id] for id in value if id in loaded]
+        else:
+            document[name] = loaded.get(value)
+
+
+def expand(resource, documents, tree, load):
+    """Expand documents in place; `load(resource, ids)` returns serialized resources."""
+
+    for name, subtree in tree.items():
+        field, target = EXPANSIONS[resource][name]
+        loaded = {document['id']: document
+                  for document in load(target, collect_ids(documents, field))}
+        expand(target, list(loaded.values()), subtree, load)
+        attach(documents, name, field, loaded)
@@ -0,0 +1,212 @@
+"""Columnar export of the performance fact table.
+
+    python export.py performances.parquet
+    python export.py performances.arrow --format arrow
+    python export.py OUTPUT_DIR --partition-by-year
+
+One row per performance, joined with its entry, event, country and
+participant. Rows are read from a server-side cursor BATCH_SIZE at a time
+and written as Arrow record batches (a Parquet row group each), so memory
+stays flat however many years are exported. --partition-by-year writes a
+hive-style OUTPUT_DIR/year=YYYY/performances.parquet tree that pandas,
+DuckDB and Spark read as one partitioned dataset.
+
+The same streams are served at /export/performances.parquet and
+/export/performances.arrow. Requires the `pyarrow` package.
+"""
+
+import argparse
+import io
+import os
+
+from sqlalchemy import select
+
+from app import create_app
+from models import db, Participant, Country, Entry, Event, Event_Entry
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+BATCH_SIZE = 10000
+PARQUET_COMPRESSION = 'snappy'
+
+# column name -> (SQL expression, Arrow type name)
+host_countries = Country.__table__.alias('host_countries')
+FACT_COLUMNS = {
+    'performance_id': (Event_Entry.id, 'string'),
+    'year': (Event.year, 'int32'),
+    'event_id': (Event.id, 'string'),
+    'event': (Event.event, 'string'),
+    'event_type': (Event.type, 'string'),
+    'date': (Event.date, 'date32'),
+    'host_city': (Event.host_city, 'string'),
+    'host_country_id': (Event.host_country_id, 'string'),
+    'host_country': (host_countries.c.country, 'string'),
+    'entry_id': (Entry.id, 'string'),
+    'title': (Entry.title, 'string'),
+    'country_id': (Entry.country_id, 'string'),
+    'country': (Country.country, 'string'),
+    'participant_id': (Entry.participant_id, 'string'),
+    'participant': (Participant.name, 'string'),
+    'running_order': (Event_Entry.running_order, 'int32'),
+    'points': (Event_Entry.points, 'int32'),
+    'place': (Event_Entry.place, 'int32'),
+    'qualified': (Event_Entry.qualified, 'bool_'),
+    'written_by': (Entry.written_by, 'string'),
+    'composed_by': (Entry.composed_by, 'string'),
+    'broadcaster': (Entry.broadcaster, 'string'),
+    'lyrics_language': (Entry.lyrics_language, 'string')
+}
+
+
+def require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("Columnar export requires the pyarrow package.")
+
+
+def get_schema():
+    require_pyarrow()
+    return pyarrow.schema([(name, getattr(pyarrow, type_name)())
+                           for name, (column, type_name) in FACT_COLUMNS.items()])
+
+
+def fact_query(year=None):
+    query = (select(*[column.label(name) for name, (column, type_name) in FACT_COLUMNS.items()])
+             .select_from(Event_Entry)
+             .join(Entry, Event_Entry.entry_id == Entry.id)
+             .join(Event, Event_Entry.event_id == Event.id)
+             .join(Country, Entry.country_id == Country.id)
+             .join(Participant, Entry.participant_id == Participant.id)
+             .outerjoin(host_countries, Event.host_country_id == host_countries.c.id)
+             .order_by(Event.year, Event.date, Event.id, Event_Entry.running_order, Event_Entry.id))
+    if year != None:
+        # filter each year-partitioned table directly so the planner prunes it
+        query = query.where(Event.year == year, Event_Entry.year == year, Entry.year == year)
+    return query
+
+
+def iter_batches(year=None, batch_size=BATCH_SIZE):
+    """Yield the fact table as Arrow record batches, in year order."""
+
+    schema = get_schema()
+    result = db.session.execute(fact_query(year).execution_options(stream_results=True))
+    for rows in result.partitions(batch_size):
+        arrays = [pyarrow.array([row[i] for row in rows], type=field.type)
+                  for i, field in enumerate(schema)]
+        yield pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def open_writer(sink, file_format):
+    if file_format == 'parquet':
+        return pyarrow.parquet.ParquetWriter(sink, get_schema(), compression=PARQUET_COMPRESSION)
+    return pyarrow.ipc.new_stream(sink, get_schema())
+
+
+def write_batch(writer, batch):
+    if isinstance(writer, pyarrow.parquet.ParquetWriter):
+        writer.write_table(pyarrow.Table.from_batches([batch]))
+    else:
+        writer.write_batch(batch)
+
+
+def generate_file(batches, file_format):
+    """Yield the bytes of a Parquet file or Arrow IPC stream as batches arrive."""
+
+    sink = ChunkSink()
+    writer = open_writer(sink, file_format)
+    for batch in batches:
+        write_batch(writer, batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def write_file(path, batches, file_format):
+    with open(path + '.tmp', 'wb') as f:
+        for chunk in generate_file(batches, file_format):
+            f.write(chunk)
+    os.replace(path + '.tmp', path)
+
+
+def write_partitioned(output_dir, batches):
+    """Write OUTPUT_DIR/year=YYYY/performances.parquet; return the years written."""
+
+    years = []
+    writer = None
+    for batch in batches:
+        # batches arrive in year order; split any that straddle a year
+        table = pyarrow.Table.from_batches([batch])
+        batch_years = table.column('year').to_pylist()
+        start = 0
+        while start < len(batch_years):
+            year = batch_years[start]
+            end = start
+            while end < len(batch_years) and batch_years[end] == year:
+                end += 1
+            if not years or years[-1] != year:
+                if writer != None:
+                    writer.close()
+                directory = os.path.join(output_dir, f"year={year}")
+                os.makedirs(directory, exist_ok=True)
+                writer = pyarrow.parquet.ParquetWriter(
+                    os.path.join(directory, 'performances.parquet'), get_schema(),
+                    compression=PARQUET_COMPRESSION)
+                years.append(year)
+            writer.write_table(table.slice(start, end - start))
+            start = end
+    if writer != None:
+        writer.close()
+    return years
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help="output file, or directory with --partition-by-year")
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--year', type=int, help="export a single year")
+    parser.add_argument('--partition-by-year', action='store_true',
+                        help="write one Parquet file per year under OUTPUT")
+    args = parser.parse_args()
+
+    require_pyarrow()
+    app = create_app()
+    with app.app_context():
+        batches = iter_batches(args.year)
+        if args.partition_by_year:
+            years = write_partitioned(args.output, batches)
+            print(f"Wrote {len(years)} years to {args.output}.")
+        else:
+            write_file(args.output, batches, args.format)
+            print(f"Wrote {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,12 @@ from wtforms import StringField, SelectField, TextAreaField, IntegerField, DateF
 from wtforms.validators import ValidationError, InputRequired, Optional, Length, URL, NumberRange
 
 
+def coerce_lower(value):
+    """Match a JSON true/false against the "true"/"false" choices."""
+
+    return str(value).lower()
+
+
 class ParticipantForm(FlaskForm):
     """Form for participants."""
 
@@ -109,6 +115,6 @@ class EventEntryForm(FlaskForm):
                           Optional(), NumberRange(min=0, message=("Must be at least 0."))])
     place = IntegerField("Place", validators=[Optional(), NumberRange(
         min=0, message=("Must be at least 0."))])
-    qualified = SelectField("Qualified?", validators=[Optional()])
+    qualified = SelectField("Qualified?", coerce=coerce_lower, validators=[Optional()])
     running_order = IntegerField("Running order", validators=[
                                  Optional(), NumberRange(min=0, message=("Must be at least 0."))])
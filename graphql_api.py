@@ -0,0 +1,348 @@
+"""GraphQL endpoint over the existing models.
+
+The schema is generated from the models: every table column becomes a
+scalar field and every relationship listed in expand.EXPANSIONS becomes an
+object (or list) field. Relationship fields are resolved through
+per-request data loaders, so a query touching N parents costs one SQL
+statement per relationship and level rather than one per parent.
+
+Queries are rejected before execution if they nest deeper than
+MAX_QUERY_DEPTH or their estimated cost exceeds MAX_QUERY_COST.
+"""
+
+import asyncio
+
+from graphql import (GraphQLArgument, GraphQLBoolean, GraphQLError, GraphQLField, GraphQLID,
+                     GraphQLInt, GraphQLList, GraphQLNonNull, GraphQLObjectType, GraphQLSchema,
+                     GraphQLString, execute, get_named_type, parse, validate)
+from graphql.language import FieldNode, FragmentDefinitionNode, FragmentSpreadNode, OperationDefinitionNode
+
+from expand import EXPANSIONS
+from models import db, Participant, Country, Entry, Event, Event_Entry, get_column_values
+
+MAX_QUERY_DEPTH = 6
+MAX_QUERY_COST = 50000
+# a list field is assumed to return this many items when estimating cost
+LIST_FIELD_COST_FACTOR = 25
+
+MODELS = {
+    'participant': Participant,
+    'country': Country,
+    'entry': Entry,
+    'event': Event,
+    'performance': Event_Entry
+}
+
+TYPE_NAMES = {
+    'participant': 'Participant',
+    'country': 'Country',
+    'entry': 'Entry',
+    'event': 'Event',
+    'performance': 'Performance'
+}
+
+ROOT_FIELDS = {
+    'participant': 'participants',
+    'country': 'countries',
+    'entry': 'entries',
+    'event': 'events',
+    'performance': 'performances'
+}
+
+# Relationships whose ids are not a column on the parent's own table,
+# as queries returning (parent id, related id) pairs in serialize() order.
+RELATION_QUERIES = {
+    ('participant', 'entries'): lambda ids: db.session.query(
+        Entry.participant_id, Entry.id).filter(Entry.participant_id.in_(ids)),
+    ('participant', 'countries_represented'): lambda ids: db.session.query(
+        Entry.participant_id, Entry.country_id).filter(Entry.participant_id.in_(ids)),
+    ('participant', 'performances'): lambda ids: db.session.query(
+        Entry.participant_id, Event_Entry.id).select_from(Event_Entry).join(Entry)
+        .filter(Entry.participant_id.in_(ids)).order_by(Entry.year),
+    ('participant', 'events'): lambda ids: db.session.query(
+        Entry.participant_id, Event_Entry.event_id).select_from(Event_Entry).join(Entry)
+        .filter(Entry.participant_id.in_(ids)).order_by(Entry.year),
+    ('country', 'entries'): lambda ids: db.session.query(
+        Entry.country_id, Entry.id).filter(Entry.country_id.in_(ids)),
+    ('country', 'events'): lambda ids: db.session.query(
+        Event.host_country_id, Event.id).filter(Event.host_country_id.in_(ids)),
+    ('country', 'participants'): lambda ids: db.session.query(
+        Entry.country_id, Entry.participant_id).filter(Entry.country_id.in_(ids)),
+    ('country', 'performances'): lambda ids: db.session.query(
+        Entry.country_id, Event_Entry.id).select_from(Event_Entry).join(Entry)
+        .join(Event, Event_Entry.event_id == Event.id)
+        .filter(Entry.country_id.in_(ids)).order_by(Event.year),
+    ('entry', 'performances'): lambda ids: db.session.query(
+        Event_Entry.entry_id, Event_Entry.id).filter(Event_Entry.entry_id.in_(ids)),
+    ('entry', 'events'): lambda ids: db.session.query(
+        Event_Entry.entry_id, Event.id).select_from(Event_Entry).join(Event)
+        .filter(Event_Entry.entry_id.in_(ids)).order_by(Event.date),
+    ('event', 'performances'): lambda ids: db.session.query(
+        Event_Entry.event_id, Event_Entry.id).filter(Event_Entry.event_id.in_(ids)),
+    ('event', 'entries'): lambda ids: db.session.query(
+        Event_Entry.event_id, Entry.id).select_from(Event_Entry).join(Entry)
+        .filter(Event_Entry.event_id.in_(ids)).order_by(Entry.country_id),
+    ('event', 'participating_countries'): lambda ids: db.session.query(
+        Event_Entry.event_id, Entry.country_id).select_from(Event_Entry).join(Entry)
+        .filter(Event_Entry.event_id.in_(ids)).order_by(Entry.country_id),
+    ('performance', 'participant'): lambda ids: db.session.query(
+        Event_Entry.id, Entry.participant_id).select_from(Event_Entry).join(Entry)
+        .filter(Event_Entry.id.in_(ids)),
+    ('performance', 'country'): lambda ids: db.session.query(
+        Event_Entry.id, Entry.country_id).select_from(Event_Entry).join(Entry)
+        .filter(Event_Entry.id.in_(ids))
+}
+
+
+def is_list_relation(field):
+    return not field.endswith('_id')
+
+
+#####################################################################
+# ------------------------- Data loaders -------------------------- #
+#####################################################################
+
+
+class DataLoader:
+    """Batch and de-duplicate loads issued within one event loop pass."""
+
+    def __init__(self, batch_load):
+        self.batch_load = batch_load
+        self.cache = {}
+        self.queue = []
+
+    def load(self, key):
+        if key in self.cache:
+            return self.cache[key]
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self.cache[key] = future
+        self.queue.append(key)
+        if len(self.queue) == 1:
+            # let every resolver at this level queue its key first
+            loop.call_soon(loop.call_soon, self.dispatch)
+        return future
+
+    def dispatch(self):
+        keys, self.queue = self.queue, []
+        try:
+            results = self.batch_load(keys)
+        except Exception as e:
+            for key in keys:
+                self.cache[key].set_exception(e)
+            return
+        for key in keys:
+            self.cache[key].set_result(results.get(key))
+
+
+class Loaders:
+    """The data loaders for one GraphQL request."""
+
+    def __init__(self):
+        self.nodes = {}
+        self.relations = {}
+
+    def node(self, resource):
+        if resource not in self.nodes:
+            model = MODELS[resource]
+            # keyed by str(id): GraphQLID arguments arrive as strings
+            # whatever type the primary key column has
+            self.nodes[resource] = DataLoader(lambda ids: {
+                str(row.id): get_column_values(row)
+                for row in model.query.filter(model.id.in_(ids))})
+        return self.nodes[resource]
+
+    def relation(self, resource, name):
+        key = (resource, name)
+        if key not in self.relations:
+            def batch_load(ids):
+                related = {id: [] for id in ids}
+                for parent_id, related_id in RELATION_QUERIES[key](ids):
+                    if related_id != None:
+                        related[parent_id].append(related_id)
+                return related
+            self.relations[key] = DataLoader(batch_load)
+        return self.relations[key]
+
+
+#####################################################################
+# ----------------------------- Schema ---------------------------- #
+#####################################################################
+
+
+def make_relation_resolver(resource, name):
+    field, target = EXPANSIONS[resource][name]
+    is_column = field in MODELS[resource].__table__.columns
+
+    async def resolve(parent, info):
+        loaders = info.context
+        if is_column:
+            related_ids = parent[field]
+        else:
+            related_ids = await loaders.relation(resource, name).load(parent['id'])
+
+        if not is_list_relation(field):
+            if isinstance(related_ids, list):
+                related_ids = related_ids[0] if related_ids else None
+            if related_ids == None:
+                return None
+            return await loaders.node(target).load(str(related_ids))
+
+        related = await asyncio.gather(*[loaders.node(target).load(str(id)) for id in related_ids])
+        return [item for item in related if item != None]
+    return resolve
+
+
+def make_fields(resource, types):
+    def fields():
+        result = {}
+        for column in MODELS[resource].__table__.columns:
+            if column.primary_key:
+                field_type = GraphQLID
+            elif isinstance(column.type, db.Integer):
+                field_type = GraphQLInt
+            elif isinstance(column.type, db.Boolean):
+                field_type = GraphQLBoolean
+            else:
+                field_type = GraphQLString
+            if not column.nullable:
+                field_type = GraphQLNonNull(field_type)
+            result[column.key] = GraphQLField(field_type)
+
+        for name, (field, target) in EXPANSIONS[resource].items():
+            field_type = types[target]
+            if is_list_relation(field):
+                field_type = GraphQLNonNull(GraphQLList(GraphQLNonNull(field_type)))
+            result[name] = GraphQLField(field_type, resolve=make_relation_resolver(resource, name))
+        return result
+    return fields
+
+
+def make_root_fields(types):
+    fields = {}
+    for resource, plural in ROOT_FIELDS.items():
+        model = MODELS[resource]
+
+        def resolve_all(root, info, model=model):
+            return [get_column_values(row) for row in model.query_all()]
+
+        def resolve_one(root, info, id, resource=resource):
+            return info.context.node(resource).load(str(id))
+
+        fields[plural] = GraphQLField(
+            GraphQLNonNull(GraphQLList(GraphQLNonNull(types[resource]))), resolve=resolve_all)
+        fields[resource] = GraphQLField(
+            types[resource], args={'id': GraphQLArgument(GraphQLNonNull(GraphQLID))},
+            resolve=resolve_one)
+    return fields
+
+
+def build_schema():
+    types = {}
+    for resource, type_name in TYPE_NAMES.items():
+        types[resource] = GraphQLObjectType(type_name, make_fields(resource, types))
+    return GraphQLSchema(query=GraphQLObjectType('Query', make_root_fields(types)))
+
+
+schema = build_schema()
+
+
+#####################################################################
+# ------------------------- Query limits -------------------------- #
+#####################################################################
+
+
+def measure(selection_set, parent_type, fragments):
+    """Return (cost, depth) of a selection set."""
+
+    cost = 0
+    depth = 0
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            if selection.name.value.startswith('__'):
+                continue
+            field_type = parent_type.fields[selection.name.value].type
+            if isinstance(field_type, GraphQLNonNull):
+                field_type = field_type.of_type
+            child_cost, child_depth = 0, 0
+            if selection.selection_set != None:
+                child_cost, child_depth = measure(
+                    selection.selection_set, get_named_type(field_type), fragments)
+            factor = LIST_FIELD_COST_FACTOR if isinstance(field_type, GraphQLList) else 1
+            cost += 1 + factor * child_cost
+            depth = max(depth, 1 + child_depth)
+        else:
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = fragments[selection.name.value]
+            else:
+                fragment = selection
+            fragment_type = parent_type
+            if fragment.type_condition != None:
+                fragment_type = schema.get_type(fragment.type_condition.name.value)
+            child_cost, child_depth = measure(fragment.selection_set, fragment_type, fragments)
+            cost += child_cost
+            depth = max(depth, child_depth)
+    return cost, depth
+
+
+def check_limits(document):
+    fragments = {definition.name.value: definition for definition in document.definitions
+                 if isinstance(definition, FragmentDefinitionNode)}
+    errors = []
+    for definition in document.definitions:
+        if isinstance(definition, OperationDefinitionNode):
+            cost, depth = measure(definition.selection_set, schema.query_type, fragments)
+            if depth > MAX_QUERY_DEPTH:
+                errors.append(GraphQLError(
+                    f"Query depth {depth} exceeds the maximum of {MAX_QUERY_DEPTH}.", definition))
+            if cost > MAX_QUERY_COST:
+                errors.append(GraphQLError(
+                    f"Query cost {cost} exceeds the maximum of {MAX_QUERY_COST}.", definition))
+    return errors
+
+
+#####################################################################
+# ---------------------------- Execution -------------------------- #
+#####################################################################
+
+
+def execute_query(query, variables=None, operation_name=None):
+    """Run a GraphQL query; return (response body, HTTP status)."""
+
+    if not query:
+        return ({"errors": [{"message": "Must provide a query."}]}, 400)
+    if not isinstance(query, str):
+        return ({"errors": [{"message": "query must be a string."}]}, 400)
+    if variables != None and not isinstance(variables, dict):
+        return ({"errors": [{"message": "variables must be an object or null."}]}, 400)
+    if operation_name != None and not isinstance(operation_name, str):
+        return ({"errors": [{"message": "operationName must be a string or null."}]}, 400)
+
+    try:
+        document = parse(query)
+    except GraphQLError as e:
+        return ({"errors": [e.formatted]}, 400)
+
+    errors = validate(schema, document)
+    if not errors:
+        errors = check_limits(document)
+    if errors:
+        return ({"errors": [error.formatted for error in errors]}, 400)
+
+    async def run():
+        result = execute(schema, document, context_value=Loaders(),
+                         variable_values=variables, operation_name=operation_name)
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            result = await result
+        return result
+
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    response = {"data": result.data}
+    if result.errors:
+        response["errors"] = [error.formatted for error in result.errors]
+    return (response, 200)
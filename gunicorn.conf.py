@@ -0,0 +1,32 @@
+"""Gunicorn settings, read from the working directory by `gunicorn wsgi:app`."""
+
+import gc
+import os
+
+# threads rather than the default sync worker: a /events/<id>/stream viewer
+# holds its thread for as long as it watches, which under sync would be a
+# whole worker, cut off by the 30 second timeout. gthread only times out
+# workers that stop heartbeating, so streams stay open; each one still takes
+# a thread, so serve large audiences from asgi:application instead
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+
+def pre_fork(server, worker):
+    # with --preload the app is already built in the master; load the rest
+    # of what it imports lazily and stop the garbage collector from touching
+    # it, so forked workers keep sharing those pages copy-on-write
+    if server.cfg.preload_app:
+        from app import preload_lazy_modules
+        preload_lazy_modules()
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # runs in each worker once the app is loaded, with or without --preload
+    from app import warm_start
+    try:
+        warm_start(worker.wsgi)
+    except Exception:
+        # the first request loads it instead
+        worker.log.exception("Could not preload reference data.")
@@ -0,0 +1,185 @@
+"""Idempotency-Key support for write requests.
+
+A POST, PATCH, PUT or DELETE carrying an `Idempotency-Key` header has its
+response stored under that key (scoped to the caller and the route). A
+retry with the same key and body is answered from the store without
+running the handler; the same key with a different body is rejected with
+422, and a retry that arrives while the original is still running gets
+409.
+
+Responses are kept for IDEMPOTENCY_TTL_SECONDS in a bounded in-process
+store, or in Redis when IDEMPOTENCY_BACKEND_URL is set so a retry routed
+to another worker is still recognised (requires the `redis` package).
+The marker of a request still running only lasts
+IDEMPOTENCY_PENDING_TTL_SECONDS, about as long as a request may take, so
+a worker dying mid-request does not block retries with that key for long.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+
+from flask import Response, g, jsonify, request
+
+from ratelimit import get_client_key
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+IDEMPOTENT_METHODS = {'POST', 'PATCH', 'PUT', 'DELETE'}
+MAX_KEY_LENGTH = 255
+
+
+class InMemoryStore:
+    """Bounded store whose entries expire after a TTL."""
+
+    def __init__(self, ttl, max_keys):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._ttl = ttl
+        self._max_keys = max_keys
+
+    def _expire(self, now):
+        while self._entries:
+            key, (expires, value) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self._max_keys:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            # a short-lived entry can sit behind longer-lived ones that _expire stops at
+            return entry[1] if entry and entry[0] > now else None
+
+    def add(self, key, value, ttl):
+        """Store value for ttl seconds unless key is present; return True if stored."""
+
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return False
+            self._entries.pop(key, None)
+            self._entries[key] = (now + ttl, value)
+            return True
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._expire(time.monotonic())
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisStore:
+    """Store shared between workers through Redis."""
+
+    def __init__(self, url, ttl):
+        if redis is None:
+            raise RuntimeError(
+                "IDEMPOTENCY_BACKEND_URL is set but the redis package is not installed.")
+        self._redis = redis.Redis.from_url(url)
+        self._ttl = int(ttl)
+
+    def get(self, key):
+        value = self._redis.get('idempotency:' + key)
+        return json.loads(value) if value != None else None
+
+    def add(self, key, value, ttl):
+        return bool(self._redis.set('idempotency:' + key, json.dumps(value), nx=True, ex=max(1, int(ttl))))
+
+    def set(self, key, value):
+        self._redis.set('idempotency:' + key, json.dumps(value), ex=self._ttl)
+
+    def delete(self, key):
+        self._redis.delete('idempotency:' + key)
+
+
+def create_store(url, ttl, max_keys):
+    if url:
+        return RedisStore(url, ttl)
+    return InMemoryStore(ttl, max_keys)
+
+
+def fail(message, status):
+    response = {
+        "status": "fail",
+        "message": message
+    }
+    return (jsonify(response), status)
+
+
+def init_idempotency(app):
+    """Answer retried write requests from the response store."""
+
+    store = create_store(app.config.get('IDEMPOTENCY_BACKEND_URL'),
+                         app.config['IDEMPOTENCY_TTL_SECONDS'],
+                         app.config['IDEMPOTENCY_MAX_KEYS'])
+    pending_ttl = app.config['IDEMPOTENCY_PENDING_TTL_SECONDS']
+
+    @app.before_request
+    def replay_idempotent_request():
+        idempotency_key = request.headers.get('Idempotency-Key', None)
+        if idempotency_key == None or request.method not in IDEMPOTENT_METHODS:
+            return None
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            return fail(f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters.", 400)
+
+        client = get_client_key(app, request.headers.get('API-Key', None), request.remote_addr)
+        key = hashlib.sha256(
+            f"{client} {request.method} {request.path} {idempotency_key}".encode()).hexdigest()
+        fingerprint = hashlib.sha256(request.get_data(cache=True)).hexdigest()
+
+        if store.add(key, {"state": "pending", "fingerprint": fingerprint}, pending_ttl):
+            g.idempotency = (key, fingerprint)
+            return None
+
+        stored = store.get(key)
+        if stored == None:
+            return fail("Request with this Idempotency-Key expired mid-flight; retry.", 409)
+        if stored["fingerprint"] != fingerprint:
+            return fail("Idempotency-Key was already used with a different request body.", 422)
+        if stored["state"] == "pending":
+            return fail("A request with this Idempotency-Key is still being processed.", 409)
+
+        return Response(stored["body"], status=stored["status"],
+                        content_type=stored["content_type"],
+                        headers={"Idempotent-Replayed": "true"})
+
+    @app.after_request
+    def store_idempotent_response(response):
+        idempotency = g.pop('idempotency', None)
+        if idempotency == None:
+            return response
+
+        key, fingerprint = idempotency
+        if response.status_code >= 500 or response.is_streamed:
+            # failures are not final; let the client retry for real
+            store.delete(key)
+        else:
+            store.set(key, {
+                "state": "done",
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                "content_type": response.content_type,
+                "body": response.get_data(as_text=True)
+            })
+        return response
+
+    @app.teardown_request
+    def release_idempotency_key(error=None):
+        # after_request is skipped when the handler raises
+        idempotency = g.pop('idempotency', None)
+        if idempotency != None:
+            store.delete(idempotency[0])
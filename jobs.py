@@ -0,0 +1,292 @@
+"""Background jobs backed by the `jobs` table.
+
+    python jobs.py                # run a separate worker process
+    python jobs.py --threads 4
+
+Request handlers call enqueue() to hand follow-up work (re-rendering the
+snapshot, refreshes, bulk imports) to a worker and return immediately.
+Each web worker runs JOB_WORKER_THREADS threads that poll the table; set
+it to 0 on the web processes and run `python jobs.py` to keep that work
+in its own process instead. Any number of workers can share the table:
+on Postgres a job is claimed with FOR UPDATE SKIP LOCKED, elsewhere with
+a conditional update.
+
+A failed job is retried after JOB_RETRY_SECONDS, doubling each time, up
+to its max_attempts. A job still running after JOB_TIMEOUT_SECONDS is
+assumed lost with its worker and is claimed again.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import threading
+
+from flask import current_app
+
+from models import db, Job
+
+logger = logging.getLogger(__name__)
+
+# job name -> function called with the job's payload as keyword arguments
+JOB_HANDLERS = {}
+
+JOB_STATUSES = ['queued', 'running', 'succeeded', 'failed']
+
+# finished jobs the latency percentiles are computed over
+METRICS_WINDOW = 1000
+
+
+def job(name):
+    """Register the decorated function as the handler of `name` jobs."""
+
+    def register(func):
+        JOB_HANDLERS[name] = func
+        return func
+    return register
+
+
+def get_key(name, payload):
+    return f"{name} {json.dumps(payload, sort_keys=True)}"
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None, unique=False):
+    """Queue a job and commit; return it.
+
+    With unique=True an identical job (same name and payload) that is
+    still queued is returned instead of adding another, which suits
+    refreshes that only need to run once after a burst of writes.
+    """
+
+    if name not in JOB_HANDLERS:
+        raise ValueError(f"There is no job named {name}.")
+
+    key = get_key(name, payload)
+    if unique:
+        existing = Job.query.filter_by(key=key, status='queued').first()
+        if existing != None:
+            return existing
+
+    now = datetime.datetime.utcnow()
+    queued = Job(name=name, key=key, payload=payload, status='queued', attempts=0,
+                 max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS'],
+                 created_at=now, run_at=now + datetime.timedelta(seconds=delay))
+    db.session.add(queued)
+    db.session.commit()
+
+    worker = current_app.extensions.get('jobs')
+    if worker != None:
+        worker.notify()
+    return queued
+
+
+def claim_job(timeout):
+    """Mark the next due job running and return it, or None if there is none."""
+
+    now = datetime.datetime.utcnow()
+    lost = now - datetime.timedelta(seconds=timeout)
+
+    # jobs whose worker died mid-run and have no attempts left
+    Job.query.filter(Job.status == 'running', Job.started_at < lost,
+                     Job.attempts >= Job.max_attempts).update(
+        {'status': 'failed', 'error': "Timed out.", 'finished_at': now},
+        synchronize_session=False)
+
+    query = (Job.query
+             .filter(db.or_(db.and_(Job.status == 'queued', Job.run_at <= now),
+                            db.and_(Job.status == 'running', Job.started_at < lost)))
+             .order_by(Job.run_at, Job.id)
+             .limit(5))
+    if db.engine.dialect.name == 'postgresql':
+        query = query.with_for_update(skip_locked=True)
+
+    for candidate in query.all():
+        # another worker may have claimed it since it was read
+        claimed = Job.query.filter(Job.id == candidate.id, Job.status == candidate.status,
+                                   Job.attempts == candidate.attempts).update(
+            {'status': 'running', 'attempts': Job.attempts + 1, 'started_at': now,
+             'finished_at': None}, synchronize_session=False)
+        if claimed:
+            db.session.commit()
+            return Job.get_by_id(candidate.id)
+
+    db.session.commit()
+    return None
+
+
+def run_job(claimed, retry_seconds):
+    """Run a claimed job and record how it went."""
+
+    handler = JOB_HANDLERS.get(claimed.name)
+    try:
+        if handler == None:
+            raise LookupError(f"There is no job named {claimed.name}.")
+        handler(**(claimed.payload or {}))
+    except Exception as error:
+        db.session.rollback()
+        logger.exception("Job %s (%s) failed.", claimed.id, claimed.name)
+        claimed.error = f"{type(error).__name__}: {error}"
+        if claimed.attempts < claimed.max_attempts:
+            claimed.status = 'queued'
+            claimed.run_at = datetime.datetime.utcnow() + datetime.timedelta(
+                seconds=retry_seconds * 2 ** (claimed.attempts - 1))
+        else:
+            claimed.status = 'failed'
+            claimed.finished_at = datetime.datetime.utcnow()
+    else:
+        claimed.status = 'succeeded'
+        claimed.error = None
+        claimed.finished_at = datetime.datetime.utcnow()
+    db.session.add(claimed)
+    db.session.commit()
+
+
+class JobWorker:
+    """Threads that claim and run jobs for one app."""
+
+    def __init__(self, app, threads, poll_seconds):
+        self.app = app
+        self.threads = threads
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._pid = None
+
+    def start(self):
+        """Start the threads once per process (forked workers start their own)."""
+
+        with self._lock:
+            if self.threads < 1 or self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._workers = [threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                             for i in range(self.threads)]
+            for thread in self._workers:
+                thread.start()
+
+    def notify(self):
+        """Start the threads if needed and have one look for work now."""
+
+        self.start()
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._workers:
+            thread.join()
+
+    def join(self):
+        for thread in self._workers:
+            thread.join()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    claimed = claim_job(self.app.config['JOB_TIMEOUT_SECONDS'])
+                    if claimed != None:
+                        run_job(claimed, self.app.config['JOB_RETRY_SECONDS'])
+                        continue
+            except Exception:
+                logger.exception("Job worker could not reach the database.")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+def init_jobs(app):
+    """Attach a job worker to the app; its threads start on first use."""
+
+    app.extensions['jobs'] = JobWorker(app, app.config['JOB_WORKER_THREADS'],
+                                       app.config['JOB_POLL_SECONDS'])
+
+
+#####################################################################
+# ---------------------------- Metrics ---------------------------- #
+#####################################################################
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'max': None}
+    values = sorted(values)
+    return {
+        'p50': round(values[len(values) // 2], 1),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+        'max': round(values[-1], 1)
+    }
+
+
+def get_metrics():
+    """Counts by job name and status, retries, and wait and run times in ms."""
+
+    metrics = {}
+    rows = (db.session.query(Job.name, Job.status, db.func.count(),
+                             db.func.sum(Job.attempts - 1))
+            .group_by(Job.name, Job.status).all())
+    for name, status, count, retries in rows:
+        entry = metrics.setdefault(name, dict({status: 0 for status in JOB_STATUSES}, retries=0))
+        entry[status] = count
+        entry['retries'] += max(int(retries or 0), 0)
+
+    finished = (db.session.query(Job.name, Job.created_at, Job.started_at, Job.finished_at)
+                .filter(Job.status == 'succeeded')
+                .order_by(Job.finished_at.desc())
+                .limit(METRICS_WINDOW).all())
+    for name in metrics:
+        runs = [row for row in finished if row.name == name]
+        metrics[name]['wait_ms'] = percentiles(
+            [(row.started_at - row.created_at).total_seconds() * 1000 for row in runs])
+        metrics[name]['run_ms'] = percentiles(
+            [(row.finished_at - row.started_at).total_seconds() * 1000 for row in runs])
+    return metrics
+
+
+#####################################################################
+# ----------------------------- Jobs ------------------------------ #
+#####################################################################
+
+
+@job('render_snapshot')
+def render_snapshot(full=False, output_dir=None):
+    # always SNAPSHOT_DIR: the payload comes from POST /jobs, and a client must
+    # not choose where files are written. output_dir is accepted and ignored
+    # so jobs queued before it was dropped still run
+    directory = current_app.config.get('SNAPSHOT_DIR')
+    if not directory:
+        raise ValueError("SNAPSHOT_DIR is not set.")
+    # imported here to keep it out of startup
+    from snapshot import Snapshot
+    Snapshot(directory, current_app._get_current_object()).export(full=full)
+
+
+def enqueue_refreshes():
+    """Queue the work that follows any write to the resource tables."""
+
+    if current_app.config.get('SNAPSHOT_DIR'):
+        enqueue('render_snapshot', unique=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app import create_app
+    app = create_app({'JOB_WORKER_THREADS': args.threads})
+    worker = app.extensions['jobs']
+    worker.start()
+    print(f"Running jobs with {args.threads} threads.")
+    try:
+        worker.join()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""Resized copies of participant photos and country flags.
+
+/media/<kind>/<id>?w=<width> fetches the image at the participant's
+image_url (or the country's flag_image_url) once, scales it down to the
+next of MEDIA_WIDTHS at or above w, and answers with WebP when the
+client accepts it, PNG otherwise. Sources and variants are kept on disk
+under MEDIA_CACHE_DIR; when they outgrow MEDIA_CACHE_MAX_BYTES the least
+recently served files are removed. Concurrent misses for the same
+variant are fetched and resized once (see cache.SingleFlight).
+
+Sources are fetched with MediaCache.fetch, which can be replaced, and
+any http:// URL works as an origin, so a local stub server can stand in
+for the real one. Resizing requires the `Pillow` package.
+"""
+
+import hashlib
+import io
+import os
+import threading
+
+import requests
+
+from cache import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+MEDIA_WIDTHS = [32, 64, 128, 256, 512, 1024]
+
+# output formats: Accept mimetype -> Pillow format; PNG unless WebP is named
+MEDIA_FORMATS = {
+    'image/png': 'PNG',
+    'image/webp': 'WEBP'
+}
+
+
+class MediaError(Exception):
+    """The source image could not be fetched or read."""
+
+
+def require_pillow():
+    if Image is None:
+        raise RuntimeError("Resizing images requires the Pillow package.")
+
+
+def get_width(requested):
+    """The smallest of MEDIA_WIDTHS at least as wide as requested."""
+
+    for width in MEDIA_WIDTHS:
+        if width >= requested:
+            return width
+    return MEDIA_WIDTHS[-1]
+
+
+def resize(source, width, mimetype):
+    """Scale an encoded image down to width (never up) and re-encode it."""
+
+    require_pillow()
+    try:
+        image = Image.open(io.BytesIO(source))
+        image.load()
+    except Exception:
+        raise MediaError("Source is not a readable image.")
+    # before resizing: palette images only resize with nearest-neighbour
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))),
+                             Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format=MEDIA_FORMATS[mimetype])
+    return output.getvalue()
+
+
+class MediaCache:
+    """Source images and resized variants on disk, evicted least recently used."""
+
+    def __init__(self, directory, max_bytes, timeout, max_source_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_source_bytes = max_source_bytes
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._size = None
+
+    def get_path(self, *parts):
+        name = hashlib.sha256(' '.join(str(part) for part in parts).encode()).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+
+    def fetch(self, url):
+        """Download a source image, refusing anything over max_source_bytes."""
+
+        if not url.startswith(('http://', 'https://')):
+            raise MediaError("Source URL must be http or https.")
+        try:
+            with requests.get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(64 * 1024):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size > self.max_source_bytes:
+                        raise MediaError("Source image is too large.")
+                return b''.join(chunks)
+        except requests.RequestException as error:
+            raise MediaError(f"Could not fetch source image: {error}")
+
+    def read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # the modification time is the recency eviction goes by
+        os.utime(path)
+        return data
+
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            if self._size == None:
+                self._size = self.get_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def get_files(self):
+        files = []
+        for root, directories, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def get_size(self):
+        return sum(size for mtime, size, path in self.get_files())
+
+    def evict(self):
+        """Remove least recently served files until the cache is at 90% of its limit."""
+
+        # other workers share the directory, so count what is really there
+        files = sorted(self.get_files())
+        self._size = sum(size for mtime, size, path in files)
+        for mtime, size, path in files:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def get_source(self, url):
+        path = self.get_path(url, 'source')
+        data = self.read(path)
+        if data == None:
+            data = self.fetch(url)
+            self.write(path, data)
+        return data
+
+    def get_variant(self, url, width, mimetype):
+        """Encoded image for a source URL at a width; fetched and resized once."""
+
+        path = self.get_path(url, width, mimetype)
+        data = self.read(path)
+        if data != None:
+            return data
+
+        done = self._flights.begin(path)
+        if done != None:
+            done.wait(self.timeout * 2)
+            data = self.read(path)
+            if data != None:
+                return data
+        try:
+            data = resize(self.get_source(url), width, mimetype)
+            self.write(path, data)
+            return data
+        finally:
+            if done == None:
+                self._flights.end(path)
+
+
+create_lock = threading.Lock()
+
+
+def get_media_cache(app):
+    """The app's MediaCache, created on first use."""
+
+    with create_lock:
+        if 'media' not in app.extensions:
+            app.extensions['media'] = MediaCache(app.config['MEDIA_CACHE_DIR'],
+                                                 app.config['MEDIA_CACHE_MAX_BYTES'],
+                                                 app.config['MEDIA_FETCH_TIMEOUT_SECONDS'],
+                                                 app.config['MEDIA_MAX_SOURCE_BYTES'])
+        return app.extensions['media']
@@ -0,0 +1,10 @@
+-- Append-only change log behind GET /changes (see models.Change).
+
+CREATE TABLE IF NOT EXISTS public.changes (
+    id serial PRIMARY KEY,
+    resource text NOT NULL,
+    resource_id text NOT NULL,
+    action text NOT NULL,
+    payload json,
+    created_at timestamp without time zone NOT NULL
+);
@@ -0,0 +1,14 @@
+-- Unique natural keys so writes can use INSERT ... ON CONFLICT DO NOTHING.
+-- Remove any existing duplicates before running.
+
+ALTER TABLE ONLY public.participants
+    ADD CONSTRAINT participants_name_key UNIQUE (name);
+
+ALTER TABLE ONLY public.entries
+    ADD CONSTRAINT entries_country_id_year_key UNIQUE (country_id, year);
+
+ALTER TABLE ONLY public.events
+    ADD CONSTRAINT events_event_type_year_key UNIQUE (event, type, year);
+
+ALTER TABLE ONLY public.events_entries
+    ADD CONSTRAINT events_entries_event_id_entry_id_key UNIQUE (event_id, entry_id);
@@ -0,0 +1,26 @@
+-- Let the database cascade deletes instead of the ORM loading every child.
+
+ALTER TABLE ONLY public.entries
+    DROP CONSTRAINT entries_country_id_fkey,
+    ADD CONSTRAINT entries_country_id_fkey FOREIGN KEY (country_id) REFERENCES public.countries(id) ON DELETE CASCADE;
+
+ALTER TABLE ONLY public.entries
+    DROP CONSTRAINT entries_participant_id_fkey,
+    ADD CONSTRAINT entries_participant_id_fkey FOREIGN KEY (participant_id) REFERENCES public.participants(id) ON DELETE CASCADE;
+
+ALTER TABLE ONLY public.events_entries
+    DROP CONSTRAINT events_entries_entry_id_fkey,
+    ADD CONSTRAINT events_entries_entry_id_fkey FOREIGN KEY (entry_id) REFERENCES public.entries(id) ON DELETE CASCADE;
+
+ALTER TABLE ONLY public.events_entries
+    DROP CONSTRAINT events_entries_event_id_fkey,
+    ADD CONSTRAINT events_entries_event_id_fkey FOREIGN KEY (event_id) REFERENCES public.events(id) ON DELETE CASCADE;
+
+ALTER TABLE ONLY public.events
+    DROP CONSTRAINT events_host_country_id_fkey,
+    ADD CONSTRAINT events_host_country_id_fkey FOREIGN KEY (host_country_id) REFERENCES public.countries(id) ON DELETE CASCADE;
+
+-- cascades look children up by these columns
+CREATE INDEX IF NOT EXISTS entries_participant_id_idx ON public.entries (participant_id);
+CREATE INDEX IF NOT EXISTS events_host_country_id_idx ON public.events (host_country_id);
+CREATE INDEX IF NOT EXISTS events_entries_entry_id_idx ON public.events_entries (entry_id);
@@ -0,0 +1,11 @@
+-- Store qualified as a boolean instead of free text ("true"/"false").
+-- Any other text becomes NULL.
+
+ALTER TABLE public.events_entries
+    ALTER COLUMN qualified TYPE boolean
+    USING CASE lower(trim(qualified)) WHEN 'true' THEN true WHEN 'false' THEN false END;
+
+CREATE INDEX IF NOT EXISTS ix_events_entries_qualified ON public.events_entries (qualified);
+
+-- /events/<id>/qualification looks up the final of the semi-final's year
+CREATE INDEX IF NOT EXISTS events_type_year_idx ON public.events (type, year);
@@ -0,0 +1,19 @@
+-- Copy each entry's year onto its performances so year-scoped reads can
+-- filter events_entries directly, and so it can be partitioned by year
+-- (see 006_partition_by_year.sql). The app keeps the column in step.
+
+ALTER TABLE public.events_entries ADD COLUMN IF NOT EXISTS year integer;
+
+UPDATE public.events_entries
+    SET year = entries.year
+    FROM public.entries
+    WHERE entries.id = events_entries.entry_id;
+
+ALTER TABLE public.events_entries ALTER COLUMN year SET NOT NULL;
+
+-- the natural key includes year, as a partitioned table's unique constraints must
+ALTER TABLE ONLY public.events_entries
+    DROP CONSTRAINT events_entries_event_id_entry_id_key,
+    ADD CONSTRAINT events_entries_event_id_entry_id_year_key UNIQUE (event_id, entry_id, year);
+
+CREATE INDEX IF NOT EXISTS ix_events_entries_year ON public.events_entries (year);
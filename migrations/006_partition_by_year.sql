@@ -0,0 +1,66 @@
+-- Optional: partition entries and events_entries by contest year.
+--
+-- Requires 005_performance_year.sql and PostgreSQL 15 or later; before 15,
+-- moving an entry to another year's partition ran as a delete, which would
+-- cascade to its performances.
+--
+-- Each year from 1956 to 2040 gets its own partition and a default
+-- partition takes any other year, so a query filtered on year reads one
+-- partition. Before a later year has rows, add its partitions with
+-- SELECT create_year_partitions(<year>);
+--
+-- Primary and unique keys include year because a partitioned table's
+-- must. Performances reference their entry by (entry_id, year), so an
+-- entry's year change cascades to its performances. The models work with
+-- either layout.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.create_year_partitions(partition_year integer) RETURNS void AS $$
+BEGIN
+    EXECUTE format('CREATE TABLE IF NOT EXISTS public.entries_%s PARTITION OF public.entries FOR VALUES IN (%s)',
+                   partition_year, partition_year);
+    EXECUTE format('CREATE TABLE IF NOT EXISTS public.events_entries_%s PARTITION OF public.events_entries FOR VALUES IN (%s)',
+                   partition_year, partition_year);
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE public.events_entries RENAME TO events_entries_unpartitioned;
+ALTER TABLE public.entries RENAME TO entries_unpartitioned;
+
+CREATE TABLE public.entries (
+    LIKE public.entries_unpartitioned INCLUDING DEFAULTS,
+    PRIMARY KEY (id, year),
+    UNIQUE (country_id, year),
+    FOREIGN KEY (participant_id) REFERENCES public.participants(id) ON DELETE CASCADE,
+    FOREIGN KEY (country_id) REFERENCES public.countries(id) ON DELETE CASCADE
+) PARTITION BY LIST (year);
+
+CREATE TABLE public.events_entries (
+    LIKE public.events_entries_unpartitioned INCLUDING DEFAULTS,
+    PRIMARY KEY (id, year),
+    UNIQUE (event_id, entry_id, year),
+    FOREIGN KEY (entry_id, year) REFERENCES public.entries(id, year)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    FOREIGN KEY (event_id) REFERENCES public.events(id) ON DELETE CASCADE
+) PARTITION BY LIST (year);
+
+CREATE TABLE public.entries_default PARTITION OF public.entries DEFAULT;
+CREATE TABLE public.events_entries_default PARTITION OF public.events_entries DEFAULT;
+SELECT public.create_year_partitions(partition_year) FROM generate_series(1956, 2040) AS partition_year;
+
+INSERT INTO public.entries SELECT * FROM public.entries_unpartitioned;
+INSERT INTO public.events_entries SELECT * FROM public.events_entries_unpartitioned;
+
+DROP TABLE public.events_entries_unpartitioned;
+DROP TABLE public.entries_unpartitioned;
+
+-- the indexes of 003 and 004, now created on every partition
+CREATE INDEX entries_participant_id_idx ON public.entries (participant_id);
+CREATE INDEX events_entries_entry_id_idx ON public.events_entries (entry_id);
+CREATE INDEX ix_events_entries_qualified ON public.events_entries (qualified);
+-- lookups by id alone (GET /entries/<id>) cannot prune, so index id in every partition
+CREATE INDEX entries_id_idx ON public.entries (id);
+CREATE INDEX events_entries_id_idx ON public.events_entries (id);
+
+COMMIT;
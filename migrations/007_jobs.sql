@@ -0,0 +1,20 @@
+-- Background job queue and history (see jobs.py and models.Job).
+
+CREATE TABLE IF NOT EXISTS public.jobs (
+    id serial PRIMARY KEY,
+    name text NOT NULL,
+    key text NOT NULL,
+    payload json,
+    status text NOT NULL DEFAULT 'queued',
+    attempts integer NOT NULL DEFAULT 0,
+    max_attempts integer NOT NULL,
+    error text,
+    created_at timestamp without time zone NOT NULL,
+    run_at timestamp without time zone NOT NULL,
+    started_at timestamp without time zone,
+    finished_at timestamp without time zone
+);
+
+CREATE INDEX IF NOT EXISTS ix_jobs_key ON public.jobs (key);
+-- workers poll for status = 'queued' AND run_at <= now()
+CREATE INDEX IF NOT EXISTS jobs_status_run_at_idx ON public.jobs (status, run_at);
@@ -0,0 +1,8 @@
+-- Hashes of text kept in the blob store instead of inline (see blobs.py).
+-- Run `python blobs.py` afterwards to move existing large values out.
+
+ALTER TABLE public.participants ADD COLUMN IF NOT EXISTS description_hash text;
+
+ALTER TABLE public.entries
+    ADD COLUMN IF NOT EXISTS lyrics_hash text,
+    ADD COLUMN IF NOT EXISTS lyrics_english_hash text;
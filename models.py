@@ -1,13 +1,29 @@
 # from flask import Flask,request,jsonify
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defaultload, joinedload
+from pubsub import broker, event_channel
+from reference import ReferenceCache
+from blobs import offload_text, blob_url
+from collections import defaultdict
 import datetime
 
 import string
 import random
+import sqlite3
 
 db = SQLAlchemy()
 
 
+@db.event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless foreign keys are switched on
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
+
 def connect_db(app):
     db.app = app
     db.init_app(app)
@@ -38,33 +54,194 @@ def convert_time(original_time):
         return original_time
 
 
+QUALIFIED_VALUES = {'true': True, 'false': False}
+
+
+def convert_qualified(value):
+    """Normalize "true"/"false" (or a JSON boolean) to a boolean; None if unknown."""
+
+    if value == None or isinstance(value, bool):
+        return value
+    return QUALIFIED_VALUES.get(str(value).strip().lower())
+
+
+def get_column_values(instance):
+    """Column values of a row, formatted the way serialize() formats them."""
+
+    values = {}
+    for column in instance.__table__.columns:
+        value = getattr(instance, column.key)
+        if isinstance(column.type, db.Date):
+            value = convert_date(value)
+        elif isinstance(column.type, db.Time):
+            value = convert_time(value)
+        values[column.key] = value
+    return values
+
+
+def convert_column_value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def insert_unique(model, values, natural_key):
+    """Insert a row unless one with the same natural key exists.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING, so the write and the duplicate
+    check are one statement and concurrent inserts cannot both succeed.
+    Returns True if the row was inserted.
+    """
+
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert(model.__table__).values(
+            **values).on_conflict_do_nothing(index_elements=natural_key)
+        inserted = db.session.execute(statement).rowcount == 1
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(model.__table__.insert().values(**values))
+            inserted = True
+        except IntegrityError:
+            inserted = False
+
+    if inserted:
+        record_change(db.session, model, values['id'], 'create',
+                      {key: convert_column_value(value) for key, value in values.items()})
+    db.session.commit()
+    return inserted
+
+
+def get_delete_scope(model, id):
+    """Id queries for a row and every row ON DELETE CASCADE removes with it."""
+
+    scope = {model: db.session.query(model.id).filter(model.id == id)}
+    if model is Participant:
+        scope[Entry] = db.session.query(Entry.id).filter(Entry.participant_id == id)
+        scope[Event_Entry] = db.session.query(Event_Entry.id).filter(
+            Event_Entry.entry_id.in_(scope[Entry]))
+    elif model is Country:
+        scope[Entry] = db.session.query(Entry.id).filter(Entry.country_id == id)
+        scope[Event] = db.session.query(Event.id).filter(Event.host_country_id == id)
+        scope[Event_Entry] = db.session.query(Event_Entry.id).filter(db.or_(
+            Event_Entry.entry_id.in_(scope[Entry]), Event_Entry.event_id.in_(scope[Event])))
+    elif model is Entry:
+        scope[Event_Entry] = db.session.query(Event_Entry.id).filter(Event_Entry.entry_id == id)
+    elif model is Event:
+        scope[Event_Entry] = db.session.query(Event_Entry.id).filter(Event_Entry.event_id == id)
+    return scope
+
+
+def count_delete_scope(model, id):
+    """Count the rows a delete would remove, in one aggregate query."""
+
+    scope = get_delete_scope(model, id)
+    counts = db.session.query(*[
+        db.session.query(db.func.count()).select_from(query.subquery()).label(table.__tablename__)
+        for table, query in scope.items()]).one()
+    return dict(zip([table.__tablename__ for table in scope], counts))
+
+
+def delete_cascade(model, id):
+    """Delete a row with one statement and let the database cascade.
+
+    Nothing is loaded into the session. The ids of the cascaded rows are
+    read first, one query per table, so the change log still records them
+    and live scoreboards can be told which performances went with them.
+    """
+
+    lock_change_log(db.session)
+    deleted = []
+    cascaded_performances = []
+    for table, query in get_delete_scope(model, id).items():
+        if table is Event_Entry and model is not Event_Entry:
+            query = query.add_columns(Event_Entry.event_id).all()
+            cascaded_performances = [(row.id, row.event_id) for row in query]
+        deleted += [{'resource': CHANGE_RESOURCES[table], 'resource_id': row.id,
+                     'action': 'delete', 'payload': None,
+                     'created_at': datetime.datetime.utcnow()} for row in query]
+
+    model.query.filter(model.id == id).delete(synchronize_session=False)
+    if deleted:
+        db.session.execute(Change.__table__.insert(), deleted)
+    db.session.commit()
+
+    # a direct performance delete is published by its route; cascades are not
+    for performance_id, event_id in cascaded_performances:
+        broker.publish(event_channel(event_id), {
+            "type": "delete",
+            "performance": {"id": performance_id}
+        })
+
+
+def group_by(rows, key, value):
+    """{row.key: [row.value, ...]} in row order."""
+
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[getattr(row, key)].append(getattr(row, value))
+    return grouped
+
+
+def commit_unique(instance):
+    """Commit an update; return None if it collides with a unique natural key."""
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return instance
+
+
 class Participant(db.Model):
     """Participant model."""
 
     __tablename__ = 'participants'
+    __table_args__ = (db.UniqueConstraint('name'),)
 
     id = db.Column(db.Text, primary_key=True)
     name = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.Text, nullable=True)
     description = db.Column(db.Text, nullable=True)
+    # set instead of description when it is kept in the blob store
+    description_hash = db.Column(db.Text, nullable=True)
 
     entries = db.relationship(
-        'Entry', backref='participant', cascade='all, delete-orphan')
+        'Entry', backref='participant', cascade='all, delete-orphan', passive_deletes=True)
 
     def serialize(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'image_url': self.image_url,
-            'description': self.description,
-            'entries': [entry.id for entry in self.entries],
-            'countries_represented': [entry.country.id for entry in self.entries],
-            'performances': [performance.id for performance in self.get_performances()],
-            'events': [performance.event_id for performance in self.get_performances()]
-        }
+        return Participant.serialize_all([self])[0]
 
-    def get_performances(self):
-        return db.session.query(Event_Entry).filter(Participant.id == self.id).join(Entry).order_by(Entry.year).all()
+    @classmethod
+    def serialize_all(cls, participants):
+        """Serialize participants with two queries for their id lists, however many there are."""
+
+        if not participants:
+            return []
+        ids = [participant.id for participant in participants]
+        entry_rows = db.session.query(Entry.id, Entry.participant_id, Entry.country_id).filter(
+            Entry.participant_id.in_(ids)).all()
+        performance_rows = db.session.query(Event_Entry.id, Event_Entry.event_id, Entry.participant_id).select_from(
+            Event_Entry).join(Entry).filter(Entry.participant_id.in_(ids)).order_by(Entry.year).all()
+
+        entries = group_by(entry_rows, 'participant_id', 'id')
+        countries = group_by(entry_rows, 'participant_id', 'country_id')
+        performances = group_by(performance_rows, 'participant_id', 'id')
+        events = group_by(performance_rows, 'participant_id', 'event_id')
+        return [{
+            'id': participant.id,
+            'name': participant.name,
+            'image_url': participant.image_url,
+            'description': participant.description,
+            'description_url': blob_url(participant.description_hash),
+            'entries': entries[participant.id],
+            'countries_represented': countries[participant.id],
+            'performances': performances[participant.id],
+            'events': events[participant.id]
+        } for participant in participants]
 
     @classmethod
     def get_by_id(cls, id):
@@ -74,10 +251,24 @@ class Participant(db.Model):
     def get_by_name(cls, name):
         return cls.query.filter_by(name=name).one_or_none()
 
+    @classmethod
+    def load_options(cls):
+        """Relationships serialize() reads, loaded in bulk along with the rows."""
+
+        return []
+
+    @classmethod
+    def get_many(cls, ids):
+        return cls.query.options(*cls.load_options()).filter(cls.id.in_(ids)).all()
+
+    @classmethod
+    def query_all(cls):
+        return cls.query.order_by(cls.name)
+
     @classmethod
     def get_all(cls):
         # return cls.query.all()
-        return db.session.query(Participant).order_by(Participant.name).all()
+        return cls.query_all().options(*cls.load_options()).all()
 
     @classmethod
     def get_choices(cls):
@@ -85,13 +276,13 @@ class Participant(db.Model):
 
     @classmethod
     def register(cls, name, image_url, description):
-        """Add new participant to database."""
+        """Add new participant to database; return None if the name is taken."""
 
-        new_participant = cls(id=generate_random_string(
-            10, cls.get_by_id), name=name, image_url=image_url, description=description)
-        db.session.add(new_participant)
-        db.session.commit()
-        return new_participant
+        id = generate_random_string(10, cls.get_by_id)
+        description, description_hash = offload_text(description)
+        if not insert_unique(cls, dict(id=id, name=name, image_url=image_url, description=description, description_hash=description_hash), ['name']):
+            return None
+        return cls.get_by_id(id)
 
     @classmethod
     def update(cls, participant, name, image_url, description):
@@ -99,20 +290,23 @@ class Participant(db.Model):
 
         participant.name = name
         participant.image_url = image_url
-        participant.description = description
+        participant.description, participant.description_hash = offload_text(description)
         db.session.add(participant)
-        db.session.commit()
-        return participant
+        return commit_unique(participant)
 
     @classmethod
     def delete(cls, id):
-        """Delete participant from database."""
+        """Delete participant and, through ON DELETE CASCADE, its entries and their performances."""
 
-        participant = cls.get_by_id(id)
-        db.session.delete(participant)
-        db.session.commit()
+        delete_cascade(cls, id)
         return "deleted"
 
+    @ classmethod
+    def count_deletes(cls, id):
+        """Rows deleting this participant would remove, by table."""
+
+        return count_delete_scope(cls, id)
+
 
 class Country(db.Model):
     """Country model."""
@@ -124,47 +318,75 @@ class Country(db.Model):
     flag_image_url = db.Column(db.Text, nullable=True)
 
     entries = db.relationship(
-        'Entry', backref='country', cascade='all, delete-orphan')
+        'Entry', backref='country', cascade='all, delete-orphan', passive_deletes=True)
 
     events = db.relationship(
-        'Event', backref='country', cascade='all, delete-orphan')
+        'Event', backref='country', cascade='all, delete-orphan', passive_deletes=True)
 
     def serialize(self):
-        return {
-            'id': self.id,
-            'country': self.country,
-            'flag_image_url': self.flag_image_url,
-            'entries': [entry.id for entry in self.entries],
-            'events': [event.id for event in self.events],
-            'participants': [entry.participant_id for entry in self.entries],
-            'performances': [performance.id for performance in self.get_performances()]
-        }
+        return Country.serialize_all([self])[0]
 
-    def get_performances(self):
-        return db.session.query(Event_Entry).filter(Country.id == self.id).join(Event).order_by(Event.year).all()
+    @classmethod
+    def serialize_all(cls, countries):
+        """Serialize countries with three queries for their id lists, however many there are."""
+
+        if not countries:
+            return []
+        ids = [country.id for country in countries]
+        entry_rows = db.session.query(Entry.id, Entry.country_id, Entry.participant_id).filter(
+            Entry.country_id.in_(ids)).all()
+        event_rows = db.session.query(Event.id, Event.host_country_id).filter(
+            Event.host_country_id.in_(ids)).all()
+        performance_rows = db.session.query(Event_Entry.id, Entry.country_id).select_from(Event_Entry).join(
+            Entry).join(Event, Event_Entry.event_id == Event.id).filter(Entry.country_id.in_(ids)).order_by(Event.year).all()
+
+        entries = group_by(entry_rows, 'country_id', 'id')
+        participants = group_by(entry_rows, 'country_id', 'participant_id')
+        events = group_by(event_rows, 'host_country_id', 'id')
+        performances = group_by(performance_rows, 'country_id', 'id')
+        return [{
+            'id': country.id,
+            'country': country.country,
+            'flag_image_url': country.flag_image_url,
+            'entries': entries[country.id],
+            'events': events[country.id],
+            'participants': participants[country.id],
+            'performances': performances[country.id]
+        } for country in countries]
 
     @classmethod
     def get_by_id(cls, id):
         return cls.query.filter_by(id=id).one_or_none()
 
+    @ classmethod
+    def load_options(cls):
+        return []
+
+    @ classmethod
+    def get_many(cls, ids):
+        return cls.query.options(*cls.load_options()).filter(cls.id.in_(ids)).all()
+
+    @ classmethod
+    def query_all(cls):
+        return cls.query.order_by(cls.country)
+
     @ classmethod
     def get_all(cls):
         # return cls.query.all()
-        return db.session.query(Country).order_by(Country.country).all()
+        return cls.query_all().options(*cls.load_options()).all()
 
     @ classmethod
     def get_choices(cls):
-        return [country.id for country in Country.query.all()]
+        return list(reference_data.get().countries)
 
     @ classmethod
     def register(cls, id, country, flag_image_url):
-        """Add new country to database."""
+        """Add new country to database; return None if the id is taken."""
 
-        new_country = cls(id=id.upper(), country=country,
-                          flag_image_url=flag_image_url)
-        db.session.add(new_country)
-        db.session.commit()
-        return new_country
+        id = id.upper()
+        if not insert_unique(cls, dict(id=id, country=country, flag_image_url=flag_image_url), ['id']):
+            return None
+        return cls.get_by_id(id)
 
     @ classmethod
     def update(cls, country, country_name, flag_image_url):
@@ -173,27 +395,31 @@ class Country(db.Model):
         country.country = country_name
         country.flag_image_url = flag_image_url
         db.session.add(country)
-        db.session.commit()
-        return country
+        return commit_unique(country)
 
     @ classmethod
     def delete(cls, id):
-        """Delete country from database."""
+        """Delete country and, through ON DELETE CASCADE, its entries, hosted events and their performances."""
 
-        country = cls.get_by_id(id)
-        db.session.delete(country)
-        db.session.commit()
+        delete_cascade(cls, id)
         return "deleted"
 
+    @ classmethod
+    def count_deletes(cls, id):
+        """Rows deleting this country would remove, by table."""
+
+        return count_delete_scope(cls, id)
+
 
 class Entry(db.Model):
     """Entry model."""
 
     __tablename__ = 'entries'
+    __table_args__ = (db.UniqueConstraint('country_id', 'year'),)
 
     id = db.Column(db.Text, primary_key=True)
-    participant_id = db.Column(db.Text, db.ForeignKey('participants.id'))
-    country_id = db.Column(db.Text, db.ForeignKey('countries.id'))
+    participant_id = db.Column(db.Text, db.ForeignKey('participants.id', ondelete='CASCADE'))
+    country_id = db.Column(db.Text, db.ForeignKey('countries.id', ondelete='CASCADE'))
     title = db.Column(db.Text, nullable=False)
     year = db.Column(db.Integer, nullable=False)
     eurovision_resource_url = db.Column(db.Text, nullable=True)
@@ -206,35 +432,53 @@ class Entry(db.Model):
     lyrics = db.Column(db.Text, nullable=True)
     lyrics_language = db.Column(db.Text, nullable=True)
     lyrics_english = db.Column(db.Text, nullable=True)
+    # set instead of the lyrics columns when they are kept in the blob store
+    lyrics_hash = db.Column(db.Text, nullable=True)
+    lyrics_english_hash = db.Column(db.Text, nullable=True)
 
     performances = db.relationship(
-        'Event_Entry', backref='entry', cascade='all, delete-orphan')
+        'Event_Entry', backref='entry', cascade='all, delete-orphan', passive_deletes=True)
 
     def serialize(self):
-        return {
-            'id': self.id,
-            'participant_id': self.participant_id,
-            'participant': self.participant.name,
-            'country_id': self.country_id,
-            'country': self.country.country,
-            'title': self.title,
-            'year': self.year,
-            'eurovision_resource_url': self.eurovision_resource_url,
-            'eurovision_video_url': self.eurovision_video_url,
-            'music_video_url': self.music_video_url,
-            'spotify_url': self.spotify_url,
-            'written_by': self.written_by,
-            'composed_by': self.composed_by,
-            'broadcaster': self.broadcaster,
-            'lyrics': self.lyrics,
-            'lyrics_language': self.lyrics_language,
-            'lyrics_english': self.lyrics_english,
-            'performances': [performance.id for performance in self.performances],
-            'events': [event.id for event in self.get_events()]
-        }
+        return Entry.serialize_all([self])[0]
 
-    def get_events(self):
-        return db.session.query(Event).filter(Entry.id == self.id).join(Event_Entry).order_by(Event.date).all()
+    @ classmethod
+    def serialize_all(cls, entries):
+        """Serialize entries with one query for their id lists, however many there are.
+
+        Participant names come from the participant relationship; load_options() joins it.
+        """
+
+        if not entries:
+            return []
+        performance_rows = db.session.query(Event_Entry.id, Event_Entry.entry_id, Event_Entry.event_id).join(
+            Event).filter(Event_Entry.entry_id.in_([entry.id for entry in entries])).order_by(Event.date).all()
+
+        performances = group_by(performance_rows, 'entry_id', 'id')
+        events = group_by(performance_rows, 'entry_id', 'event_id')
+        return [{
+            'id': entry.id,
+            'participant_id': entry.participant_id,
+            'participant': entry.participant.name,
+            'country_id': entry.country_id,
+            'country': reference_data.country_name(entry.country_id) or entry.country.country,
+            'title': entry.title,
+            'year': entry.year,
+            'eurovision_resource_url': entry.eurovision_resource_url,
+            'eurovision_video_url': entry.eurovision_video_url,
+            'music_video_url': entry.music_video_url,
+            'spotify_url': entry.spotify_url,
+            'written_by': entry.written_by,
+            'composed_by': entry.composed_by,
+            'broadcaster': entry.broadcaster,
+            'lyrics': entry.lyrics,
+            'lyrics_url': blob_url(entry.lyrics_hash),
+            'lyrics_language': entry.lyrics_language,
+            'lyrics_english': entry.lyrics_english,
+            'lyrics_english_url': blob_url(entry.lyrics_english_hash),
+            'performances': performances[entry.id],
+            'events': events[entry.id]
+        } for entry in entries]
 
     @ classmethod
     def get_by_id(cls, id):
@@ -244,10 +488,26 @@ class Entry(db.Model):
     def get_by_props(cls, country_id, year):
         return cls.query.filter_by(country_id=country_id, year=year).one_or_none()
 
+    @ classmethod
+    def get_year(cls, id):
+        return db.session.query(cls.year).filter(cls.id == id).scalar()
+
+    @ classmethod
+    def load_options(cls):
+        return [joinedload(cls.participant)]
+
+    @ classmethod
+    def get_many(cls, ids):
+        return cls.query.options(*cls.load_options()).filter(cls.id.in_(ids)).all()
+
+    @ classmethod
+    def query_all(cls):
+        return cls.query.order_by(cls.title)
+
     @ classmethod
     def get_all(cls):
         # return cls.query.all()
-        return db.session.query(Entry).order_by(Entry.title).all()
+        return cls.query_all().options(*cls.load_options()).all()
 
     @ classmethod
     def get_choices(cls):
@@ -255,13 +515,14 @@ class Entry(db.Model):
 
     @ classmethod
     def register(cls, participant_id, country_id, title, year, eurovision_resource_url, eurovision_video_url, music_video_url, spotify_url, written_by, composed_by, broadcaster, lyrics, lyrics_language, lyrics_english):
-        """Add new entry to database."""
+        """Add new entry to database; return None if the country already has an entry that year."""
 
-        new_entry = cls(id=generate_random_string(
-            10, cls.get_by_id), participant_id=participant_id, country_id=country_id, title=title, year=year, eurovision_resource_url=eurovision_resource_url, eurovision_video_url=eurovision_video_url, music_video_url=music_video_url, spotify_url=spotify_url, written_by=written_by, composed_by=composed_by, broadcaster=broadcaster, lyrics=lyrics, lyrics_language=lyrics_language, lyrics_english=lyrics_english)
-        db.session.add(new_entry)
-        db.session.commit()
-        return new_entry
+        id = generate_random_string(10, cls.get_by_id)
+        lyrics, lyrics_hash = offload_text(lyrics)
+        lyrics_english, lyrics_english_hash = offload_text(lyrics_english)
+        if not insert_unique(cls, dict(id=id, participant_id=participant_id, country_id=country_id, title=title, year=year, eurovision_resource_url=eurovision_resource_url, eurovision_video_url=eurovision_video_url, music_video_url=music_video_url, spotify_url=spotify_url, written_by=written_by, composed_by=composed_by, broadcaster=broadcaster, lyrics=lyrics, lyrics_language=lyrics_language, lyrics_english=lyrics_english, lyrics_hash=lyrics_hash, lyrics_english_hash=lyrics_english_hash), ['country_id', 'year']):
+            return None
+        return cls.get_by_id(id)
 
     @ classmethod
     def update(cls, entry, participant_id, country_id, title, year, eurovision_resource_url, eurovision_video_url, music_video_url, spotify_url, written_by, composed_by, broadcaster, lyrics, lyrics_language, lyrics_english):
@@ -278,27 +539,34 @@ class Entry(db.Model):
         entry.written_by = written_by
         entry.composed_by = composed_by
         entry.broadcaster = broadcaster
-        entry.lyrics = lyrics
+        entry.lyrics, entry.lyrics_hash = offload_text(lyrics)
         entry.lyrics_language = lyrics_language
-        entry.lyrics_english = lyrics_english
+        entry.lyrics_english, entry.lyrics_english_hash = offload_text(lyrics_english)
+        # performances carry the entry's year (their partition key)
+        for performance in entry.performances:
+            performance.year = year
         db.session.add(entry)
-        db.session.commit()
-        return entry
+        return commit_unique(entry)
 
     @ classmethod
     def delete(cls, id):
-        """Delete entry from database."""
+        """Delete entry and, through ON DELETE CASCADE, its performances."""
 
-        entry = cls.get_by_id(id)
-        db.session.delete(entry)
-        db.session.commit()
+        delete_cascade(cls, id)
         return "deleted"
 
+    @ classmethod
+    def count_deletes(cls, id):
+        """Rows deleting this entry would remove, by table."""
+
+        return count_delete_scope(cls, id)
+
 
 class Event(db.Model):
     """Event model."""
 
     __tablename__ = 'events'
+    __table_args__ = (db.UniqueConstraint('event', 'type', 'year'),)
 
     id = db.Column(db.Text, primary_key=True)
     event = db.Column(db.Text, nullable=False)
@@ -312,34 +580,45 @@ class Event(db.Model):
     video_playlist_url = db.Column(db.Text, nullable=True)
     spotify_playlist_url = db.Column(db.Text, nullable=True)
     host_city = db.Column(db.Text, nullable=False)
-    host_country_id = db.Column(db.Text, db.ForeignKey('countries.id'))
+    host_country_id = db.Column(db.Text, db.ForeignKey('countries.id', ondelete='CASCADE'))
 
     performances = db.relationship(
-        'Event_Entry', backref='event', cascade='all, delete-orphan')
+        'Event_Entry', backref='event', cascade='all, delete-orphan', passive_deletes=True)
 
     def serialize(self):
-        return {
-            'id': self.id,
-            'event': self.event,
-            'type': self.type,
-            'year': self.year,
-            'date': convert_date(self.date),
-            'start_time': convert_time(self.start_time),
-            'end_time': convert_time(self.end_time),
-            'eurovision_resource_url': self.eurovision_resource_url,
-            'recap_video_url': self.recap_video_url,
-            'video_playlist_url': self.video_playlist_url,
-            'spotify_playlist_url': self.spotify_playlist_url,
-            'host_city': self.host_city,
-            'host_country_id': self.country.id,
-            'host_country': self.country.country,
-            'performances': [performance.id for performance in self.performances],
-            'entries': [entry.id for entry in self.get_entries()],
-            'participating_countries': [entry.country_id for entry in self.get_entries()]
-        }
+        return Event.serialize_all([self])[0]
 
-    def get_entries(self):
-        return db.session.query(Entry).filter(Event.id == self.id).join(Event_Entry).order_by(Entry.country_id).all()
+    @ classmethod
+    def serialize_all(cls, events):
+        """Serialize events with one query for their id lists, however many there are."""
+
+        if not events:
+            return []
+        performance_rows = db.session.query(Event_Entry.id, Event_Entry.event_id, Event_Entry.entry_id, Entry.country_id).join(
+            Entry).filter(Event_Entry.event_id.in_([event.id for event in events])).order_by(Entry.country_id).all()
+
+        performances = group_by(performance_rows, 'event_id', 'id')
+        entries = group_by(performance_rows, 'event_id', 'entry_id')
+        countries = group_by(performance_rows, 'event_id', 'country_id')
+        return [{
+            'id': event.id,
+            'event': event.event,
+            'type': event.type,
+            'year': event.year,
+            'date': convert_date(event.date),
+            'start_time': convert_time(event.start_time),
+            'end_time': convert_time(event.end_time),
+            'eurovision_resource_url': event.eurovision_resource_url,
+            'recap_video_url': event.recap_video_url,
+            'video_playlist_url': event.video_playlist_url,
+            'spotify_playlist_url': event.spotify_playlist_url,
+            'host_city': event.host_city,
+            'host_country_id': event.host_country_id,
+            'host_country': reference_data.country_name(event.host_country_id) or event.country.country,
+            'performances': performances[event.id],
+            'entries': entries[event.id],
+            'participating_countries': countries[event.id]
+        } for event in events]
 
     @ classmethod
     def get_by_id(cls, id):
@@ -349,24 +628,35 @@ class Event(db.Model):
     def get_by_props(cls, event, type, year):
         return cls.query.filter_by(event=event, type=type, year=year).one_or_none()
 
+    @ classmethod
+    def load_options(cls):
+        return []
+
+    @ classmethod
+    def get_many(cls, ids):
+        return cls.query.options(*cls.load_options()).filter(cls.id.in_(ids)).all()
+
+    @ classmethod
+    def query_all(cls):
+        return cls.query.order_by(cls.date.desc(), cls.event)
+
     @ classmethod
     def get_all(cls):
         # return cls.query.all()
-        return db.session.query(Event).order_by(Event.date.desc(), Event.event).all()
+        return cls.query_all().options(*cls.load_options()).all()
 
     @ classmethod
     def get_choices(cls):
-        return [event.id for event in Event.query.all()]
+        return list(reference_data.get().events)
 
     @ classmethod
     def register(cls, event, type, year, date, start_time, end_time, eurovision_resource_url, recap_video_url, video_playlist_url, spotify_playlist_url, host_city, host_country_id):
-        """Add new entry to database."""
+        """Add new event to database; return None if the name, type and year are taken."""
 
-        new_event = cls(id=generate_random_string(
-            10, cls.get_by_id), event=event, type=type, year=year, date=date, start_time=start_time, end_time=end_time, eurovision_resource_url=eurovision_resource_url, recap_video_url=recap_video_url, video_playlist_url=video_playlist_url, spotify_playlist_url=spotify_playlist_url, host_city=host_city, host_country_id=host_country_id)
-        db.session.add(new_event)
-        db.session.commit()
-        return new_event
+        id = generate_random_string(10, cls.get_by_id)
+        if not insert_unique(cls, dict(id=id, event=event, type=type, year=year, date=date, start_time=start_time, end_time=end_time, eurovision_resource_url=eurovision_resource_url, recap_video_url=recap_video_url, video_playlist_url=video_playlist_url, spotify_playlist_url=spotify_playlist_url, host_city=host_city, host_country_id=host_country_id), ['event', 'type', 'year']):
+            return None
+        return cls.get_by_id(id)
 
     @ classmethod
     def update(cls, event, event_name, type, year, date, start_time, end_time, eurovision_resource_url, recap_video_url, video_playlist_url, spotify_playlist_url, host_city, host_country_id):
@@ -385,31 +675,42 @@ class Event(db.Model):
         event.host_city = host_city
         event.host_country_id = host_country_id
         db.session.add(event)
-        db.session.commit()
-        return event
+        return commit_unique(event)
 
     @ classmethod
     def delete(cls, id):
-        """Delete event from database."""
+        """Delete event and, through ON DELETE CASCADE, its performances."""
 
-        event = cls.get_by_id(id)
-        db.session.delete(event)
-        db.session.commit()
+        delete_cascade(cls, id)
         return "deleted"
 
+    @ classmethod
+    def count_deletes(cls, id):
+        """Rows deleting this event would remove, by table."""
+
+        return count_delete_scope(cls, id)
+
 
 class Event_Entry(db.Model):
-    """Performance model."""
+    """Performance model.
+
+    `year` is copied from the entry so reads scoped to a contest year can
+    filter on it, and so the table can be partitioned by year (see
+    migrations/006_partition_by_year.sql).
+    """
 
     __tablename__ = 'events_entries'
+    # a partitioned table's unique constraints must include the partition key
+    __table_args__ = (db.UniqueConstraint('event_id', 'entry_id', 'year'),)
 
     id = db.Column(db.Text, primary_key=True)
-    event_id = db.Column(db.Text, db.ForeignKey('events.id'))
-    entry_id = db.Column(db.Text, db.ForeignKey('entries.id'))
+    event_id = db.Column(db.Text, db.ForeignKey('events.id', ondelete='CASCADE'))
+    entry_id = db.Column(db.Text, db.ForeignKey('entries.id', ondelete='CASCADE'))
     points = db.Column(db.Integer, nullable=True)
     place = db.Column(db.Integer, nullable=True)
-    qualified = db.Column(db.Text, nullable=True)
+    qualified = db.Column(db.Boolean, nullable=True, index=True)
     running_order = db.Column(db.Integer, nullable=True)
+    year = db.Column(db.Integer, nullable=False, index=True)
 
     def serialize(self):
         return {
@@ -417,17 +718,24 @@ class Event_Entry(db.Model):
             'entry_id': self.entry_id,
             'entry': self.entry.title,
             'event_id': self.event_id,
-            'event': self.event.event,
+            'event': reference_data.event_name(self.event_id) or self.event.event,
             'points': self.points,
             'place': self.place,
             'qualified': self.qualified,
             'running_order': self.running_order,
+            'year': self.year,
             'participant_id': self.entry.participant.id,
             'participant': self.entry.participant.name,
-            'country_id': self.entry.country.id,
-            'country': self.entry.country.country
+            'country_id': self.entry.country_id,
+            'country': reference_data.country_name(self.entry.country_id) or self.entry.country.country
         }
 
+    @ classmethod
+    def serialize_all(cls, performances):
+        """Serialize performances; load_options() joins the entry and participant they read."""
+
+        return [performance.serialize() for performance in performances]
+
     @ classmethod
     def get_by_id(cls, id):
         return cls.query.filter_by(id=id).one_or_none()
@@ -436,24 +744,91 @@ class Event_Entry(db.Model):
     def get_by_ids(cls, event_id, entry_id):
         return cls.query.filter_by(event_id=event_id, entry_id=entry_id).one_or_none()
 
+    @ classmethod
+    def load_options(cls, year=None):
+        """Eager loads of the entry and participant; with a year, only that year's entries are joined."""
+
+        if year == None:
+            return [joinedload(cls.entry).joinedload(Entry.participant)]
+        return [joinedload(cls.entry.and_(Entry.year == year)),
+                defaultload(cls.entry).joinedload(Entry.participant)]
+
+    @ classmethod
+    def get_many(cls, ids):
+        return cls.query.options(*cls.load_options()).filter(cls.id.in_(ids)).all()
+
+    @ classmethod
+    def query_all(cls):
+        return cls.query
+
     @ classmethod
     def get_all(cls):
-        return cls.query.all()
+        return cls.query_all().options(*cls.load_options()).all()
 
     @ classmethod
     def get_choices(cls):
         return [performance.id for performance in Event_Entry.query.all()]
 
+    @ classmethod
+    def get_qualification(cls, event):
+        """Each performance in a semi-final beside the entry's final performance that year.
+
+        One query: the year's final performances are outer joined on entry,
+        so entries that did not reach the final have no final columns.
+        """
+
+        finals = (db.select(cls.id, cls.entry_id, cls.running_order, cls.points, cls.place)
+                  .select_from(cls)
+                  .join(Event, cls.event_id == Event.id)
+                  .where(Event.type == 'final', Event.year == event.year, cls.year == event.year)
+                  .subquery('finals'))
+        query = (db.select(cls.id, cls.entry_id, Entry.title, Entry.country_id, cls.running_order,
+                           cls.points, cls.place, cls.qualified,
+                           finals.c.id.label('final_id'),
+                           finals.c.running_order.label('final_running_order'),
+                           finals.c.points.label('final_points'),
+                           finals.c.place.label('final_place'),
+                           (finals.c.points - cls.points).label('points_delta'))
+                 .select_from(cls)
+                 .join(Entry, cls.entry_id == Entry.id)
+                 .outerjoin(finals, finals.c.entry_id == cls.entry_id)
+                 .where(cls.event_id == event.id, cls.year == event.year, Entry.year == event.year)
+                 .order_by(cls.running_order, cls.id))
+
+        performances = []
+        for row in db.session.execute(query):
+            reached_final = row.final_id != None
+            performances.append({
+                'id': row.id,
+                'entry_id': row.entry_id,
+                'entry': row.title,
+                'country_id': row.country_id,
+                'country': reference_data.country_name(row.country_id),
+                'running_order': row.running_order,
+                'points': row.points,
+                'place': row.place,
+                # fall back on the final when the result was not recorded
+                'qualified': row.qualified if row.qualified != None else reached_final,
+                'reached_final': reached_final,
+                'final': {
+                    'id': row.final_id,
+                    'running_order': row.final_running_order,
+                    'points': row.final_points,
+                    'place': row.final_place
+                } if reached_final else None,
+                'points_delta': row.points_delta
+            })
+        return performances
+
     @ classmethod
     def register(cls, event_id, entry_id, points, place, qualified, running_order):
-        """Add new event-entry to database."""
+        """Add new event-entry to database; return None if the entry already performed in the event."""
 
-        new_performance = cls(id=generate_random_string(
-            10, cls.get_by_id), event_id=event_id, entry_id=entry_id,
-            points=points, place=place, qualified=qualified, running_order=running_order)
-        db.session.add(new_performance)
-        db.session.commit()
-        return new_performance
+        id = generate_random_string(10, cls.get_by_id)
+        if not insert_unique(cls, dict(id=id, event_id=event_id, entry_id=entry_id, year=Entry.get_year(entry_id),
+                                       points=points, place=place, qualified=convert_qualified(qualified), running_order=running_order), ['event_id', 'entry_id', 'year']):
+            return None
+        return cls.get_by_id(id)
 
     @ classmethod
     def update(cls, performance, event_id, entry_id, points, place, qualified, running_order):
@@ -461,19 +836,204 @@ class Event_Entry(db.Model):
 
         performance.event_id = event_id
         performance.entry_id = entry_id
+        performance.year = Entry.get_year(entry_id)
         performance.points = points
         performance.place = place
-        performance.qualified = qualified
+        performance.qualified = convert_qualified(qualified)
         performance.running_order = running_order
         db.session.add(performance)
-        db.session.commit()
-        return performance
+        return commit_unique(performance)
 
     @ classmethod
     def delete(cls, id):
         """Delete performance from database."""
 
-        performance = cls.get_by_id(id)
-        db.session.delete(performance)
-        db.session.commit()
+        delete_cascade(cls, id)
         return "deleted"
+
+    @ classmethod
+    def count_deletes(cls, id):
+        """Rows deleting this performance would remove, by table."""
+
+        return count_delete_scope(cls, id)
+
+
+class Change(db.Model):
+    """Change log model.
+
+    One row is appended, in the same transaction, for every insert, update
+    and delete of the resource tables. The autoincrementing id is the
+    cursor clients pass to /changes?since=.
+    """
+
+    __tablename__ = 'changes'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    resource = db.Column(db.Text, nullable=False)
+    resource_id = db.Column(db.Text, nullable=False)
+    action = db.Column(db.Text, nullable=False)
+    payload = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.datetime.utcnow)
+
+    def serialize(self):
+        return {
+            'cursor': self.id,
+            'resource': self.resource,
+            'resource_id': self.resource_id,
+            'action': self.action,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat()
+        }
+
+    @ classmethod
+    def get_since(cls, cursor, limit):
+        return cls.query.filter(cls.id > cursor).order_by(cls.id).limit(limit).all()
+
+    @ classmethod
+    def get_latest_cursor(cls):
+        return db.session.query(db.func.max(cls.id)).scalar() or 0
+
+    @ classmethod
+    def record(cls, session, resource, resource_id, action, payload):
+        """Add change to the session's pending transaction."""
+
+        session.add(cls(resource=resource, resource_id=resource_id,
+                        action=action, payload=payload))
+
+
+class Job(db.Model):
+    """Background job model.
+
+    A row per unit of work queued by jobs.enqueue(). Workers claim queued
+    rows whose run_at has passed and record the outcome on the row, so the
+    table is also the job history the /jobs metrics are computed from.
+    """
+
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.Text, nullable=False)
+    # name and payload, for coalescing identical queued jobs
+    key = db.Column(db.Text, nullable=False, index=True)
+    payload = db.Column(db.JSON, nullable=True)
+    status = db.Column(db.Text, nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.datetime.utcnow)
+    run_at = db.Column(db.DateTime, nullable=False,
+                       default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index('jobs_status_run_at_idx', 'status', 'run_at'),)
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'run_at': self.run_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    @ classmethod
+    def get_by_id(cls, id):
+        return cls.query.filter_by(id=id).one_or_none()
+
+
+CHANGE_RESOURCES = {
+    Participant: 'participant',
+    Country: 'country',
+    Entry: 'entry',
+    Event: 'event',
+    Event_Entry: 'performance'
+}
+
+# tables held in memory by every worker; see reference.py
+REFERENCE_MODELS = {Country, Event}
+
+# arbitrary key for the advisory lock that orders change log writers
+CHANGE_LOG_LOCK_ID = 28
+
+
+def get_column_payload(instance):
+    return {column.name: convert_column_value(getattr(instance, column.key))
+            for column in instance.__table__.columns}
+
+
+@db.event.listens_for(db.session, 'before_flush')
+def record_changes(session, flush_context, instances):
+    """Append change log rows for everything about to be flushed."""
+
+    changes = []
+    for instance in session.new:
+        if type(instance) in CHANGE_RESOURCES:
+            changes.append((instance, 'create', get_column_payload(instance)))
+    for instance in session.dirty:
+        if type(instance) in CHANGE_RESOURCES and session.is_modified(instance):
+            changes.append((instance, 'update', get_column_payload(instance)))
+    for instance in session.deleted:
+        if type(instance) in CHANGE_RESOURCES:
+            changes.append((instance, 'delete', None))
+
+    if not changes:
+        return
+
+    if any(type(instance) in REFERENCE_MODELS for instance, action, payload in changes):
+        session.info['reference_changed'] = True
+    lock_change_log(session)
+    for instance, action, payload in changes:
+        Change.record(session, CHANGE_RESOURCES[type(instance)],
+                      instance.id, action, payload)
+
+
+def lock_change_log(session):
+    # Postgres hands out sequence values before commit, so two concurrent
+    # writers could commit cursors out of order and a reader could skip
+    # one. Serializing writers until commit keeps cursors monotonic.
+    if db.engine.dialect.name == 'postgresql':
+        session.execute(db.text('SELECT pg_advisory_xact_lock(:id)'),
+                        {'id': CHANGE_LOG_LOCK_ID})
+
+
+def record_change(session, model, id, action, payload):
+    """Append a change log row for a write made outside the ORM flush."""
+
+    if model in REFERENCE_MODELS:
+        session.info['reference_changed'] = True
+    lock_change_log(session)
+    Change.record(session, CHANGE_RESOURCES[model], id, action, payload)
+
+
+#####################################################################
+# ------------------------ Reference data ------------------------- #
+#####################################################################
+
+
+def load_reference_data():
+    countries = db.session.query(Country.id, Country.country).all()
+    events = db.session.query(Event.id, Event.event).all()
+    return (countries, events)
+
+
+reference_data = ReferenceCache(load_reference_data, broker)
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def bump_reference_version(session):
+    if session.info.pop('reference_changed', False):
+        reference_data.bump()
+
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_reference_change(session):
+    session.info.pop('reference_changed', None)
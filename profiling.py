@@ -0,0 +1,220 @@
+"""Opt-in profiles of single requests.
+
+A request is profiled when it carries `X-Profile: 1` together with the
+admin key (PROFILE_API_KEY, or API_KEY when that is unset) in its API-Key
+header, or at random with probability PROFILE_SAMPLE_RATE (default 0).
+The response then carries X-Profile-Id, and the profile is kept under
+PROFILE_DIR, newest PROFILE_MAX_FILES only, to list and download from
+/profiles.
+
+PROFILER picks how:
+
+* cprofile (default) - exact call counts and times from the standard
+  library, saved as a .pstats file (snakeviz, flameprof, `python -m pstats`);
+* pyinstrument - a statistical profile saved in speedscope's JSON format,
+  which https://www.speedscope.app shows as a flame graph (requires the
+  `pyinstrument` package).
+
+One request per worker is profiled at a time; others run as usual. A
+streamed body (CSV exports, /events/<id>/stream) is produced after the
+profile ends, so only the work before the first byte is in it.
+"""
+
+import cProfile
+import datetime
+import hmac
+import json
+import marshal
+import os
+import random
+import re
+import secrets
+import threading
+import time
+
+from flask import g, request
+
+try:
+    import pyinstrument
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    pyinstrument = None
+
+PROFILE_ID = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{8}$')
+
+
+class CProfileSession:
+    extension = 'pstats'
+    mimetype = 'application/octet-stream'
+
+    def start(self):
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self._profile.create_stats()
+        # the format pstats.Stats reads back; dump_stats() only writes to a path
+        return marshal.dumps(self._profile.stats)
+
+
+class PyinstrumentSession:
+    extension = 'speedscope.json'
+    mimetype = 'application/json'
+
+    def __init__(self, interval):
+        if pyinstrument is None:
+            raise RuntimeError("PROFILER is pyinstrument but the pyinstrument package is not installed.")
+        self._interval = interval
+
+    def start(self):
+        self._profiler = pyinstrument.Profiler(interval=self._interval)
+        self._profiler.start()
+
+    def stop(self):
+        self._profiler.stop()
+        return self._profiler.output(renderer=SpeedscopeRenderer()).encode()
+
+
+class ProfileStore:
+    """Profiles and their details as files in one directory, newest max_profiles kept."""
+
+    def __init__(self, directory, max_profiles):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, details, data):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, details['file']), 'wb') as f:
+            f.write(data)
+        with open(os.path.join(self.directory, f"{details['id']}.details.json"), 'w') as f:
+            json.dump(details, f)
+        with self._lock:
+            self.prune()
+
+    def get_ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # ids start with their timestamp, so they sort oldest first
+        return sorted(name[:-len('.details.json')] for name in names if name.endswith('.details.json'))
+
+    def get(self, profile_id):
+        """A profile's details, or None if there is no such profile."""
+
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.details.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get_all(self):
+        """Details of every profile, newest first."""
+
+        profiles = [self.get(profile_id) for profile_id in reversed(self.get_ids())]
+        return [details for details in profiles if details != None]
+
+    def get_path(self, details):
+        return os.path.join(self.directory, details['file'])
+
+    def prune(self):
+        ids = self.get_ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for name in os.listdir(self.directory):
+                if name.startswith(profile_id):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+
+
+def create_session(app):
+    if app.config['PROFILER'] == 'pyinstrument':
+        return PyinstrumentSession(app.config['PROFILE_INTERVAL_SECONDS'])
+    if app.config['PROFILER'] == 'cprofile':
+        return CProfileSession()
+    raise ValueError(f"PROFILER must be cprofile or pyinstrument, not {app.config['PROFILER']}.")
+
+
+def is_admin(app):
+    """Whether the request's API-Key header is the admin key."""
+
+    expected = app.config.get('PROFILE_API_KEY') or app.config.get('API_KEY')
+    given = request.headers.get('API-Key')
+    return expected != None and given != None and hmac.compare_digest(given, expected)
+
+
+def init_profiling(app):
+    """Profile requests asked for with X-Profile, or a sample of them."""
+
+    store = ProfileStore(app.config['PROFILE_DIR'], app.config['PROFILE_MAX_FILES'])
+    app.extensions['profiles'] = store
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    # checked here so a missing package or a typo fails at startup
+    create_session(app)
+    # cProfile and pyinstrument each allow one active profiler per process
+    busy = threading.Lock()
+
+    def finish(status):
+        session, trigger, start = g.pop('profile')
+        try:
+            data = session.stop()
+        finally:
+            busy.release()
+        duration = time.perf_counter() - start
+        profile_id = f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S%f}-{secrets.token_hex(4)}"
+        details = {
+            'id': profile_id,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': status,
+            'duration_ms': round(duration * 1000, 1),
+            'profiler': app.config['PROFILER'],
+            'trigger': trigger,
+            'created_at': datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'file': f"{profile_id}.{session.extension}",
+            'mimetype': session.mimetype,
+            'bytes': len(data)
+        }
+        store.save(details, data)
+        return profile_id
+
+    @app.before_request
+    def start_profile():
+        if request.blueprint == 'profiles':
+            return None
+        if request.headers.get('X-Profile') == '1' and is_admin(app):
+            trigger = 'header'
+        elif rate > 0 and random.random() < rate:
+            trigger = 'sampled'
+        else:
+            return None
+        if not busy.acquire(blocking=False):
+            return None
+        session = create_session(app)
+        try:
+            session.start()
+        except Exception:
+            # another profiler (a debugger, coverage) may hold the hook
+            busy.release()
+            app.logger.exception("Could not start the profiler.")
+            return None
+        g.profile = (session, trigger, time.perf_counter())
+        return None
+
+    @app.after_request
+    def save_profile(response):
+        if 'profile' in g:
+            response.headers['X-Profile-Id'] = finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def stop_profile(error=None):
+        # after_request is skipped when another after_request function raises
+        if 'profile' in g:
+            finish(500)
@@ -0,0 +1,146 @@
+"""Publish/subscribe fan-out for live updates.
+
+The in-process broker delivers to subscribers in the same worker. Setting
+PUBSUB_BROKER_URL to a redis:// URL relays every message through Redis so
+viewers connected to any worker see writes made on any other worker; the
+`redis` package is only needed in that case.
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class InMemoryBroker:
+    """Fan messages out to callbacks registered in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count()
+
+    def subscribe(self, channel, callback):
+        token = (channel, next(self._ids))
+        with self._lock:
+            self._subscribers.setdefault(channel, {})[token] = callback
+        return token
+
+    def unsubscribe(self, token):
+        channel = token[0]
+        with self._lock:
+            callbacks = self._subscribers.get(channel, {})
+            callbacks.pop(token, None)
+            if not callbacks:
+                self._subscribers.pop(channel, None)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, {}))
+
+    def publish(self, channel, message):
+        self._deliver(channel, message)
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, {}).values())
+        for callback in callbacks:
+            callback(message)
+
+
+class RedisBroker(InMemoryBroker):
+    """Relay messages through Redis pub/sub to every worker."""
+
+    PREFIX = 'eurovision:'
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError(
+                "PUBSUB_BROKER_URL is set but the redis package is not installed.")
+        super().__init__()
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, channel, callback):
+        self._ensure_listener()
+        return super().subscribe(channel, callback)
+
+    def publish(self, channel, message):
+        self._redis.publish(self.PREFIX + channel, json.dumps(message))
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name='pubsub-redis', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.PREFIX + '*')
+        for item in pubsub.listen():
+            channel = item['channel'].decode()[len(self.PREFIX):]
+            self._deliver(channel, json.loads(item['data']))
+
+
+class Subscription:
+    """Blocking, bounded queue of messages for one channel.
+
+    A subscriber that falls more than `maxsize` messages behind has its
+    backlog replaced by a single "resync" message.
+    """
+
+    def __init__(self, broker, channel, maxsize=100):
+        self._broker = broker
+        self._queue = queue.Queue(maxsize)
+        self._token = broker.subscribe(channel, self._put)
+
+    def _put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            with self._queue.mutex:
+                self._queue.queue.clear()
+            self._queue.put_nowait({"type": "resync"})
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker.unsubscribe(self._token)
+
+
+def create_broker(url=None):
+    if url:
+        return RedisBroker(url)
+    return InMemoryBroker()
+
+
+broker = create_broker(os.environ.get('PUBSUB_BROKER_URL'))
+
+
+def event_channel(event_id):
+    return f"event:{event_id}"
+
+
+def format_sse(data, event=None, id=None):
+    """Encode one Server-Sent Events message."""
+
+    message = ''
+    if id is not None:
+        message += f"id: {id}\n"
+    if event is not None:
+        message += f"event: {event}\n"
+    for line in json.dumps(data).splitlines():
+        message += f"data: {line}\n"
+    return message + "\n"
@@ -0,0 +1,187 @@
+"""Rate limiting and admission control.
+
+Every request spends a token from a bucket keyed by the caller: its
+API-Key when it is the configured API_KEY, otherwise its IP address (a
+made-up key would otherwise buy a fresh bucket per request). Collection endpoints
+draw from a separate, smaller bucket. Buckets live in process memory by
+default; set RATE_LIMIT_BACKEND_URL to a redis:// URL to share them
+between workers (requires the `redis` package).
+
+Behind a proxy the IP address is the proxy's unless PROXY_COUNT says how
+many proxies to look past in X-Forwarded-For; it defaults to 1 on Heroku
+and 0 elsewhere, where every keyless caller would share one bucket.
+
+On top of that, each worker admits at most MAX_CONCURRENT_REQUESTS
+requests at once and sheds the rest with a 503, so a burst queues at the
+router instead of exhausting the database connection pool.
+"""
+
+from collections import OrderedDict
+import hashlib
+import hmac
+import math
+import threading
+import time
+
+from flask import g, jsonify, request
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# WSGI environ key marking a request the app makes to itself (snapshot.py);
+# those skip rate limiting, the concurrency gate and the response cache
+INTERNAL_REQUEST = 'eurovision.internal_request'
+
+# endpoints that serialize whole tables
+COLLECTION_ENDPOINTS = {
+    'participants.get_all_participants',
+    'countries.get_all_countries',
+    'entries.get_all_entries',
+    'events.get_all_events',
+    'performances.get_all_performances',
+    'api.graphql',
+    'export.export_performances',
+    'analytics.get_points_matrix',
+    'analytics.get_rolling_average',
+    'analytics.get_running_order_correlation',
+    'analytics.get_qualification_streaks'
+}
+
+
+def parse_limit(value):
+    """Parse "<tokens per second>/<burst>", e.g. "10/50"."""
+
+    rate, burst = value.split('/')
+    return (float(rate), float(burst))
+
+
+class InMemoryBackend:
+    """Token buckets held in this process, least recently used evicted first."""
+
+    def __init__(self, max_keys=100000):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._max_keys = max_keys
+
+    def take(self, key, rate, burst, cost=1):
+        """Spend `cost` tokens; return seconds to wait, or 0 if allowed."""
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisBackend:
+    """Token buckets shared between workers through Redis."""
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        wait = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError(
+                "RATE_LIMIT_BACKEND_URL is set but the redis package is not installed.")
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst, cost=1):
+        return float(self._take(keys=['ratelimit:' + key], args=[rate, burst, time.time(), cost]))
+
+
+def create_backend(url=None):
+    if url:
+        return RedisBackend(url)
+    return InMemoryBackend()
+
+
+def get_client_key(app, api_key, remote_addr):
+    """The bucket of a caller: its API key if the key is valid, else its IP address."""
+
+    expected = app.config.get('API_KEY')
+    if api_key and expected and hmac.compare_digest(api_key, expected):
+        return 'key:' + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return 'ip:' + str(remote_addr)
+
+
+def take_token(app, client, is_collection):
+    """Charge one request to the client; return seconds to wait, or 0 if allowed."""
+
+    backend = app.extensions['admission_control']
+    if is_collection:
+        return backend.take('collection:' + client, *parse_limit(app.config['RATE_LIMIT_COLLECTION']))
+    return backend.take('default:' + client, *parse_limit(app.config['RATE_LIMIT_DEFAULT']))
+
+
+def too_many_requests(wait):
+    response = {
+        "status": "fail",
+        "message": f"Rate limit exceeded. Retry in {math.ceil(wait)} seconds."
+    }
+    return (jsonify(response), 429, {"Retry-After": str(math.ceil(wait))})
+
+
+def server_busy():
+    response = {
+        "status": "error",
+        "message": "Server is busy. Retry shortly."
+    }
+    return (jsonify(response), 503, {"Retry-After": "1"})
+
+
+def init_admission_control(app):
+    """Install rate limiting and the concurrency gate on a Flask app."""
+
+    app.extensions['admission_control'] = create_backend(
+        app.config.get('RATE_LIMIT_BACKEND_URL'))
+    slots = threading.BoundedSemaphore(app.config['MAX_CONCURRENT_REQUESTS'])
+
+    @app.before_request
+    def admit_request():
+        if request.endpoint == 'static' or request.environ.get(INTERNAL_REQUEST):
+            return None
+
+        if app.config['RATE_LIMIT_ENABLED']:
+            client = get_client_key(
+                app, request.headers.get('API-Key', None), request.remote_addr)
+            wait = take_token(app, client, request.endpoint in COLLECTION_ENDPOINTS)
+            if wait > 0:
+                return too_many_requests(wait)
+
+        if not slots.acquire(timeout=app.config['ADMISSION_TIMEOUT_SECONDS']):
+            return server_busy()
+        g.admission_slot = True
+        return None
+
+    @app.teardown_request
+    def release_slot(error=None):
+        if g.pop('admission_slot', False):
+            slots.release()
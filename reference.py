@@ -0,0 +1,92 @@
+"""In-memory copy of the small, rarely changing reference tables.
+
+Countries and events are loaded once per worker into an immutable map so
+serialization can resolve their names, and forms their choices, without
+SQL. Committing a write to either table bumps the reference version: the
+committing worker drops its copy straight away and the bump is published
+on the pub/sub broker, so with PUBSUB_BROKER_URL set every other worker
+drops its copy too. The next lookup reloads. Whatever happens to the bump,
+a copy is never used for longer than REFERENCE_MAX_AGE_SECONDS, and a
+form given an id its copy lacks reloads it before rejecting the id.
+"""
+
+import os
+import threading
+import time
+from types import MappingProxyType
+
+REFERENCE_CHANNEL = 'reference'
+REFERENCE_MAX_AGE_SECONDS = float(os.environ.get('REFERENCE_MAX_AGE_SECONDS', 60))
+
+
+class ReferenceData:
+    """Immutable id -> name maps of countries and events."""
+
+    def __init__(self, version, countries, events):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.countries = MappingProxyType(dict(countries))
+        self.events = MappingProxyType(dict(events))
+
+
+class ReferenceCache:
+    """Holds the current ReferenceData of this worker and reloads it when stale.
+
+    `loader()` returns ((country id, name) pairs, (event id, name) pairs)
+    and must run inside an application context.
+    """
+
+    def __init__(self, loader, broker, max_age=REFERENCE_MAX_AGE_SECONDS):
+        self._loader = loader
+        self._broker = broker
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._version = 0
+        self._data = None
+        self._token = None
+
+    def _is_current(self, data):
+        return (data != None and data.version == self._version
+                and time.monotonic() - data.loaded_at < self._max_age)
+
+    def get(self):
+        data = self._data
+        if self._is_current(data):
+            return data
+        return self.load()
+
+    def load(self):
+        """Load the tables unless another thread just did; return the data."""
+
+        with self._lock:
+            if self._token == None:
+                # subscribe lazily so no listener thread is started before a fork
+                self._token = self._broker.subscribe(REFERENCE_CHANNEL, self._on_bump)
+            if not self._is_current(self._data):
+                # a bump while loading leaves the result stale, so it is reloaded next time
+                version = self._version
+                countries, events = self._loader()
+                self._data = ReferenceData(version, countries, events)
+            return self._data
+
+    def _on_bump(self, message):
+        with self._lock:
+            self._version += 1
+
+    def reload(self):
+        """Drop this worker's copy and load the tables again; return the data."""
+
+        self._on_bump(None)
+        return self.load()
+
+    def bump(self):
+        """Drop this worker's copy and tell the other workers to drop theirs."""
+
+        self._on_bump(None)
+        self._broker.publish(REFERENCE_CHANNEL, {"type": "bump"})
+
+    def country_name(self, country_id):
+        return self.get().countries.get(country_id)
+
+    def event_name(self, event_id):
+        return self.get().events.get(event_id)
@@ -1,5 +1,7 @@
 from models import db, Participant, Country, Event, Entry, Event_Entry
-from app import app
+from app import create_app
+
+app = create_app()
 
 db.drop_all()
 db.create_all()
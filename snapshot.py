@@ -0,0 +1,237 @@
+"""Render the read API to static, content-hashed JSON files.
+
+    python snapshot.py OUTPUT_DIR           # re-render what changed
+    python snapshot.py OUTPUT_DIR --full    # re-render everything
+
+Every GET route is written to OUTPUT_DIR/<route>.<hash>.json. manifest.json
+maps routes to files and records the change log cursor the snapshot is
+current to; routes.map is an nginx `map` include that resolves a request
+URI to its file, so the read API can be served with no Python involved.
+
+An incremental run reads the changes since the manifest's cursor and
+re-renders only the changed resources, the resources that reference
+them (their denormalized names and id lists) and the collections. Files
+the new manifest no longer points at are removed once it is written.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+
+from app import create_app
+from models import Participant, Country, Entry, Event, Event_Entry, Change
+from ratelimit import INTERNAL_REQUEST
+
+MANIFEST_FILE = 'manifest.json'
+NGINX_MAP_FILE = 'routes.map'
+RENDERED_FILE = re.compile(r'\.[0-9a-f]{16}\.json$')
+
+# resource type -> (collection route, model)
+RESOURCES = {
+    'participant': ('/participants', Participant),
+    'country': ('/countries', Country),
+    'entry': ('/entries', Entry),
+    'event': ('/events', Event),
+    'performance': ('/performances', Event_Entry)
+}
+
+# serialized field -> resource type it holds ids of
+REFERENCE_FIELDS = {
+    'participant': {'entries': 'entry', 'countries_represented': 'country',
+                    'performances': 'performance', 'events': 'event'},
+    'country': {'entries': 'entry', 'events': 'event',
+                'participants': 'participant', 'performances': 'performance'},
+    'entry': {'participant_id': 'participant', 'country_id': 'country',
+              'performances': 'performance', 'events': 'event'},
+    'event': {'host_country_id': 'country', 'performances': 'performance',
+              'entries': 'entry', 'participating_countries': 'country'},
+    'performance': {'entry_id': 'entry', 'event_id': 'event',
+                    'participant_id': 'participant', 'country_id': 'country'}
+}
+
+
+def resource_route(resource, id):
+    return f"{RESOURCES[resource][0]}/{id}"
+
+
+def get_references(resource, document):
+    """Return the (resource, id) pairs a serialized resource points at."""
+
+    references = set()
+    for field, target in REFERENCE_FIELDS[resource].items():
+        value = document.get(field)
+        for id in (value if isinstance(value, list) else [value]):
+            if id != None:
+                references.add((target, id))
+    return references
+
+
+class Snapshot:
+    """Static export of the read API in one output directory."""
+
+    def __init__(self, output_dir, app=None):
+        """Render through `app` (a job worker's own), or a new app when it is None."""
+
+        self.output_dir = output_dir
+        self.app = app or create_app({'RATE_LIMIT_ENABLED': False, 'RESPONSE_CACHE_ENABLED': False})
+        # the requests bypass the rate limiter and response cache of a shared app
+        self.client = self.app.test_client()
+        self.client.environ_base[INTERNAL_REQUEST] = True
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        path = os.path.join(self.output_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def write_manifest(self, cursor, routes):
+        self.manifest = {
+            "cursor": cursor,
+            "generated_at": datetime.datetime.utcnow().isoformat(),
+            "routes": routes
+        }
+        self.write_file(MANIFEST_FILE, json.dumps(self.manifest, indent=1, sort_keys=True))
+
+        lines = [f"{route} /{entry['file']};" for route, entry in sorted(routes.items())]
+        self.write_file(NGINX_MAP_FILE, "\n".join(lines) + "\n")
+        self.prune(set(entry['file'] for entry in routes.values()))
+
+    def prune(self, current):
+        """Remove rendered files the manifest no longer points at."""
+
+        for root, directories, names in os.walk(self.output_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, self.output_dir).replace(os.sep, '/')
+                if RENDERED_FILE.search(name) and relative not in current:
+                    os.remove(path)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.output_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        mode = 'wb' if isinstance(content, bytes) else 'w'
+        with open(path + '.tmp', mode) as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+
+    def render(self, route, resource=None):
+        """Render one route; return its manifest entry or None if it 404s."""
+
+        response = self.client.get(route)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {route} returned {response.status_code}.")
+
+        body = response.get_data()
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        name = f"{route.lstrip('/')}.{digest}.json"
+        if not os.path.exists(os.path.join(self.output_dir, name)):
+            self.write_file(name, body)
+
+        entry = {"file": name}
+        if resource != None:
+            document = next(iter(json.loads(body).values()))
+            entry["resource"] = resource
+            entry["references"] = sorted(get_references(resource, document))
+        return entry
+
+    def export_full(self):
+        cursor = Change.get_latest_cursor()
+        routes = {}
+        for resource, (collection_route, model) in RESOURCES.items():
+            routes[collection_route] = self.render(collection_route)
+            for id in model.get_choices():
+                route = resource_route(resource, id)
+                routes[route] = self.render(route, resource)
+        routes = {route: entry for route, entry in routes.items() if entry != None}
+        self.write_manifest(cursor, routes)
+        return len(routes)
+
+    def get_affected(self, changes):
+        """Resources to re-render for a batch of changes."""
+
+        referrers = {}
+        for route, entry in self.manifest["routes"].items():
+            if "resource" in entry:
+                source = (entry["resource"], route.rsplit('/', 1)[1])
+                for target in entry["references"]:
+                    referrers.setdefault(tuple(target), set()).add(source)
+
+        affected = set()
+        for change in changes:
+            changed = (change.resource, change.resource_id)
+            affected.add(changed)
+
+            # whatever pointed at it (denormalized names, id lists) ...
+            affected |= referrers.get(changed, set())
+
+            # ... and whatever it pointed at before the change; what it points
+            # at now comes from its re-rendered document (see export_incremental)
+            old_entry = self.manifest["routes"].get(resource_route(*changed))
+            if old_entry != None:
+                affected |= set(tuple(target) for target in old_entry["references"])
+        return affected
+
+    def render_resource(self, routes, resource, id):
+        route = resource_route(resource, id)
+        entry = self.render(route, resource)
+        if entry == None:
+            routes.pop(route, None)
+        else:
+            routes[route] = entry
+        return entry
+
+    def export_incremental(self):
+        cursor = Change.get_latest_cursor()
+        changes = [change for change in Change.get_since(self.manifest["cursor"], None)
+                   if change.id <= cursor]
+        if not changes:
+            return 0
+
+        routes = dict(self.manifest["routes"])
+        affected = self.get_affected(changes)
+
+        # the changed rows first: a change's payload only has the row's own
+        # columns, so a new performance's participant and country are only
+        # known from its rendered document
+        changed = set((change.resource, change.resource_id) for change in changes)
+        for resource, id in changed:
+            entry = self.render_resource(routes, resource, id)
+            if entry != None:
+                affected |= set(tuple(target) for target in entry["references"])
+
+        for resource, id in affected - changed:
+            self.render_resource(routes, resource, id)
+
+        for collection_route, model in RESOURCES.values():
+            routes[collection_route] = self.render(collection_route)
+
+        self.write_manifest(cursor, routes)
+        return len(affected | changed) + len(RESOURCES)
+
+    def export(self, full=False):
+        with self.app.app_context():
+            if full or self.manifest == None:
+                return self.export_full()
+            return self.export_incremental()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output_dir')
+    parser.add_argument('--full', action='store_true',
+                        help="re-render every route instead of only what changed")
+    args = parser.parse_args()
+
+    rendered = Snapshot(args.output_dir).export(full=args.full)
+    print(f"Rendered {rendered} routes to {args.output_dir}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+API_KEY = 'test'
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on an empty SQLite database, with the rate limiter and response cache off."""
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'SECRET_KEY': 'test',
+        'API_KEY': API_KEY,
+        'RATE_LIMIT_ENABLED': False,
+        'RESPONSE_CACHE_ENABLED': False,
+        'MEDIA_CACHE_DIR': str(tmp_path / 'media')
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.remove()
+    return app
@@ -0,0 +1,56 @@
+"""/graphql root fields and relations."""
+
+import pytest
+
+from models import db, Participant, Country, Entry, Event, Event_Entry
+
+
+@pytest.fixture
+def ids(app):
+    with app.app_context():
+        Country.register('SWE', 'Sweden', None)
+        Country.register('GBR', 'United Kingdom', None)
+        participant = Participant.register('ABBA', None, None)
+        entry = Entry.register(participant.id, 'SWE', 'Waterloo', 1974, None, None, None, None,
+                               None, None, None, None, 'English', None)
+        event = Event.register('ESC 1974', 'final', 1974, None, None, None, None, None, None, None,
+                               'Brighton', 'GBR')
+        performance = Event_Entry.register(event.id, entry.id, 24, 1, True, 8)
+        ids = {'participant': participant.id, 'entry': entry.id, 'performance': performance.id}
+        db.session.remove()
+    return ids
+
+
+def query(app, text):
+    response = app.test_client().post('/graphql', json={'query': text})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def test_single_item_lookup(app, ids):
+    data = query(app, f'{{ participant(id: "{ids["participant"]}") {{ id name }} }}')
+    assert data['participant'] == {'id': ids['participant'], 'name': 'ABBA'}
+
+    data = query(app, '{ country(id: "SWE") { id country } }')
+    assert data['country'] == {'id': 'SWE', 'country': 'Sweden'}
+
+
+def test_single_item_lookup_follows_relations(app, ids):
+    data = query(app, f'{{ performance(id: "{ids["performance"]}") '
+                      '{ id points entry { title participant { name } country { id } } } }')
+    assert data['performance'] == {
+        'id': ids['performance'],
+        'points': 24,
+        'entry': {'title': 'Waterloo', 'participant': {'name': 'ABBA'}, 'country': {'id': 'SWE'}}
+    }
+
+
+def test_single_item_lookup_of_a_missing_id_is_null(app, ids):
+    assert query(app, '{ participant(id: "nope") { id } }') == {'participant': None}
+    assert query(app, '{ performance(id: 1) { id } }') == {'performance': None}
+
+
+def test_rejects_non_object_variables(app):
+    response = app.test_client().post('/graphql', json={'query': '{ events { id } }', 'variables': 'x'})
+    assert response.status_code == 400
+    assert response.get_json()['errors']
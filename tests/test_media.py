@@ -0,0 +1,116 @@
+"""/media with a stub standing in for MediaCache.fetch.
+
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+
+import io
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+import media  # noqa: E402
+from models import db, Country  # noqa: E402
+
+SOURCE_URL = 'http://origin.test/flags/swe.png'
+MAX_AGE_SECONDS = 3600
+
+
+@pytest.fixture(autouse=True)
+def country(app):
+    app.config['MEDIA_MAX_AGE_SECONDS'] = MAX_AGE_SECONDS
+    with app.app_context():
+        Country.register('SWE', 'Sweden', SOURCE_URL)
+        db.session.remove()
+
+
+def stub_fetch(app, image):
+    """Answer every fetch with the image as PNG; return the URLs fetched."""
+
+    source = io.BytesIO()
+    image.save(source, 'PNG')
+    urls = []
+
+    def fetch(url):
+        urls.append(url)
+        return source.getvalue()
+
+    media.get_media_cache(app).fetch = fetch
+    return urls
+
+
+@pytest.fixture
+def fetched(app):
+    """URLs the stub fetch was asked for; it answers each with an 800x600 PNG."""
+
+    return stub_fetch(app, Image.new('RGB', (800, 600), (0, 106, 167)))
+
+
+def open_image(response):
+    return Image.open(io.BytesIO(response.get_data()))
+
+
+def test_resizes_to_the_next_width(app, fetched):
+    response = app.test_client().get('/media/country/SWE?w=100')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    image = open_image(response)
+    assert image.format == 'PNG'
+    assert image.size == (128, 96)
+    assert fetched == [SOURCE_URL]
+
+
+def test_answers_with_webp_when_accepted(app, fetched):
+    response = app.test_client().get('/media/country/SWE?w=64', headers={'Accept': 'image/webp,*/*'})
+
+    assert response.mimetype == 'image/webp'
+    image = open_image(response)
+    assert image.format == 'WEBP'
+    assert image.size == (64, 48)
+
+
+def test_second_request_is_served_from_the_cache(app, fetched):
+    client = app.test_client()
+    first = client.get('/media/country/SWE?w=100')
+    second = client.get('/media/country/SWE?w=100')
+
+    assert second.status_code == 200
+    assert second.get_data() == first.get_data()
+    assert fetched == [SOURCE_URL]
+
+    # another width is resized from the cached source
+    assert open_image(client.get('/media/country/SWE?w=300')).size == (512, 384)
+    assert fetched == [SOURCE_URL]
+
+
+def test_cache_headers(app, fetched):
+    client = app.test_client()
+    response = client.get('/media/country/SWE?w=100')
+
+    assert response.cache_control.public
+    assert response.cache_control.max_age == MAX_AGE_SECONDS
+    assert 'Accept' in response.vary
+    assert response.headers['ETag']
+
+    revalidated = client.get('/media/country/SWE?w=100', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert fetched == [SOURCE_URL]
+
+
+def test_resizes_palette_images_smoothly(app):
+    # two-colour stripes: nearest-neighbour scaling keeps only the two colours
+    image = Image.new('P', (800, 600))
+    image.putpalette([255, 255, 255, 0, 0, 0] + [0] * 762)
+    for x in range(0, 800, 2):
+        image.paste(1, (x, 0, x + 1, 600))
+    image.info['transparency'] = 0
+    stub_fetch(app, image)
+
+    for accept in ['image/png', 'image/webp']:
+        resized = open_image(app.test_client().get('/media/country/SWE?w=100', headers={'Accept': accept}))
+        assert resized.size == (128, 96)
+        assert resized.mode == 'RGBA'
+        # the stripes average out to shades between the two colours
+        assert len(resized.getcolors(128 * 96)) > 2
@@ -0,0 +1,28 @@
+"""/performances collection filters."""
+
+from sqlalchemy import event
+
+from models import db, Participant, Country, Entry, Event, Event_Entry
+
+
+def test_year_filter_is_on_the_entries_join(app):
+    with app.app_context():
+        Country.register('SWE', 'Sweden', None)
+        participant = Participant.register('ABBA', None, None)
+        entry = Entry.register(participant.id, 'SWE', 'Waterloo', 1974, None, None, None, None,
+                               None, None, None, None, 'English', None)
+        final = Event.register('ESC 1974', 'final', 1974, None, None, None, None, None, None, None,
+                               'Brighton', 'SWE')
+        Event_Entry.register(final.id, entry.id, 24, 1, True, 8)
+        db.session.remove()
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        response = app.test_client().get('/performances?year=1974')
+
+    assert [performance['entry'] for performance in response.get_json()['performances']] == ['Waterloo']
+    joins = [statement for statement in statements if 'JOIN entries' in statement]
+    # a partitioned entries table (migration 006) is only pruned by a year on the join
+    assert joins and all('.year = ?' in statement.split('JOIN entries', 1)[1].split('JOIN')[0]
+                         for statement in joins)